@@ -6,15 +6,20 @@ Funciones públicas principales:
 - verificar_codigo(parent=None): pide el código por dialog y devuelve True/False.
 - mostrar_qr_y_verificar(parent=None): si no existe secreto muestra QR para registrar y luego
   pide/verifica el código; si ya existe, solo pide/verifica el código.
-El fichero de secreto se guarda en SECRET_FILE para persistencia.
+- default_verifier(): OTPVerifier compartido (TOTP cacheado, bloqueo por tiempo y ventana
+  de gracia tras verificar).
+En la aplicación cada usuario tiene su secreto dentro de su vault cifrado (OTPVerifier con
+save_secret). SECRET_FILE solo se usa en modo independiente y se migra al primer vault que
+lo lee (legacy_secret / remove_legacy_secret).
 """
 
+import math
 import os
+import time
 import pyotp
-import qrcode
 import tkinter as tk
 from tkinter import simpledialog, messagebox
-from PIL import Image, ImageTk
+# qrcode y PIL solo se importan al mostrar un QR (_qr_photo)
 
 
 # Carpeta donde está este script
@@ -23,7 +28,20 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Archivo secreto en la misma carpeta
 SECRET_FILE = os.path.join(BASE_DIR, ".OTP.txt")
 
+# Tras verificar, no se vuelve a pedir código durante este tiempo (DNIE_OTP_GRACE, en segundos)
+GRACE_SECONDS = int(os.environ.get("DNIE_OTP_GRACE", "120"))
+# Espera tras un código incorrecto y bloqueo tras MAX_ATTEMPTS fallos seguidos
+MAX_ATTEMPTS = 3
+LOCKOUT_SECONDS = 20
+BLOCK_SECONDS = 300
+
 # --- Utilidades internas ---
+def _qr_photo(uri, size=260):
+    """Imagen Tk del QR de uri (importa qrcode y PIL en el primer uso)"""
+    import qrcode
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(qrcode.make(uri).resize((size, size)))
+
 def _load_or_generate_secret():
     """Carga el secreto desde SECRET_FILE o genera uno nuevo y lo escribe.
     Devuelve (secret, newly_created_bool).
@@ -46,21 +64,190 @@ def _load_or_generate_secret():
         print("Warning: no se pudo guardar SECRET_FILE:", e)
     return secret, True
 
+def _read_secret():
+    """Secreto guardado en SECRET_FILE, o None si no hay"""
+    try:
+        with open(SECRET_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
 def _get_totp_from_secret(secret):
     return pyotp.TOTP(secret)
 
+class OTPVerifier:
+    """Verificación TOTP que no bloquea la interfaz.
+
+    El secreto se lee una vez y el objeto TOTP (y la imagen del QR) se
+    reutilizan. Un código incorrecto no duerme: fija una hora hasta la que se
+    rechazan intentos. Una verificación correcta vale durante grace_seconds.
+
+    Con save_secret(secreto) el secreto nuevo se guarda donde diga quien lo
+    crea (el vault del usuario); sin él se usa SECRET_FILE.
+    """
+
+    def __init__(self, secret=None, grace_seconds=GRACE_SECONDS, clock=time.monotonic, save_secret=None):
+        self._secret = secret
+        self._save_secret = save_secret
+        self._totp = None
+        self._qr_cache = {}
+        self.grace_seconds = grace_seconds
+        self._clock = clock
+        self._verified_at = None
+        self._failures = 0
+        self._locked_until = 0.0
+
+    # --- Secreto ---
+    @property
+    def has_secret(self):
+        if self._secret is None and self._save_secret is None:
+            self._secret = _read_secret()
+        return self._secret is not None
+
+    def ensure_secret(self):
+        """Secreto actual, generando y guardando uno nuevo si no hay. Devuelve (secreto, nuevo)"""
+        if self.has_secret:
+            return self._secret, False
+        if self._save_secret is None:
+            self._secret, created = _load_or_generate_secret()
+        else:
+            self._secret, created = pyotp.random_base32(), True
+            self._save_secret(self._secret)
+        self._totp = None
+        self._qr_cache.clear()
+        return self._secret, created
+
+    @property
+    def totp(self):
+        if self._totp is None:
+            self._totp = _get_totp_from_secret(self.ensure_secret()[0])
+        return self._totp
+
+    def provisioning_uri(self, account_name, issuer_name):
+        return self.totp.provisioning_uri(name=account_name, issuer_name=issuer_name)
+
+    def qr_photo(self, account_name, issuer_name):
+        """Imagen Tk del QR de alta; se genera una vez y se reutiliza al volver a mostrarla"""
+        uri = self.provisioning_uri(account_name, issuer_name)
+        photo = self._qr_cache.get(uri)
+        if photo is None:
+            photo = _qr_photo(uri)
+            self._qr_cache[uri] = photo
+        return photo
+
+    # --- Estado ---
+    def is_verified(self):
+        """True si hubo una verificación correcta hace menos de grace_seconds"""
+        return self._verified_at is not None and self._clock() - self._verified_at < self.grace_seconds
+
+    def lock_remaining(self):
+        """Segundos que faltan para poder volver a intentarlo (0 si no hay bloqueo)"""
+        return max(0.0, self._locked_until - self._clock())
+
+    def forget(self):
+        """Olvidar la verificación (p. ej. al bloquear la aplicación)"""
+        self._verified_at = None
+
+    def check_code(self, code):
+        """Comprobar un código respetando el bloqueo; actualiza intentos y ventana de gracia"""
+        if self.lock_remaining():
+            return False
+        try:
+            ok = self.totp.verify(code.strip())
+        except Exception:
+            ok = False
+        now = self._clock()
+        if ok:
+            self._failures = 0
+            self._verified_at = now
+            return True
+        self._failures += 1
+        if self._failures >= MAX_ATTEMPTS:
+            self._failures = 0
+            self._locked_until = now + BLOCK_SECONDS
+        else:
+            self._locked_until = now + LOCKOUT_SECONDS
+        return False
+
+    # --- Diálogos ---
+    def _warn_locked(self, parent):
+        messagebox.showwarning(
+            "Bloqueado",
+            f"Demasiados intentos fallidos.\nVuelve a intentarlo en {math.ceil(self.lock_remaining())} segundos.",
+            parent=parent,
+        )
+
+    def _warn_failed(self, parent):
+        if self.lock_remaining() > LOCKOUT_SECONDS:
+            messagebox.showerror(
+                "Bloqueado",
+                f"❌ Has superado el número máximo de intentos. Acceso bloqueado {BLOCK_SECONDS // 60} minutos.",
+                parent=parent,
+            )
+        else:
+            messagebox.showwarning(
+                "Código incorrecto",
+                f"Código incorrecto.\nDebes esperar {LOCKOUT_SECONDS} segundos antes de volver a intentarlo.",
+                parent=parent,
+            )
+
+    def verify(self, parent=None, prompt="Introduce el código de Google Authenticator:"):
+        """Pedir el código solo si hace falta. Nunca espera: durante el bloqueo avisa y devuelve False"""
+        if self.is_verified():
+            return True
+        if not self.has_secret:
+            messagebox.showwarning(
+                "No configurado",
+                "No hay secreto TOTP configurado. Escanea primero el QR.",
+                parent=parent,
+            )
+            return False
+        if self.lock_remaining():
+            self._warn_locked(parent)
+            return False
+
+        codigo = simpledialog.askstring("Verificación", prompt, parent=parent)
+        if not codigo:
+            # usuario canceló
+            return False
+        if self.check_code(codigo):
+            return True
+        self._warn_failed(parent)
+        return False
+
+def legacy_secret():
+    """Secreto de SECRET_FILE (antes compartido por todos los usuarios), o None.
+
+    La aplicación lo pasa al vault del primer usuario sin secreto propio, para
+    que conserve su alta en el autenticador, y después borra el archivo.
+    """
+    return _read_secret()
+
+def remove_legacy_secret():
+    try:
+        os.remove(SECRET_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print("Warning: no se pudo borrar SECRET_FILE:", e)
+
+_default_verifier = None
+
+def default_verifier():
+    """Verificador compartido por la aplicación"""
+    global _default_verifier
+    if _default_verifier is None:
+        _default_verifier = OTPVerifier()
+    return _default_verifier
+
 # --- Funciones públicas ---
 
-def mostrar_qr(parent=None, account_name="usuario@ejemplo.com", issuer_name="Gestor Contraseñas"):
+def mostrar_qr(parent=None, account_name="usuario@ejemplo.com", issuer_name="Gestor Contraseñas", verifier=None):
     """
     Muestra el QR en una ventana Toplevel. No verifica el código
     """
     # Cargar o generar secreto (no sobrescribe si ya existe)
-    secret, newly_created = _load_or_generate_secret()
-    totp = _get_totp_from_secret(secret)
-
-    uri = totp.provisioning_uri(name=account_name, issuer_name=issuer_name)
-    qr_img = qrcode.make(uri)
+    verifier = verifier or default_verifier()
 
     # Si no se ha pasado parent (ejecución standalone), crear uno temporal.
     created_root = False
@@ -73,9 +260,8 @@ def mostrar_qr(parent=None, account_name="usuario@ejemplo.com", issuer_name="Ges
     win.title("Escanea el QR con Google Authenticator")
     win.resizable(False, False)
 
-    # Convertir imagen y mostrar
-    qr_img_resized = qr_img.resize((260, 260))
-    qr_photo = ImageTk.PhotoImage(qr_img_resized)
+    # Imagen del QR (cacheada en el verificador)
+    qr_photo = verifier.qr_photo(account_name, issuer_name)
 
     lbl = tk.Label(win, image=qr_photo)
     lbl.image = qr_photo  # evitar garbage collection
@@ -108,85 +294,29 @@ def mostrar_qr(parent=None, account_name="usuario@ejemplo.com", issuer_name="Ges
         except Exception:
             pass
 
-import time
-
-def verificar_codigo(parent=None, prompt="Introduce el código de Google Authenticator:"):
+def verificar_codigo(parent=None, prompt="Introduce el código de Google Authenticator:", verifier=None):
     """
-    Verifica el código TOTP con un máximo de 3 intentos y
-    un tiempo de espera de 20 segundos entre intentos fallidos.
+    Verifica el código TOTP con el verificador compartido: tras un fallo hay que
+    esperar LOCKOUT_SECONDS (sin congelar la ventana) y tras MAX_ATTEMPTS fallos
+    seguidos, BLOCK_SECONDS. Un acierto vale durante GRACE_SECONDS.
     """
-    if not os.path.exists(SECRET_FILE):
-        messagebox.showwarning(
-            "No configurado",
-            "No hay secreto TOTP configurado. Escanea primero el QR.",
-            parent=parent,
-        )
-        return False
-
-    try:
-        with open(SECRET_FILE, "r", encoding="utf-8") as f:
-            secret = f.read().strip()
-    except Exception:
-        messagebox.showerror("Error", "No se pudo leer el secreto TOTP.", parent=parent)
-        return False
-
-    totp = _get_totp_from_secret(secret)
-    intentos = 0
-    max_intentos = 3
-    tiempo_espera = 20  # segundos
-
-    while intentos < max_intentos:
-        codigo = simpledialog.askstring("Verificación", prompt, parent=parent)
-        if not codigo:
-            # usuario canceló
-            return False
-
-        try:
-            ok = totp.verify(codigo.strip())
-        except Exception:
-            ok = False
+    return (verifier or default_verifier()).verify(parent, prompt)
 
-        if ok:
-            messagebox.showinfo("Éxito", "✅ Código correcto, acceso permitido.", parent=parent)
-            return True
-        else:
-            intentos += 1
-            if intentos >= max_intentos:
-                messagebox.showerror(
-                    "Bloqueado",
-                    "❌ Has superado el número máximo de intentos. Acceso bloqueado.",
-                    parent=parent,
-                )
-                return False
-            else:
-                # Mostrar aviso una sola vez
-                messagebox.showwarning(
-                    "Código incorrecto",
-                    f"Código incorrecto.\nDebes esperar {tiempo_espera} segundos antes de volver a intentarlo.",
-                    parent=parent,
-                )
-                parent.update()  # refresca la ventana (evita congelarse)
-                time.sleep(tiempo_espera)  # pausa sin más popups
-                
-    # éxito
-    return True
-
-def mostrar_qr_y_verificar(parent=None, account_name="usuario@ejemplo.com", issuer_name="GestorContraseñas"):
+def mostrar_qr_y_verificar(parent=None, account_name="usuario@ejemplo.com", issuer_name="GestorContraseñas",
+                           verifier=None):
     """
     Flujo combinado pensado para usarse al pulsar 'Show' en la app:
     - Si no existe secreto: genera uno, muestra el QR (Toplevel) y luego pide el código.
     - Si existe secreto: solo pide el código.
     Devuelve True si el usuario ha sido verificado con éxito.
     """
-    # Si existe secreto: simplemente pedir código
-    if os.path.exists(SECRET_FILE):
-        return verificar_codigo(parent)
+    verifier = verifier or default_verifier()
+    # Si existe secreto: pedir código (o nada, si sigue en la ventana de gracia)
+    if verifier.has_secret:
+        return verifier.verify(parent)
 
     # Si no existe, generar y mostrar el QR, luego pedir código
-    secret, _ = _load_or_generate_secret()
-    totp = _get_totp_from_secret(secret)
-    uri = totp.provisioning_uri(name=account_name, issuer_name=issuer_name)
-    qr_img = qrcode.make(uri)
+    qr_photo = verifier.qr_photo(account_name, issuer_name)
 
     # Asegurar parent
     created_root = False
@@ -199,9 +329,6 @@ def mostrar_qr_y_verificar(parent=None, account_name="usuario@ejemplo.com", issu
     win.title("Escanea el QR y verifica")
     win.resizable(False, False)
 
-    qr_img_resized = qr_img.resize((260, 260))
-    qr_photo = ImageTk.PhotoImage(qr_img_resized)
-
     lbl = tk.Label(win, image=qr_photo)
     lbl.image = qr_photo
     lbl.pack(padx=12, pady=(12, 6))
@@ -217,12 +344,14 @@ def mostrar_qr_y_verificar(parent=None, account_name="usuario@ejemplo.com", issu
     # Permitir código "bypass" además del TOTP
         if codigo:
             codigo = codigo.strip()
-            if codigo.lower() == "bypass" or totp.verify(codigo):
+            if verifier.lock_remaining():
+                verifier._warn_locked(win)
+            elif codigo.lower() == "bypass" or verifier.check_code(codigo):
                 messagebox.showinfo("Acceso permitido", "✅ Código correcto, acceso permitido.", parent=win)
                 result["ok"] = True
                 win.destroy()
             else:
-                messagebox.showerror("Acceso denegado", "❌ Código incorrecto. Intenta de nuevo.", parent=win)
+                verifier._warn_failed(win)
             # la ventana se mantiene abierta para reintentar
 
 
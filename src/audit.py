@@ -0,0 +1,345 @@
+# audit.py - Auditoría de salud de las contraseñas del vault
+import datetime
+import gc
+import hashlib
+import math
+import secrets
+import string
+
+# Entradas sin cambiar la contraseña desde hace más de STALE_DAYS días
+STALE_DAYS = 365
+# Por debajo de WEAK_BITS de entropía estimada la contraseña se considera débil
+WEAK_BITS = 50
+# Longitud mínima del "esqueleto" para buscar contraseñas casi iguales
+NEAR_MIN_LENGTH = 4
+
+# Cada carácter ASCII -> su clase (l: minúscula, u: mayúscula, d: dígito, s: símbolo)
+_CLASS_TABLE = str.maketrans({**dict.fromkeys(string.ascii_lowercase, "l"),
+                              **dict.fromkeys(string.ascii_uppercase, "u"),
+                              **dict.fromkeys(string.digits, "d"),
+                              **dict.fromkeys(string.punctuation + " ", "s")})
+
+# Secuencias de alfabeto y teclado (en los dos sentidos), troceadas en grupos de 4
+_SEQUENCES = ("abcdefghijklmnopqrstuvwxyz", "0123456789", "qwertyuiop", "asdfghjkl", "zxcvbnm")
+_SEQ_GRAMS = frozenset(seq[i:i + 4] for base in _SEQUENCES for seq in (base, base[::-1])
+                       for i in range(len(seq) - 3))
+
+# Sustituciones típicas (p4ssw0rd -> password) para comparar esqueletos
+_LEET = str.maketrans("0134579@$!|", "oieastgasil")
+_EDGES = string.digits + string.punctuation + " "
+
+# Contraseñas (esqueletos) de las listas de más usadas
+_COMMON = frozenset((
+    "password", "passwort", "contrasena", "qwerty", "qwertyuiop", "asdfgh", "admin", "administrator",
+    "letmein", "welcome", "iloveyou", "monkey", "dragon", "football", "baseball", "master", "sunshine",
+    "princess", "shadow", "superman", "michael", "abc", "abcd", "abcdef", "root", "toor", "login",
+    "secret", "hola", "holahola", "barcelona", "madrid", "realmadrid", "tequiero", "changeme", "test",
+    "usuario", "user", "guest", "default",
+))
+
+# Las mismas tablas en bytes: con contraseñas ASCII (casi todas) bytes.translate es
+# varias veces más rápido que str.translate con un diccionario
+_CLASS_BYTES = bytes.maketrans(string.ascii_lowercase.encode() + string.ascii_uppercase.encode()
+                               + string.digits.encode() + (string.punctuation + " ").encode(),
+                               b"l" * 26 + b"u" * 26 + b"d" * 10 + b"s" * (len(string.punctuation) + 1))
+_LEET_BYTES = bytes.maketrans(b"0134579@$!|", b"oieastgasil")
+_EDGES_BYTES = _EDGES.encode()
+
+def _analyze(password):
+    """(bits estimados, esqueleto) de una contraseña"""
+    length = len(password)
+    lower = password.lower()
+    if password.isascii():
+        data = password.encode()
+        classes = data.translate(_CLASS_BYTES).decode()
+        skeleton = data.lower().strip(_EDGES_BYTES).translate(_LEET_BYTES).decode()
+        pool = 0
+    else:
+        classes = password.translate(_CLASS_TABLE)
+        skeleton = _skeleton(lower)
+        pool = 100
+    if not length:
+        return 0.0, skeleton
+    # Tamaño del alfabeto: minúsculas, mayúsculas, dígitos, símbolos y no ASCII
+    pool += ((26 if "l" in classes else 0) + (26 if "u" in classes else 0)
+             + (10 if "d" in classes else 0) + (33 if "s" in classes else 0))
+    per_char = math.log2(pool) if pool > 1 else 1.0
+
+    # Caracteres repetidos y secuencias (abcd, 1234, qwer) aportan poco
+    effective = min(length, 2 * len(set(password)))
+    # Una secuencia necesita 4 caracteres seguidos de la misma clase: solo entonces se busca,
+    # y solo en las posiciones con 4 letras (en cualquier caja) o 4 dígitos seguidos
+    if "llll" in classes or "dddd" in classes or "uuuu" in classes:
+        kinds = classes.replace("u", "l")
+        for run in ("llll", "dddd"):
+            i = kinds.find(run)
+            while i != -1:
+                if lower[i:i + 4] in _SEQ_GRAMS:
+                    effective -= 1
+                i = kinds.find(run, i + 1)
+    bits = max(1, effective) * per_char
+
+    if skeleton in _COMMON:
+        bits = min(bits, 10.0)
+    return bits, skeleton
+
+def estimate_bits(password) -> float:
+    """Entropía estimada en bits (conjunto de caracteres usado, con penalizaciones)"""
+    return _analyze(password)[0]
+
+def _skeleton(lower):
+    """Contraseña sin dígitos/símbolos en los extremos ni sustituciones leet: 'P4ssw0rd2024!' -> 'password'"""
+    return lower.strip(_EDGES).translate(_LEET)
+
+def _label(service, username):
+    return f"{service} ({username})" if username else service
+
+class _Record:
+    # analysis: (huella, bits, hash del esqueleto o None, filtrada), el mismo para todas
+    # las entradas con la misma contraseña
+    __slots__ = ("label", "date", "fingerprint", "bits", "skeleton", "breached")
+
+    def __init__(self, entry, analysis):
+        self.label = _label(entry.service, entry.username)
+        self.date = entry.date
+        self.fingerprint, self.bits, self.skeleton, self.breached = analysis
+
+class _GcPaused:
+    """Recolector de ciclos parado durante build()/report(): crean cientos de miles de
+    objetos sin ciclos y cada recolección recorrería entero el índice ya construido"""
+    __slots__ = ("enabled",)
+
+    def __enter__(self):
+        self.enabled = gc.isenabled()
+        gc.disable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            gc.enable()
+        return False
+
+class AuditReport:
+    """Resultado de Auditor.report(); las entradas se identifican por su etiqueta"""
+
+    def __init__(self, total, reused, near_duplicates, weak, stale, undated, stale_days=STALE_DAYS, breached=()):
+        self.total = total
+        # Etiquetas de las entradas cuya contraseña aparece en el corpus de filtraciones
+        self.breached = list(breached)
+        # Grupos de etiquetas con la misma contraseña / contraseñas casi iguales
+        self.reused = reused
+        self.near_duplicates = near_duplicates
+        # (etiqueta, bits) de menos a más fuerte / (etiqueta, fecha) de más antigua a más reciente
+        self.weak = weak
+        self.stale = stale
+        self.undated = undated
+        self.stale_days = stale_days
+
+    @property
+    def affected(self):
+        labels = set(self.breached)
+        labels.update(label for group in self.reused for label in group)
+        labels.update(label for group in self.near_duplicates for label in group)
+        labels.update(label for label, _bits in self.weak)
+        labels.update(label for label, _date in self.stale)
+        return len(labels)
+
+    @property
+    def score(self):
+        """Porcentaje de entradas sin ningún problema"""
+        if not self.total:
+            return 100
+        return round(100 * (self.total - self.affected) / self.total)
+
+class Auditor:
+    """Análisis de reutilización, parecidos, debilidad y antigüedad de las contraseñas.
+
+    De cada entrada solo se guarda un hash con clave (BLAKE2b, clave aleatoria
+    por proceso) de la contraseña y de su esqueleto, la entropía estimada y la
+    fecha: ninguna copia en claro. Los resultados por entrada se calculan una
+    vez y se actualizan con update()/remove() cuando cambia una entrada.
+    Con breach (breach.BreachChecker) también se comprueba cada contraseña
+    contra el corpus de contraseñas filtradas.
+    """
+
+    def __init__(self, stale_days=STALE_DAYS, weak_bits=WEAK_BITS, breach=None):
+        self.stale_days = stale_days
+        self.weak_bits = weak_bits
+        self.breach = breach
+        # Hash con la clave ya cargada: cada _hash parte de una copia
+        self._hasher = hashlib.blake2b(key=secrets.token_bytes(32), digest_size=16)
+        self._records = {}
+        self._by_fingerprint = {}
+        self._by_skeleton = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def _hash(self, text):
+        hasher = self._hasher.copy()
+        hasher.update(text.encode())
+        return hasher.digest()
+
+    # --- Índice ---
+    def build(self, items):
+        """Analizar de una vez un iterable de (clave, Entry)"""
+        self._records.clear()
+        self._by_fingerprint.clear()
+        self._by_skeleton.clear()
+        with _GcPaused():
+            self._index(items)
+
+    def update(self, key, entry):
+        """Añadir o reanalizar una entrada; si la contraseña no cambia se reutiliza el análisis"""
+        old = self._records.get(key)
+        if old is not None and old.fingerprint == self._hash(entry.password):
+            old.label = _label(entry.service, entry.username)
+            old.date = entry.date
+            return
+        self.remove(key)
+        self._index(((key, entry),))
+
+    def remove(self, key):
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        self._unlink(self._by_fingerprint, record.fingerprint, key)
+        if record.skeleton is not None:
+            self._unlink(self._by_skeleton, record.skeleton, key)
+
+    @staticmethod
+    def _unlink(index, digest, key):
+        keys = index.get(digest)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[digest]
+
+    def _index(self, items):
+        """Analizar e indexar (clave, Entry).
+
+        Cada contraseña distinta se hashea, se analiza y se busca en el corpus de
+        filtraciones una sola vez, y cada esqueleto distinto se hashea una sola vez:
+        las demás entradas comparten el análisis y los conjuntos del índice. Los
+        diccionarios en claro que lo permiten son locales y se descartan al terminar.
+        """
+        records = self._records
+        by_fingerprint = self._by_fingerprint
+        by_skeleton = self._by_skeleton
+        hasher = self._hasher
+        breach = self.breach
+        passwords = {}
+        skeletons = {}
+        for key, entry in items:
+            password = entry.password
+            known = passwords.get(password)
+            if known is None:
+                hashed = hasher.copy()
+                hashed.update(password.encode())
+                fingerprint = hashed.digest()
+                same = by_fingerprint.get(fingerprint)
+                if same is None:
+                    same = by_fingerprint[fingerprint] = set()
+                bits, skeleton = _analyze(password)
+                breached = bool(password) and breach is not None and breach.contains(password)
+                # El esqueleto solo cuenta si queda algo reconocible (no para claves aleatorias cortas)
+                if len(skeleton) < NEAR_MIN_LENGTH:
+                    skeleton = similar = None
+                else:
+                    cached = skeletons.get(skeleton)
+                    if cached is None:
+                        hashed = hasher.copy()
+                        hashed.update(skeleton.encode())
+                        digest = hashed.digest()
+                        similar = by_skeleton.get(digest)
+                        if similar is None:
+                            similar = by_skeleton[digest] = set()
+                        cached = skeletons[skeleton] = (digest, similar)
+                    skeleton, similar = cached
+                known = passwords[password] = ((fingerprint, bits, skeleton, breached), same, similar)
+            analysis, same, similar = known
+            records[key] = _Record(entry, analysis)
+            same.add(key)
+            if similar is not None:
+                similar.add(key)
+
+    # --- Informe ---
+    def report(self, today=None) -> AuditReport:
+        with _GcPaused():
+            return self._report(today)
+
+    @staticmethod
+    def _mixed(records, keys):
+        """¿Hay al menos dos contraseñas distintas entre keys? (para en la segunda)"""
+        fingerprint = None
+        for key in keys:
+            other = records[key].fingerprint
+            if fingerprint is None:
+                fingerprint = other
+            elif other != fingerprint:
+                return True
+        return False
+
+    def _report(self, today):
+        records = self._records
+        reused = [sorted([records[key].label for key in keys])
+                  for keys in self._by_fingerprint.values() if len(keys) > 1]
+        reused.sort(key=lambda group: (-len(group), group))
+
+        near = []
+        for keys in self._by_skeleton.values():
+            # Casi iguales: mismo esqueleto con al menos dos contraseñas distintas
+            if len(keys) > 1 and self._mixed(records, keys):
+                near.append(sorted([records[key].label for key in keys]))
+        near.sort(key=lambda group: (-len(group), group))
+
+        # Fechas "YYYY-MM-DD..." (interfaz e isoformat): basta comparar el prefijo como texto
+        today = today or datetime.date.today()
+        cutoff = (today - datetime.timedelta(days=self.stale_days)).isoformat()
+        weak_bits = self.weak_bits
+        weak = []
+        stale = []
+        breached = []
+        undated = 0
+        # Una sola pasada para debilidad, antigüedad y filtraciones
+        for record in records.values():
+            if record.bits < weak_bits:
+                weak.append((record.label, record.bits))
+            date = record.date
+            if not date:
+                undated += 1
+            elif date[:10] < cutoff:
+                stale.append((record.label, date[:10]))
+            if record.breached:
+                breached.append(record.label)
+        weak.sort(key=lambda item: item[1])
+        stale.sort(key=lambda item: item[1])
+        breached.sort()
+        return AuditReport(len(records), reused, near, weak, stale, undated, self.stale_days, breached)
+
+def format_report(report, limit=10):
+    """Líneas de texto del informe (las usan cli.py audit y la interfaz)"""
+    lines = [f"🩺 Salud del vault: {report.score}% "
+             f"({report.total - report.affected} de {report.total} entradas sin problemas)"]
+
+    def section(title, items, fmt):
+        lines.append("")
+        lines.append(f"{title}: {len(items)}")
+        for item in items[:limit] if limit else items:
+            lines.append("  " + fmt(item))
+        if limit and len(items) > limit:
+            lines.append(f"  … y {len(items) - limit} más")
+
+    def group_text(group):
+        shown = ", ".join(group[:5])
+        return f"{shown} (+{len(group) - 5})" if len(group) > 5 else shown
+
+    if report.breached:
+        section("🚨 Contraseñas filtradas", report.breached, str)
+    section("♻️  Contraseñas reutilizadas (grupos)", report.reused, group_text)
+    section("👯 Contraseñas casi iguales (grupos)", report.near_duplicates, group_text)
+    section("⚠️  Contraseñas débiles", report.weak, lambda item: f"{item[0]} — ~{item[1]:.0f} bits")
+    section(f"⏳ Sin cambiar en más de {report.stale_days} días", report.stale, lambda item: f"{item[0]} — {item[1]}")
+    if report.undated:
+        lines.append(f"  ({report.undated} entradas sin fecha)")
+    return lines
@@ -0,0 +1,106 @@
+# bench_audit.py - Presupuesto de tiempo de la auditoría de contraseñas (Auditor)
+#
+# Uso:
+#   python bench_audit.py                       # falla (código 1) si build() + report() con
+#                                               # 100.000 entradas supera el presupuesto
+#   python bench_audit.py --sizes 1000 --sizes 100000 -o despues.json --compare antes.json
+#
+# Mide Auditor.build() (análisis inicial al abrir el panel de auditoría) y
+# Auditor.report() sobre vaults sintéticos con contraseñas aleatorias, variantes de
+# palabras comunes (casi iguales) y contraseñas reutilizadas. Se toma el mínimo de
+# varias repeticiones.
+import datetime
+import random
+import string
+import click
+import bench_common
+from audit import Auditor
+from entry import Entry
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Presupuesto de build() + report() para cualquier tamaño hasta 100.000 entradas
+BUDGET_MS = 1000
+
+_WORDS = ("password", "dragon", "monkey", "verano", "hola", "madrid", "qwerty", "letmein",
+          "barcelona", "sunshine", "futbol", "tequiero")
+
+def generate_items(count, seed=0):
+    """(clave, Entry) como los que pasa CryptoManager.attach_auditor()"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "!@#$%&*"
+    today = datetime.date.today()
+    shared = max(1, count // 200)
+    items = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            password = "".join(rng.choice(alphabet) for _ in range(rng.randint(12, 20)))
+        elif kind < 0.8:
+            password = f"{rng.choice(_WORDS).capitalize()}{rng.randint(0, 9999)}{rng.choice('!.#')}"
+        else:
+            password = f"Compartida#{rng.randint(0, shared)}"
+        date = today - datetime.timedelta(days=rng.randint(0, 4 * 365))
+        service = f"servicio-{i:06d}.example.com"
+        username = f"usuario{i}@example.com"
+        items.append(((service, username), Entry(service, username, password, "",
+                                                 date.strftime("%Y-%m-%d 12:00:00"))))
+    return items
+
+def bench_size(size, iterations, seed):
+    items = generate_items(size, seed)
+    state = {}
+
+    def reset():
+        # Liberar el auditor y el informe anteriores fuera de la medida
+        state.clear()
+        state["auditor"] = Auditor()
+
+    def build():
+        state["auditor"].build(items)
+
+    def report():
+        state["report"] = state["auditor"].report()
+
+    build_s = bench_common.time_calls(build, iterations, reset)
+    report_s = bench_common.time_calls(report, iterations, lambda: state.pop("report", None))
+    total_s = [b + r for b, r in zip(build_s, report_s)]
+    result = {"size": size, "build_s": min(build_s), "report_s": min(report_s)}
+    result.update(bench_common.summarize(total_s))
+    result["affected"] = state["report"].affected
+    return result
+
+@click.command()
+@click.option('--sizes', multiple=True, type=int, help='Número de entradas (repetible). Por defecto 1000..100000')
+@click.option('--iterations', default=5, show_default=True, help='Repeticiones por tamaño (se toma el mínimo)')
+@click.option('--budget-ms', default=BUDGET_MS, show_default=True, help='Presupuesto de build() + report()')
+@click.option('--seed', default=0, show_default=True)
+@click.option('-o', '--output', default='bench_audit.json', show_default=True, help='Archivo JSON de resultados')
+@click.option('--compare', 'baseline', type=click.Path(exists=True), help='JSON anterior con el que comparar')
+def main(sizes, iterations, budget_ms, seed, output, baseline):
+    """Comprobar que la auditoría completa cabe en el presupuesto de tiempo"""
+    sizes = sizes or DEFAULT_SIZES
+    results = []
+    failed = 0
+
+    click.echo(f"  {'entradas':>10}{'build ms':>11}{'report ms':>11}{'total ms':>11}{'presupuesto':>13}  estado")
+    for size in sizes:
+        result = bench_size(size, iterations, seed)
+        best_ms = result["min_s"] * 1000
+        over = best_ms > budget_ms
+        failed += over
+        status = "❌ supera el presupuesto" if over else "✅"
+        click.echo(f"  {size:>10}{result['build_s'] * 1000:>11.1f}{result['report_s'] * 1000:>11.1f}"
+                   f"{best_ms:>11.1f}{budget_ms:>13}  {status}")
+        result["budget_ms"] = budget_ms
+        results.append(result)
+
+    args = {"sizes": list(sizes), "iterations": iterations, "budget_ms": budget_ms, "seed": seed}
+    bench_common.write_results(output, "audit", args, results)
+    click.echo(f"\n💾 Resultados guardados en {output}")
+    if baseline:
+        bench_common.compare_results(baseline, results, ("size",), metric="min_s")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# bench_common.py - Utilidades compartidas por los benchmarks (estadísticas, memoria, JSON)
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def use_fake_token(latency_ms=0.0):
+    """Configurar el DNIe simulado con claves efímeras (llamar antes de autenticar)"""
+    os.environ["DNIE_BACKEND"] = "fake"
+    os.environ["DNIE_FAKE_KEY_DIR"] = ""
+    os.environ["DNIE_FAKE_LATENCY_MS"] = str(latency_ms)
+
+def percentile(sorted_values, pct):
+    """Percentil con interpolación lineal sobre una lista ya ordenada"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+def summarize(latencies):
+    """Resumen de latencias en segundos: min, media, p50/p90/p99, max y ops/s"""
+    values = sorted(latencies)
+    mean = sum(values) / len(values)
+    return {
+        "iterations": len(values),
+        "min_s": values[0],
+        "mean_s": mean,
+        "p50_s": percentile(values, 50),
+        "p90_s": percentile(values, 90),
+        "p99_s": percentile(values, 99),
+        "max_s": values[-1],
+        "ops_per_s": (1.0 / mean) if mean else None,
+    }
+
+def peak_rss_bytes():
+    """Pico de memoria residente del proceso (None si no está disponible)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB, macOS en bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def time_calls(fn, iterations, setup=None):
+    """Ejecutar fn() iterations veces y devolver las latencias (setup() no se mide)"""
+    latencies = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def measure_allocations(fn, setup=None):
+    """Una ejecución de fn() bajo tracemalloc: pico y total neto asignado en bytes"""
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes": peak - before, "alloc_net_bytes": current - before}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def write_results(path, benchmark, args, results):
+    """Guardar resultados con metadatos (commit, Python, plataforma) para comparar"""
+    data = {
+        "benchmark": benchmark,
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": args,
+        },
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+def compare_results(baseline_path, results, key_fields, metric="p50_s", higher_is_better=False):
+    """Imprimir la variación de metric respecto a un JSON anterior del mismo benchmark.
+
+    Se marcan con ⚠️ los empeoramientos de más del 10%.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {tuple(r.get(k) for k in key_fields): r for r in baseline["results"]}
+    print(f"\n📊 Comparación con {baseline_path} (commit {baseline['meta'].get('commit')}), métrica {metric}:")
+    for result in results:
+        key = tuple(result.get(k) for k in key_fields)
+        previous = old.get(key)
+        if not previous or not previous.get(metric) or result.get(metric) is None:
+            continue
+        ratio = result[metric] / previous[metric]
+        worse = ratio < 1 / 1.10 if higher_is_better else ratio > 1.10
+        flag = "⚠️ " if worse else "  "
+        print(f"{flag}{' / '.join(str(k) for k in key):<40} {previous[metric]:.6f} -> {result[metric]:.6f}  (x{ratio:.2f})")
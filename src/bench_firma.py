@@ -0,0 +1,211 @@
+# bench_firma.py - Benchmark de hash, firma y verificación de archivos con el DNIe
+#
+# Uso:
+#   python bench_firma.py                                   # 1K .. 1G y un directorio de 1000 archivos
+#   python bench_firma.py --sizes 1M --sizes 4G --latency-ms 300
+#   python bench_firma.py -o despues.json --compare antes.json
+#
+# Usa el DNIe simulado (clave software en proceso); --latency-ms simula el
+# tiempo de la tarjeta en cada operación. Los archivos se generan en un
+# directorio temporal y se leen con la caché de páginas del SO ya caliente.
+import os
+import shutil
+import tempfile
+import time
+import click
+import bench_common
+
+PIN = "1234"
+DEFAULT_SIZES = ("1K", "64K", "1M", "16M", "256M", "1G")
+# A partir de este tamaño se hace una sola repetición por operación
+LARGE_FILE = 64 * 2**20
+# sign_digest firma el digest calculado en streaming: solo existe en el DNIe simulado
+OPERATIONS = ("hash", "sign_file", "sign_digest", "verify", "verify_cached")
+
+_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30}
+
+def parse_size(text):
+    """'64K', '16M', '2G' o un número de bytes"""
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in _UNITS else ""
+    try:
+        return int(float(text[:len(text) - len(unit)]) * _UNITS[unit])
+    except ValueError:
+        raise click.BadParameter(f"Tamaño no válido: {text}")
+
+def format_size(size):
+    for unit in ("G", "M", "K"):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+def write_file(path, size, block):
+    """Escribir size bytes repitiendo un bloque aleatorio (sin generar GB de aleatoriedad)"""
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            chunk = block[:remaining]
+            f.write(chunk)
+            remaining -= len(chunk)
+    # Fuera de la ventana "racy" de la caché de digests, para que se pueda cachear
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+class _Timer:
+    """Acumulador del tiempo pasado en una función (host o tarjeta)"""
+
+    def __init__(self):
+        self.total = 0.0
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.total += time.perf_counter() - start
+        return timed
+
+class _TimedBackend:
+    """Envuelve el backend del token para medir el tiempo de tarjeta"""
+
+    def __init__(self, backend, timer):
+        self._backend = backend
+        self.sign = timer.wrap(backend.sign)
+        self.sign_digest = timer.wrap(backend.sign_digest)
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+def make_signer():
+    """DNIeManager autenticado contra el token simulado, con tiempos de host y tarjeta"""
+    from dnie import DNIeManager
+    from digest_cache import DigestCache
+
+    cache_dir = tempfile.mkdtemp(prefix="bench_firma_cache_")
+    dnie = DNIeManager(digest_cache=DigestCache(os.path.join(cache_dir, "digest_cache.json")))
+    if not dnie.authenticate(PIN):
+        raise click.ClickException("No se pudo autenticar con el DNIe simulado")
+    dnie.get_certificate()
+
+    host, card = _Timer(), _Timer()
+    dnie._calculate_file_hash = host.wrap(dnie._calculate_file_hash)
+    dnie._read_file = host.wrap(dnie._read_file)
+    dnie._backend = _TimedBackend(dnie._backend, card)
+    return dnie, host, card, cache_dir
+
+def bench_target(dnie, host, card, target, paths, iterations):
+    """Medir cada operación sobre la lista de archivos paths (un archivo o un directorio)"""
+    import signature_format
+
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+    sig_paths = []
+    for path in paths:
+        sig_path = signature_format.signature_path_for(path, "bin")
+        signature_format.save_signature_package(dnie.sign_file(path, PIN), sig_path, fmt="bin")
+        sig_paths.append(sig_path)
+
+    def run(op):
+        if op == "hash":
+            for path in paths:
+                dnie._calculate_file_hash(path, strict=True)
+        elif op == "sign_file":
+            for path in paths:
+                dnie.sign_file(path, PIN)
+        elif op == "sign_digest":
+            for path in paths:
+                dnie.sign_digest(bytes.fromhex(dnie._calculate_file_hash(path, strict=True)))
+        else:
+            use_cache = op == "verify_cached"
+            for path, sig_path in zip(paths, sig_paths):
+                if not dnie.verify_signature(path, sig_path, use_cache=use_cache):
+                    raise click.ClickException(f"Verificación fallida: {path}")
+
+    results = []
+    for op in OPERATIONS:
+        if op.endswith("_cached"):
+            # Calentar la caché de digests con los archivos actuales
+            for path in paths:
+                dnie._calculate_file_hash(path)
+        host.total = card.total = 0.0
+        latencies = bench_common.time_calls(lambda: run(op), iterations)
+        host_s, card_s = host.total / iterations, card.total / iterations
+
+        result = {"target": target, "operation": op, "files": len(paths), "bytes": total_bytes}
+        result.update(bench_common.summarize(latencies))
+        result["mb_per_s"] = total_bytes / 2**20 / result["p50_s"] if result["p50_s"] else None
+        result["files_per_s"] = len(paths) / result["p50_s"] if result["p50_s"] else None
+        result["host_hash_s"] = host_s
+        result["card_s"] = card_s
+        result["other_s"] = max(result["mean_s"] - host_s - card_s, 0.0)
+        result.update(bench_common.measure_allocations(lambda: run(op)))
+        result["peak_rss_bytes"] = bench_common.peak_rss_bytes()
+        results.append(result)
+    return results
+
+def print_results(title, results):
+    click.echo(f"\n✍️  {title}")
+    click.echo(f"  {'operación':<18}{'p50 ms':>10}{'MB/s':>10}{'arch/s':>10}{'hash ms':>10}"
+               f"{'tarjeta ms':>12}{'otros ms':>10}{'alloc pico':>12}{'RSS pico':>10}")
+    for r in results:
+        rss = f"{r['peak_rss_bytes'] / 2**20:.0f}M" if r['peak_rss_bytes'] else "-"
+        click.echo(f"  {r['operation']:<18}{r['p50_s'] * 1000:>10.2f}{r['mb_per_s']:>10.1f}"
+                   f"{r['files_per_s']:>10.1f}{r['host_hash_s'] * 1000:>10.2f}{r['card_s'] * 1000:>12.2f}"
+                   f"{r['other_s'] * 1000:>10.2f}{r['alloc_peak_bytes'] / 2**20:>11.1f}M{rss:>10}")
+
+@click.command()
+@click.option('--sizes', multiple=True, help='Tamaños de archivo, p. ej. 1K, 16M, 2G (repetible). Por defecto 1K..1G')
+@click.option('--dir-files', default=1000, show_default=True, help='Archivos del directorio de prueba (0 para omitirlo)')
+@click.option('--dir-file-size', default="4K", show_default=True, help='Tamaño de cada archivo del directorio')
+@click.option('--iterations', default=5, show_default=True,
+              help=f'Repeticiones por operación (una sola para archivos de más de {LARGE_FILE // 2**20} MiB)')
+@click.option('--latency-ms', default=0.0, show_default=True, help='Latencia simulada por operación de tarjeta')
+@click.option('--workdir', type=click.Path(file_okay=False), help='Directorio para los archivos generados')
+@click.option('-o', '--output', default='bench_firma.json', show_default=True, help='Archivo JSON de resultados')
+@click.option('--compare', 'baseline', type=click.Path(exists=True), help='JSON anterior con el que comparar')
+def main(sizes, dir_files, dir_file_size, iterations, latency_ms, workdir, output, baseline):
+    """Medir hash, firma y verificación de archivos (MB/s, archivos/s, memoria y tiempo de tarjeta)"""
+    bench_common.use_fake_token(latency_ms)
+    sizes = [parse_size(s) for s in (sizes or DEFAULT_SIZES)]
+    small_size = parse_size(dir_file_size)
+
+    workdir = tempfile.mkdtemp(prefix="bench_firma_", dir=workdir)
+    dnie, host, card, cache_dir = make_signer()
+    block = os.urandom(2**20)
+    all_results = []
+    try:
+        for size in sizes:
+            path = os.path.join(workdir, f"archivo_{format_size(size)}.bin")
+            write_file(path, size, block)
+            reps = iterations if size <= LARGE_FILE else 1
+            results = bench_target(dnie, host, card, f"file:{format_size(size)}", [path], reps)
+            print_results(f"Archivo de {format_size(size)}", results)
+            all_results.extend(results)
+            os.remove(path)
+
+        if dir_files:
+            directory = os.path.join(workdir, "directorio")
+            os.makedirs(directory)
+            paths = []
+            for i in range(dir_files):
+                path = os.path.join(directory, f"f{i:06d}.bin")
+                write_file(path, small_size, block[i % 1024:])
+                paths.append(path)
+            target = f"dir:{dir_files}x{format_size(small_size)}"
+            results = bench_target(dnie, host, card, target, paths, iterations)
+            print_results(f"Directorio de {dir_files} archivos de {format_size(small_size)}", results)
+            all_results.extend(results)
+    finally:
+        dnie.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    args = {"sizes": [format_size(s) for s in sizes], "dir_files": dir_files, "dir_file_size": dir_file_size,
+            "iterations": iterations, "latency_ms": latency_ms}
+    bench_common.write_results(output, "firma", args, all_results)
+    click.echo(f"\n💾 Resultados guardados en {output}")
+    if baseline:
+        bench_common.compare_results(baseline, all_results, ("target", "operation"))
+
+if __name__ == '__main__':
+    main()
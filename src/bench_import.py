@@ -0,0 +1,130 @@
+# bench_import.py - Presupuesto de tiempo de importación y de arranque de comandos cortos
+#
+# Uso:
+#   python bench_import.py                  # falla (código 1) si algún módulo supera su presupuesto
+#                                           # o no se puede importar
+#   python bench_import.py -o despues.json --compare antes.json
+#
+# Mide con "python -X importtime" el tiempo acumulado de importar cada módulo en un
+# proceso nuevo (mínimo de varias repeticiones) y comprueba que no arrastra
+# dependencias pesadas que deberían cargarse solo al usarse.
+import os
+import subprocess
+import sys
+import time
+import click
+import bench_common
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# módulo -> (presupuesto en ms, módulos que no debe importar). Los presupuestos dejan
+# margen para máquinas lentas; lo que detecta regresiones de verdad es la lista de
+# dependencias pesadas, que solo deben cargarse al usar su funcionalidad.
+BUDGETS = {
+    "metrics": (25, ()),
+    "digest_cache": (25, ()),
+    "signature_format": (30, ()),
+    "search": (30, ()),
+    "entry": (25, ()),
+    "vault_model": (25, ()),
+    "tasks": (60, ()),
+    "generator": (30, ()),
+    "audit": (30, ()),
+    "breach": (30, ()),
+    "importer": (40, ("xml.etree.ElementTree",)),
+    "cert_cache": (30, ("cryptography.x509",)),
+    "dnie": (60, ("cryptography.x509", "cryptography.hazmat.primitives.asymmetric.padding", "pkcs11", "PyKCS11")),
+    "crypto": (60, ("dnie", "cryptography.fernet", "cryptography.x509", "concurrent.futures")),
+    "cli": (120, ("dnie", "cryptography.fernet", "cryptography.x509", "pkcs11", "PyKCS11")),
+    "OTP": (80, ("qrcode", "PIL", "PIL.ImageTk")),
+    "interfaz": (600, ("OTP", "qrcode", "PIL.ImageTk", "cryptography.x509")),
+}
+
+# Comandos cortos cuyo tiempo total de proceso se mide (sin presupuesto, solo informativo)
+COMMANDS = (("cli.py", "--help"), ("cli.py", "users"))
+
+def import_profile(module):
+    """(ms acumulados del módulo, conjunto de módulos importados) o (None, error)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=SRC_DIR)
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "error"
+    total_us = None
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not parts[1].isdigit():
+            continue  # cabecera
+        name = parts[2]
+        imported.add(name)
+        if name == module:
+            total_us = int(parts[1])
+    return total_us / 1000.0, imported
+
+def command_time(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], capture_output=True, cwd=SRC_DIR)
+    return time.perf_counter() - start
+
+@click.command()
+@click.option('--modules', multiple=True, help='Módulos a medir (repetible). Por defecto todos los de BUDGETS')
+@click.option('--repeat', default=5, show_default=True, help='Repeticiones por módulo (se toma el mínimo)')
+@click.option('-o', '--output', default='bench_import.json', show_default=True, help='Archivo JSON de resultados')
+@click.option('--compare', 'baseline', type=click.Path(exists=True), help='JSON anterior con el que comparar')
+def main(modules, repeat, output, baseline):
+    """Comprobar el presupuesto de tiempo de importación de cada módulo"""
+    modules = modules or tuple(BUDGETS)
+    results = []
+    failed = 0
+
+    click.echo(f"  {'módulo':<18}{'ms':>10}{'presupuesto':>13}  estado")
+    for module in modules:
+        budget_ms, forbidden = BUDGETS.get(module, (None, ()))
+        times = []
+        imported = set()
+        error = None
+        for _ in range(repeat):
+            elapsed, info = import_profile(module)
+            if elapsed is None:
+                error = info
+                break
+            times.append(elapsed)
+            imported = info
+
+        if error:
+            # Un módulo que no se importa no cumple su presupuesto
+            failed += 1
+            click.echo(f"  {module:<18}{'-':>10}{budget_ms or '-':>13}  ❌ no se pudo importar: {error}")
+            continue
+
+        best = min(times)
+        eager = sorted(name for name in forbidden if name in imported)
+        problems = []
+        if budget_ms is not None and best > budget_ms:
+            problems.append("supera el presupuesto")
+        if eager:
+            problems.append("importa " + ", ".join(eager))
+        failed += bool(problems)
+        status = "❌ " + "; ".join(problems) if problems else "✅"
+        click.echo(f"  {module:<18}{best:>10.1f}{budget_ms or '-':>13}  {status}")
+        results.append({"target": module, "import_ms": best, "budget_ms": budget_ms,
+                        "p50_s": bench_common.percentile(sorted(times), 50) / 1000.0,
+                        "eager_imports": eager})
+
+    click.echo("")
+    for args in COMMANDS:
+        elapsed = min(command_time(args) for _ in range(repeat))
+        click.echo(f"⏱️  python {' '.join(args)}: {elapsed * 1000:.0f} ms")
+        results.append({"target": " ".join(args), "p50_s": elapsed})
+
+    bench_common.write_results(output, "import", {"modules": list(modules), "repeat": repeat}, results)
+    click.echo(f"\n💾 Resultados guardados en {output}")
+    if baseline:
+        bench_common.compare_results(baseline, results, ("target",))
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
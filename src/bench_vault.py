@@ -0,0 +1,154 @@
+# bench_vault.py - Benchmark de las operaciones del vault (CryptoManager) según su tamaño
+#
+# Uso:
+#   python bench_vault.py                                   # 10 .. 100.000 entradas
+#   python bench_vault.py --sizes 100 --sizes 10000 -o antes.json
+#   python bench_vault.py -o despues.json --compare antes.json
+#
+# Usa el DNIe simulado (sin lector) y el PBKDF2 real de la derivación de clave.
+import os
+import random
+import shutil
+import string
+import tempfile
+import time
+import click
+import bench_common
+from entry import Entry
+
+PIN = "1234"
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+OPERATIONS = ("load_db", "save_db", "list_entries", "add_password", "update_password", "delete_password")
+
+_WORDS = ("cuenta", "banco", "correo", "trabajo", "servidor", "acceso", "recuperación", "pregunta",
+          "respuesta", "clave", "wifi", "router", "factura", "cliente", "proyecto", "VPN", "backup")
+
+def _random_note(rng, mean_size):
+    """Nota con longitud aproximadamente exponencial alrededor de mean_size (muchas vacías)"""
+    if mean_size <= 0 or rng.random() < 0.3:
+        return ""
+    target = int(rng.expovariate(1.0 / mean_size))
+    words = []
+    length = 0
+    while length < target:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def generate_entries(count, note_size, seed=0):
+    """Entradas sintéticas (Entry), como las que guarda CryptoManager"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + string.punctuation
+    entries = []
+    for i in range(count):
+        entries.append(Entry(
+            f"{rng.choice(_WORDS)}-{i:06d}.example.com",
+            f"usuario{i}@example.com",
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(12, 24))),
+            _random_note(rng, note_size),
+            f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+        ))
+    return entries
+
+def bench_size(size, iterations, note_size, seed):
+    from crypto import CryptoManager
+
+    vaults_dir = tempfile.mkdtemp(prefix="bench_vault_")
+    try:
+        crypto = CryptoManager(multi_user=True, vaults_dir=vaults_dir)
+        start = time.perf_counter()
+        if not crypto.initialize_with_pin(PIN):
+            raise click.ClickException("No se pudo autenticar con el DNIe simulado")
+        unlock_s = time.perf_counter() - start
+
+        db = {"entries": generate_entries(size, note_size, seed)}
+        crypto.save_db(db)
+        rng = random.Random(seed + 1)
+
+        def pick():
+            return rng.choice(db["entries"])
+
+        state = {}
+
+        def choose_target():
+            state["entry"] = pick()
+
+        def add():
+            crypto.add_password(f"bench-{rng.random()}", "bench@example.com", "Bench#Password1")
+
+        def update():
+            entry = state["entry"]
+            crypto.update_password(entry.service, entry.username, "Updated#Password2")
+
+        def delete():
+            entry = state["entry"]
+            crypto.delete_password(entry.service, entry.username)
+
+        def restore():
+            # Volver a dejar el vault con el contenido original antes de cada borrado
+            crypto.save_db(db)
+            choose_target()
+
+        operations = {
+            "load_db": (crypto.load_db, None),
+            "save_db": (lambda: crypto.save_db(db), None),
+            "list_entries": (crypto.list_entries, None),
+            "add_password": (add, None),
+            "update_password": (update, choose_target),
+            "delete_password": (delete, restore),
+        }
+
+        vault_bytes = os.path.getsize(crypto.db_file)
+        results = []
+        for name in OPERATIONS:
+            fn, setup = operations[name]
+            latencies = bench_common.time_calls(fn, iterations, setup)
+            result = {"size": size, "operation": name, "vault_bytes": vault_bytes}
+            result.update(bench_common.summarize(latencies))
+            result.update(bench_common.measure_allocations(fn, setup))
+            result["peak_rss_bytes"] = bench_common.peak_rss_bytes()
+            results.append(result)
+
+        crypto.close()
+        return unlock_s, results
+    finally:
+        shutil.rmtree(vaults_dir, ignore_errors=True)
+
+@click.command()
+@click.option('--sizes', multiple=True, type=int, help='Tamaños de vault (repetible). Por defecto 10..100000')
+@click.option('--iterations', default=10, show_default=True, help='Repeticiones por operación')
+@click.option('--note-size', default=120, show_default=True, help='Tamaño medio de las notas en caracteres')
+@click.option('--latency-ms', default=0.0, show_default=True, help='Latencia simulada por operación de tarjeta')
+@click.option('--seed', default=0, show_default=True)
+@click.option('-o', '--output', default='bench_vault.json', show_default=True, help='Archivo JSON de resultados')
+@click.option('--compare', 'baseline', type=click.Path(exists=True), help='JSON anterior con el que comparar')
+def main(sizes, iterations, note_size, latency_ms, seed, output, baseline):
+    """Medir load/save/add/update/delete/list del vault con tamaños crecientes"""
+    bench_common.use_fake_token(latency_ms)
+    sizes = sizes or DEFAULT_SIZES
+
+    all_results = []
+    for size in sizes:
+        unlock_s, results = bench_size(size, iterations, note_size, seed)
+        click.echo(f"\n🔐 Vault de {size} entradas ({results[0]['vault_bytes'] / 1024:.1f} KiB cifrados), "
+                   f"desbloqueo {unlock_s * 1000:.1f} ms")
+        click.echo(f"  {'operación':<16}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'ops/s':>10}"
+                   f"{'alloc pico':>12}{'RSS pico':>12}")
+        for r in results:
+            rss = f"{r['peak_rss_bytes'] / 2**20:.1f}M" if r['peak_rss_bytes'] else "-"
+            click.echo(f"  {r['operation']:<16}{r['p50_s'] * 1000:>10.2f}{r['p90_s'] * 1000:>10.2f}"
+                       f"{r['p99_s'] * 1000:>10.2f}{r['ops_per_s']:>10.1f}"
+                       f"{r['alloc_peak_bytes'] / 2**20:>11.1f}M{rss:>12}")
+            r["unlock_s"] = unlock_s
+        all_results.extend(results)
+
+    args = {"sizes": list(sizes), "iterations": iterations, "note_size": note_size,
+            "latency_ms": latency_ms, "seed": seed}
+    bench_common.write_results(output, "vault", args, all_results)
+    click.echo(f"\n💾 Resultados guardados en {output}")
+    if baseline:
+        bench_common.compare_results(baseline, all_results, ("size", "operation"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# breach.py - Comprobación offline de contraseñas filtradas (corpus SHA-1 ordenado, estilo HIBP)
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+# Formato del corpus:
+#   cabecera: MAGIC (8 bytes) + versión (uint32) + reservado (uint32) + número de digests (uint64)
+#   índice:   65537 posiciones (uint64) donde empieza cada prefijo de 2 bytes
+#   digests:  SHA-1 de 20 bytes, ordenados y sin repetir
+MAGIC = b"DNIEHIBP"
+VERSION = 1
+DIGEST_SIZE = 20
+_HEADER = struct.Struct("<8sIIQ")
+_BUCKETS = 1 << 16
+_INDEX_SIZE = (_BUCKETS + 1) * 8
+_DATA_OFFSET = _HEADER.size + _INDEX_SIZE
+
+# Digests que se ordenan en memoria a la vez al construir el corpus (~20 MB)
+RUN_SIZE = 1_000_000
+
+def _default_corpus_file():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    return os.path.join(parent_dir, ".Contraseñas", "breached.bin")
+
+def corpus_path():
+    """Ruta del corpus: DNIE_BREACH_CORPUS o .Contraseñas/breached.bin"""
+    return os.environ.get("DNIE_BREACH_CORPUS") or _default_corpus_file()
+
+def password_digest(password) -> bytes:
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+class _Digests:
+    """Vista de secuencia sobre los digests del mmap (para bisect, sin copiar el archivo)"""
+
+    __slots__ = ("_mm", "_count")
+
+    def __init__(self, mm, count):
+        self._mm = mm
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = _DATA_OFFSET + i * DIGEST_SIZE
+        return self._mm[start:start + DIGEST_SIZE]
+
+class BreachChecker:
+    """Búsqueda de contraseñas en un corpus de digests SHA-1 mapeado en memoria.
+
+    El archivo no se carga: el sistema operativo trae bajo demanda las páginas
+    que toca cada búsqueda. El índice por prefijo de 2 bytes acota la búsqueda
+    binaria a un cubo (~15 comparaciones con mil millones de digests).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or corpus_path()
+        self._file = open(self.path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _DATA_OFFSET:
+                raise Exception(f"❌ {self.path} no es un corpus de contraseñas filtradas")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        magic, version, _reserved, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or size != _DATA_OFFSET + count * DIGEST_SIZE:
+            self.close()
+            raise Exception(f"❌ {self.path} no es un corpus válido (versión {VERSION})")
+        self._digests = _Digests(self._mm, count)
+
+    @classmethod
+    def open_default(cls):
+        """Corpus por defecto, o None si no hay ninguno instalado"""
+        path = corpus_path()
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def contains_digest(self, digest) -> bool:
+        prefix = digest[0] << 8 | digest[1]
+        lo, hi = struct.unpack_from("<QQ", self._mm, _HEADER.size + prefix * 8)
+        i = bisect.bisect_left(self._digests, digest, lo, hi)
+        return i < hi and self._digests[i] == digest
+
+    def contains(self, password) -> bool:
+        """¿Aparece la contraseña en el corpus?"""
+        return self.contains_digest(password_digest(password))
+
+# --- Construcción del corpus ---
+def _parse_lines(source, plain):
+    """Digests de un archivo HIBP ("HEX:veces" o "HEX") o, con plain, de contraseñas en claro"""
+    with open(source, "r", encoding="utf-8", errors="surrogateescape") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if plain:
+                yield hashlib.sha1(line.encode("utf-8", "surrogateescape")).digest()
+            else:
+                try:
+                    digest = bytes.fromhex(line[:2 * DIGEST_SIZE])
+                except ValueError:
+                    digest = b""
+                if len(digest) != DIGEST_SIZE:
+                    raise Exception(f"❌ Línea no válida en {source}: {line[:60]!r}")
+                yield digest
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(DIGEST_SIZE * 4096)
+            if not block:
+                return
+            for start in range(0, len(block), DIGEST_SIZE):
+                yield block[start:start + DIGEST_SIZE]
+
+def build_corpus(source, output, plain=False, run_size=RUN_SIZE, progress=None):
+    """Crear el corpus binario a partir de un volcado de texto.
+
+    La entrada no tiene que estar ordenada ni caber en memoria: se ordena por
+    tandas de run_size digests en archivos temporales que después se mezclan.
+    progress(líneas_leídas) se llama tras cada tanda. Devuelve los digests escritos.
+    """
+    out_dir = os.path.dirname(os.path.abspath(output))
+    os.makedirs(out_dir, exist_ok=True)
+    runs = []
+    try:
+        read = 0
+        run = []
+        for digest in _parse_lines(source, plain):
+            run.append(digest)
+            if len(run) >= run_size:
+                runs.append(_write_run(run, out_dir))
+                read += len(run)
+                run = []
+                if progress:
+                    progress(read)
+        if runs and run:
+            runs.append(_write_run(run, out_dir))
+            run = []
+        merged = heapq.merge(*(_read_run(path) for path in runs)) if runs else iter(sorted(run))
+        return _write_corpus(merged, output)
+    finally:
+        for path in runs:
+            os.remove(path)
+
+def _write_run(run, out_dir):
+    run.sort()
+    fd, path = tempfile.mkstemp(prefix="breach-run-", dir=out_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(run))
+    return path
+
+def _write_corpus(digests, output):
+    tmp = output + ".tmp"
+    index = [0] * (_BUCKETS + 1)
+    count = 0
+    previous = None
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _DATA_OFFSET)
+        batch = []
+        for digest in digests:
+            if digest == previous:
+                continue
+            previous = digest
+            index[(digest[0] << 8 | digest[1]) + 1] += 1
+            batch.append(digest)
+            if len(batch) >= 65536:
+                f.write(b"".join(batch))
+                count += len(batch)
+                batch = []
+        f.write(b"".join(batch))
+        count += len(batch)
+        # Recuentos por prefijo -> posición de inicio de cada prefijo
+        for prefix in range(1, _BUCKETS + 1):
+            index[prefix] += index[prefix - 1]
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, count))
+        f.write(struct.pack(f"<{_BUCKETS + 1}Q", *index))
+    os.replace(tmp, output)
+    return count
@@ -0,0 +1,186 @@
+# cert_cache.py - Caché LRU de certificados parseados y validados para verificación de firmas
+import glob
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Profundidad máxima de cadena (DNIe: raíz -> AC subordinada -> ciudadano)
+MAX_CHAIN_DEPTH = 4
+
+def _not_before(cert):
+    value = getattr(cert, "not_valid_before_utc", None)
+    return value if value is not None else cert.not_valid_before.replace(tzinfo=timezone.utc)
+
+def _not_after(cert):
+    value = getattr(cert, "not_valid_after_utc", None)
+    return value if value is not None else cert.not_valid_after.replace(tzinfo=timezone.utc)
+
+def load_ca_bundle(path):
+    """Cargar certificados de CA desde un PEM/DER o un directorio con varios"""
+    if not path:
+        return []
+    from cryptography import x509
+    files = sorted(glob.glob(os.path.join(path, "*"))) if os.path.isdir(path) else [path]
+    cas = []
+    for file_path in files:
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"-----BEGIN CERTIFICATE-----" in data:
+            cas.extend(x509.load_pem_x509_certificates(data))
+        else:
+            try:
+                cas.append(x509.load_der_x509_certificate(data))
+            except ValueError:
+                continue
+    return cas
+
+class CachedCertificate:
+    """Certificado parseado junto con el resultado de la comprobación de su cadena.
+
+    La vigencia no se cachea como válido/no válido: depende del momento que
+    interese (error_at), normalmente el de la firma.
+    """
+    __slots__ = ("fingerprint", "certificate", "public_key", "not_before", "not_after",
+                 "chain_error", "expires_at")
+
+    def __init__(self, fingerprint, certificate):
+        self.fingerprint = fingerprint
+        self.certificate = certificate
+        self.public_key = certificate.public_key()
+        self.not_before = _not_before(certificate)
+        self.not_after = _not_after(certificate)
+        self.chain_error = None
+        self.expires_at = 0.0
+
+    def error_at(self, when=None):
+        """Motivo por el que el certificado no era válido en when (UTC; por defecto ahora), o None"""
+        when = when or datetime.now(timezone.utc)
+        if when < self.not_before:
+            return "El certificado todavía no era válido en esa fecha"
+        if when > self.not_after:
+            return "El certificado había caducado en esa fecha"
+        return self.chain_error
+
+    @property
+    def expired(self):
+        return datetime.now(timezone.utc) > self.not_after
+
+class CertificateCache:
+    """Caché LRU por huella SHA-256 del certificado.
+
+    Guarda el certificado parseado, su clave pública y el resultado de la
+    comprobación de vigencia y cadena contra el bundle de CAs del DNIe. La
+    validación solo se repite cuando caduca el resultado cacheado (ttl).
+    """
+
+    def __init__(self, max_size=256, ttl=300, ca_bundle=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.ca_bundle = ca_bundle if ca_bundle is not None else os.environ.get("DNIE_CA_BUNDLE")
+        self._cas = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _ca_certificates(self):
+        if self._cas is None:
+            self._cas = load_ca_bundle(self.ca_bundle)
+        return self._cas
+
+    def lookup(self, fingerprint: str):
+        """Devolver el certificado cacheado con esa huella (revalidado si caducó) o None"""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            stale = time.monotonic() >= entry.expires_at
+        if stale:
+            self._validate(entry)
+        return entry
+
+    def get(self, certificate_data: bytes, fingerprint: str = None) -> CachedCertificate:
+        """Devolver el certificado parseado y validado (desde caché si es posible)"""
+        fingerprint = fingerprint or hashlib.sha256(certificate_data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                stale = time.monotonic() >= entry.expires_at
+            else:
+                self.misses += 1
+
+        if entry is None:
+            # cryptography.x509 es pesado: solo se importa al parsear el primer certificado
+            from cryptography import x509
+            entry = CachedCertificate(fingerprint, x509.load_der_x509_certificate(certificate_data))
+            with self._lock:
+                self._entries[fingerprint] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            stale = True
+
+        if stale:
+            self._validate(entry)
+        return entry
+
+    def _validate(self, entry):
+        """Comprobar (si hay bundle de CAs) la cadena de confianza.
+
+        El resultado se calcula fuera del cerrojo y se publica dentro, para que
+        otro hilo nunca vea un resultado a medias.
+        """
+        chain_error = self._check_chain(entry.certificate) if self.ca_bundle else None
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            entry.chain_error = chain_error
+            entry.expires_at = expires_at
+
+    def _check_chain(self, cert):
+        cas = self._ca_certificates()
+        if not cas:
+            return f"No se pudo cargar el bundle de CAs: {self.ca_bundle}"
+
+        current = cert
+        for _ in range(MAX_CHAIN_DEPTH):
+            issuers = [ca for ca in cas if ca.subject == current.issuer]
+            issuer = None
+            for candidate in issuers:
+                try:
+                    current.verify_directly_issued_by(candidate)
+                    issuer = candidate
+                    break
+                except Exception:
+                    continue
+            if issuer is None:
+                return "El certificado no ha sido emitido por una CA del DNIe de confianza"
+            if issuer.subject == issuer.issuer:
+                return None  # raíz alcanzada
+            current = issuer
+        return "Cadena de certificados demasiado larga"
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+# Caché compartida por todo el proceso
+_default_cache = None
+
+def default_cache() -> CertificateCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CertificateCache()
+    return _default_cache
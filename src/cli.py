@@ -1,12 +1,33 @@
 # cli.py - CLI con sesión persistente
 import click
 import getpass
+import os
+from pathlib import Path
 from crypto import CryptoManager
+import metrics
 
 @click.group()
-def cli():
+@click.option('--fake-token', is_flag=True, help='Usar un DNIe simulado en memoria (igual que DNIE_BACKEND=fake)')
+@click.option('--trace', is_flag=True, help='Medir las fases del comando y mostrar el desglose al terminar')
+@click.option('--trace-file', type=click.Path(dir_okay=False),
+              help='Archivo JSONL donde registrar las trazas (por defecto .Contraseñas/trace.jsonl)')
+@click.pass_context
+def cli(ctx, fake_token, trace, trace_file):
     """Password Manager secured by DNIe (Sesión Persistente)"""
-    pass
+    if fake_token:
+        os.environ["DNIE_BACKEND"] = "fake"
+    if trace or trace_file:
+        metrics.enable(trace_file or metrics.default_trace_file())
+    if metrics.enabled() and ctx.invoked_subcommand != 'stats':
+        metrics.begin_operation(ctx.invoked_subcommand)
+        ctx.call_on_close(lambda: _finish_trace(trace))
+
+def _finish_trace(show):
+    operation = metrics.end_operation()
+    if show and operation is not None:
+        counters = metrics.snapshot()["counters"]
+        for line in metrics.format_breakdown(operation.name, operation.duration_ms, operation.breakdown(), counters):
+            click.echo(line)
 
 def get_authenticated_crypto():
     """Obtener crypto manager autenticado"""
@@ -43,8 +64,8 @@ def add(service, username, password):
     except Exception as e:
         click.echo(f"❌ Error: {str(e)}")
 
-@cli.command()
-def list():
+@cli.command(name='list')
+def list_cmd():
     """List all password entries (uses existing session)"""
     try:
         crypto = get_authenticated_crypto()
@@ -55,8 +76,8 @@ def list():
         else:
             click.echo("🔐 Stored passwords:")
             for entry in entries:
-                click.echo(f"  Service: {entry['service']}")
-                click.echo(f"  Username: {entry['username']}")
+                click.echo(f"  Service: {entry.service}")
+                click.echo(f"  Username: {entry.username}")
                 click.echo("  " + "-" * 30)
             
         crypto.close()
@@ -64,6 +85,143 @@ def list():
     except Exception as e:
         click.echo(f"❌ Error: {str(e)}")
 
+@cli.command()
+@click.argument('query')
+@click.option('--limit', default=20, show_default=True, help='Número máximo de resultados (0: todos)')
+def search(query, limit):
+    """Search entries by service, username or notes (ranked)"""
+    from search import SearchIndex
+    try:
+        crypto = get_authenticated_crypto()
+        entries = crypto.list_entries()
+        crypto.close()
+        
+        index = SearchIndex()
+        index.build((i, entry.service, entry.username, entry.notes)
+                    for i, entry in enumerate(entries))
+        results = index.search(query, limit=limit or None)
+        
+        if not results:
+            click.echo(f"📭 Sin resultados para '{query}'")
+            return
+        click.echo(f"🔎 {len(results)} resultado(s) para '{query}':")
+        for i in results:
+            click.echo(f"  Service: {entries[i].service}")
+            click.echo(f"  Username: {entries[i].username}")
+            click.echo("  " + "-" * 30)
+
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+
+@cli.command()
+@click.option('--limit', default=10, show_default=True, help='Elementos a mostrar por sección (0: todos)')
+@click.option('--stale-days', default=365, show_default=True, help='Días sin cambiar para considerar una contraseña antigua')
+@click.option('--weak-bits', default=50, show_default=True, help='Entropía estimada mínima (bits) de una contraseña fuerte')
+@click.option('--corpus', type=click.Path(exists=True, dir_okay=False),
+              help='Corpus de contraseñas filtradas (por defecto DNIE_BREACH_CORPUS o .Contraseñas/breached.bin)')
+def audit(limit, stale_days, weak_bits, corpus):
+    """Audit password health: breached, reused, near-duplicate, weak and stale entries"""
+    from audit import Auditor, format_report
+    from breach import BreachChecker
+    try:
+        crypto = get_authenticated_crypto()
+        breach = BreachChecker(corpus) if corpus else crypto.breach_checker()
+        if breach is None:
+            click.echo("💡 Sin corpus de contraseñas filtradas (cli.py build-corpus): no se comprueban filtraciones")
+        auditor = crypto.attach_auditor(Auditor(stale_days=stale_days, weak_bits=weak_bits, breach=breach))
+        if corpus:
+            breach.close()
+        crypto.close()
+
+        for line in format_report(auditor.report(), limit=limit):
+            click.echo(line)
+
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+
+@cli.command('import')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'bitwarden', 'keepass']),
+              help='Formato de la exportación (por defecto según la extensión: .csv, .json, .xml)')
+@click.option('--batch-size', default=20000, show_default=True, help='Entradas por escritura cifrada del vault')
+def import_(file, fmt, batch_size):
+    """Import entries from a CSV, Bitwarden JSON or KeePass XML export"""
+    import importer
+    try:
+        crypto = get_authenticated_crypto()
+        last = [-1]
+
+        def progress(done, total):
+            percent = done * 100 // total if total else 100
+            if percent // 10 != last[0]:
+                last[0] = percent // 10
+                click.echo(f"  … {percent}%", err=True)
+
+        result = importer.import_file(file, crypto, fmt=fmt, batch_size=batch_size, progress=progress)
+        crypto.close()
+        click.echo(f"✅ {result.summary()} ({result.batches} escritura(s) del vault)")
+
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+
+@cli.command('build-corpus')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output', type=click.Path(dir_okay=False), required=False)
+@click.option('--plain', is_flag=True, help='SOURCE tiene contraseñas en claro (una por línea) en lugar de SHA-1 en hex')
+def build_corpus(source, output, plain):
+    """Build the offline breached-password corpus from a HIBP-style SHA-1 dump"""
+    import breach
+    output = output or breach.corpus_path()
+    try:
+        count = breach.build_corpus(source, output, plain=plain,
+                                    progress=lambda read: click.echo(f"  … {read} líneas", err=True))
+        click.echo(f"✅ Corpus con {count} contraseñas filtradas en {output}")
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+        raise SystemExit(1)
+
+@cli.command()
+@click.option('--count', '-n', default=1, show_default=True, help='Número de contraseñas a generar')
+@click.option('--length', '-l', default=15, show_default=True, help='Longitud de cada contraseña')
+@click.option('--no-lower', is_flag=True, help='Sin minúsculas')
+@click.option('--no-upper', is_flag=True, help='Sin mayúsculas')
+@click.option('--no-digits', is_flag=True, help='Sin dígitos')
+@click.option('--no-symbols', is_flag=True, help='Sin símbolos')
+@click.option('--exclude', default='', help='Caracteres a excluir')
+@click.option('--no-ambiguous', is_flag=True, help='Excluir caracteres ambiguos (Il1O0o...)')
+@click.option('--passphrase', 'words', type=int, help='Generar frases de paso de N palabras en lugar de contraseñas')
+@click.option('--wordlist', type=click.Path(exists=True, dir_okay=False), help='Lista de palabras para --passphrase')
+@click.option('--separator', default='-', show_default=True, help='Separador de palabras (--passphrase)')
+@click.option('--quiet', '-q', is_flag=True, help='No mostrar la entropía estimada (stderr)')
+def generate(count, length, no_lower, no_upper, no_digits, no_symbols, exclude, no_ambiguous,
+             words, wordlist, separator, quiet):
+    """Generate passwords or passphrases (no DNIe needed)"""
+    import generator
+    try:
+        if words:
+            if not wordlist:
+                raise Exception("--passphrase necesita --wordlist")
+            policy = generator.PassphrasePolicy(generator.load_wordlist(wordlist), words, separator)
+            produce = lambda n: [generator.generate_passphrase(policy) for _ in range(n)]
+        else:
+            policy = generator.PasswordPolicy(length, lower=not no_lower, upper=not no_upper,
+                                              digits=not no_digits, symbols=not no_symbols,
+                                              exclude=exclude, exclude_ambiguous=no_ambiguous)
+            produce = generator.PasswordGenerator(policy).generate_many
+        
+        if not quiet:
+            click.echo(f"🎲 Entropía estimada: {policy.entropy_bits():.1f} bits", err=True)
+        # Por tandas: la salida empieza enseguida y la memoria no crece con --count
+        remaining = count
+        while remaining > 0:
+            batch = min(remaining, 100000)
+            click.echo("\n".join(produce(batch)))
+            remaining -= batch
+        
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}", err=True)
+        raise SystemExit(1)
+
 @cli.command()
 def users():
     """List all DNIe users with vaults"""
@@ -80,7 +238,7 @@ def users():
                 if user_info:
                     click.echo(f"  User: {user_id[:16]}...")
                     click.echo(f"  Vault: {user_info['vault_dir']}")
-                    click.echo(f"  Data size: {user_info['entries_count']} bytes")
+                    click.echo(f"  Data size: {user_info['data_size']} bytes")
                     click.echo("  " + "-" * 40)
         else:
             click.echo(f"📁 Vaults directory: {vaults_dir}")
@@ -92,12 +250,18 @@ def users():
         click.echo(f"❌ Error: {str(e)}")
 
 @cli.command()
-def status():
+@click.option('--wait', 'wait_seconds', type=float, default=0, help='Esperar hasta N segundos a que se inserte el DNIe')
+def status(wait_seconds):
     """Check DNIe status and multi-user info"""
     try:
-        from dnie import verificar_estado_dnie
+        from slot_watcher import get_watcher
+        
+        watcher = get_watcher()
+        if not watcher.present and wait_seconds > 0:
+            click.echo("📱 Esperando a que se inserte el DNIe...")
+            watcher.wait_for_card(wait_seconds)
         
-        if verificar_estado_dnie():
+        if watcher.present:
             click.echo("✅ DNIe está conectado y listo para autenticación")
             
             crypto = CryptoManager(multi_user=True)
@@ -107,10 +271,144 @@ def status():
             click.echo(f"👥 Usuarios registrados: {len(users)}")
             click.echo("🔐 Modo: Multi-usuario (cada DNIe tiene su vault)")
         else:
+            if watcher.error:
+                click.echo(f"❌ Error accediendo al DNIe: {watcher.error}")
             click.echo("❌ No se detectó ningún DNIe - por favor inserte su DNIe")
             
     except Exception as e:
         click.echo(f"❌ Error accediendo al DNIe: {str(e)}")
 
+def _make_dnie(no_cache):
+    """Crear DNIeManager con la caché de digests (salvo --no-cache)"""
+    from dnie import DNIeManager
+    from digest_cache import DigestCache
+    return DNIeManager(digest_cache=None if no_cache else DigestCache())
+
+def _echo_cache_stats(digest_cache):
+    if digest_cache is not None:
+        stats = digest_cache.stats()
+        click.echo(f"🗂️  Caché de digests: {stats['hits']} aciertos, {stats['misses']} fallos")
+
+@cli.command()
+def tokens():
+    """List the DNIe/tokens present in every reader"""
+    try:
+        from dnie import listar_tokens
+        found = listar_tokens()
+        if not found:
+            click.echo("❌ No se detectó ningún DNIe")
+        for info in found:
+            click.echo(f"  Slot {info['slot_id']}: {info['label']} (serie {info['serial']})")
+            if info.get("subject"):
+                click.echo(f"    Certificado: {info['subject']}")
+            if info.get("certificate_fingerprint"):
+                click.echo(f"    Huella: {info['certificate_fingerprint']}")
+    except Exception as e:
+        click.echo(f"❌ Error accediendo al DNIe: {str(e)}")
+
+@cli.command()
+@click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--no-cache', is_flag=True, help='No actualizar la caché de digests')
+@click.option('--format', 'fmt', type=click.Choice(['json', 'bin']), default='json', show_default=True,
+              help='json: <file>.firma.json; bin: <file>.firma.sig compacto')
+@click.option('--embed-cert', is_flag=True, help='(bin) Embeber el certificado en lugar de referenciarlo en .dnie_certs')
+@click.option('--token', 'token_serials', multiple=True, help='Número de serie del token a usar (repetible)')
+@click.option('--all-tokens', is_flag=True, help='Repartir las firmas entre todos los DNIe conectados')
+def sign(files, no_cache, fmt, embed_cert, token_serials, all_tokens):
+    """Sign one or more files with the DNIe (in parallel across several tokens)"""
+    from signature_format import save_signature_package, signature_path_for, default_cert_store
+    from signing_scheduler import SigningScheduler
+    from digest_cache import DigestCache
+    from dnie import listar_tokens
+    
+    try:
+        serials = list(token_serials)
+        if not serials:
+            present = [info["serial"] for info in listar_tokens(with_certificate=False)]
+            if not present:
+                raise Exception("No se detectó ningún DNIe. Por favor, inserte su DNIe en el lector.")
+            serials = present if all_tokens else present[:1]
+        
+        if len(serials) == 1:
+            pins = {serials[0]: getpass.getpass("Enter DNIe PIN: ")}
+        else:
+            pins = {serial: getpass.getpass(f"Enter PIN for token {serial}: ") for serial in serials}
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+        return
+    
+    digest_cache = None if no_cache else DigestCache()
+    try:
+        scheduler = SigningScheduler(pins, serials, digest_cache=digest_cache)
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}")
+        return
+    with scheduler:
+        for file_path, future in scheduler.map(files):
+            try:
+                signature_package = future.result()
+                signature_path = signature_path_for(file_path, fmt)
+                cert_store = None if fmt != 'bin' or embed_cert else default_cert_store(signature_path)
+                save_signature_package(signature_package, signature_path, fmt, cert_store)
+                click.echo(f"✅ {Path(file_path).name} -> {Path(signature_path).name}")
+            except Exception as e:
+                click.echo(f"❌ {Path(file_path).name}: {str(e)}")
+    _echo_cache_stats(digest_cache)
+
+@cli.command()
+@click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--use-cache', is_flag=True,
+              help='Confiar en la caché de digests (más rápido; no detecta cambios que conserven tamaño y fecha)')
+def verify(files, use_cache):
+    """Verify one or more files against their <file>.firma.sig / <file>.firma.json"""
+    from signature_format import find_signature, signature_path_for
+    dnie = _make_dnie(not use_cache)
+    failed = 0
+    try:
+        for file_path in files:
+            signature_path = find_signature(file_path) or signature_path_for(file_path)
+            try:
+                if dnie.verify_signature(file_path, signature_path, use_cache=use_cache):
+                    click.echo(f"✅ {Path(file_path).name}: firma válida")
+                else:
+                    failed += 1
+                    click.echo(f"❌ {Path(file_path).name}: firma inválida")
+            except FileNotFoundError as e:
+                failed += 1
+                click.echo(f"❌ {Path(file_path).name}: {str(e)}")
+        _echo_cache_stats(dnie.digest_cache)
+    finally:
+        dnie.close()
+    if failed:
+        raise SystemExit(1)
+
+@cli.command()
+@click.option('--file', 'trace_file', type=click.Path(dir_okay=False), help='Archivo JSONL de trazas')
+@click.option('--last', 'count', default=1, show_default=True, help='Número de operaciones a mostrar')
+def stats(trace_file, count):
+    """Show the per-phase timing breakdown of the last traced operations (cli.py --trace ...)"""
+    operations = metrics.read_trace(trace_file)
+    if not operations:
+        click.echo("📭 No hay operaciones registradas. Ejecute un comando con --trace primero.")
+        return
+    
+    for operation in operations[-count:]:
+        for line in metrics.format_breakdown(operation["name"], operation["ms"], operation["phases"],
+                                             operation.get("counters")):
+            click.echo(line)
+    
+    # Resumen por fase de todas las operaciones del archivo
+    totals = {}
+    for operation in operations:
+        for phase, _depth, calls, total_ms in operation["phases"]:
+            entry = totals.setdefault(phase, [0, 0.0, None])
+            entry[0] += calls
+            entry[1] += total_ms
+            entry[2] = total_ms / calls if entry[2] is None else max(entry[2], total_ms / calls)
+    click.echo(f"\n📊 {len(operations)} operaciones registradas:")
+    click.echo(f"  {'fase':<24}{'llamadas':>10}{'media ms':>12}{'máx/op ms':>12}")
+    for phase, (calls, total_ms, max_ms) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        click.echo(f"  {phase:<24}{calls:>10}{total_ms / calls:>12.2f}{max_ms:>12.2f}")
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -2,72 +2,160 @@
 import json
 import os
 import hashlib
-from cryptography.fernet import Fernet
-from dnie import DNIeManager
+import threading
 import base64
+import metrics
+from entry import Entry, json_object_hook, json_default, now_date
+
+# dnie (PKCS#11) y cryptography solo se importan al autenticar: "cli.py users"
+# o "--help" no los necesitan
+
+# Prefijo de los directorios de vault de cada usuario (uno por DNIe)
+VAULT_DIR_PREFIX = "vault_dnie_"
+VAULT_FILE = "passwords.db.enc"
+
+def _fernet(key):
+    # cryptography.fernet solo se importa al desbloquear un vault
+    from cryptography.fernet import Fernet as _Fernet
+    return _Fernet(key)
 
 class CryptoManager:
-    def __init__(self, multi_user=True):
+    def __init__(self, multi_user=True, vaults_dir=None):
         self.fernet = None
         self.dnie_manager = None
         self.user_id = None
         self.multi_user = multi_user
         self.authenticated = False
+        # Resultado de prefetch(): (serial, certificado, clave Fernet)
+        self._prefetch = None
+        # Última base de datos leída o escrita, para apply_changes()
+        self._db = None
+        # Auditor (audit.py) que se mantiene al día con cada cambio, si hay uno
+        self.auditor = None
+        # Corpus de contraseñas filtradas (breach.py); False: aún no se ha buscado
+        self._breach = False
         
         # Obtener directorio actual y crear carpeta Contraseñas en el directorio superior
+        # (vaults_dir permite usar otra ubicación, p. ej. en benchmarks)
         current_dir = os.path.dirname(os.path.abspath(__file__))
         parent_dir = os.path.dirname(current_dir)
-        self.vaults_dir = os.path.join(parent_dir, ".Contraseñas")
+        self.vaults_dir = vaults_dir or os.path.join(parent_dir, ".Contraseñas")
         os.makedirs(self.vaults_dir, exist_ok=True)
         
         if multi_user:
             self.db_file = None
         else:
-            self.db_file = os.path.join(self.vaults_dir, "passwords.db.enc")
+            self.db_file = os.path.join(self.vaults_dir, VAULT_FILE)
     
     def initialize_with_pin(self, pin: str) -> bool:
         """Inicializar con PIN y mantener sesión abierta"""
         try:
-            if self.multi_user:
-                user_id = self.get_user_id_from_dnie(pin)
-                if not user_id:
-                    return False
+            with metrics.span("vault.unlock"):
+                if self.multi_user and self._prefetched() is not None:
+                    self._initialize_prefetched(pin)
+                elif self.multi_user:
+                    user_id = self.get_user_id_from_dnie(pin)
+                    if not user_id:
+                        return False
                 
-                certificate = self.dnie_manager.get_certificate()
-                if not certificate:
-                    return False
+                    certificate = self.dnie_manager.get_certificate()
+                    if not certificate:
+                        return False
                 
-                key = self._derive_key_from_certificate(certificate)
-                self.fernet = Fernet(key)
-            else:
-                self.dnie_manager = DNIeManager()
-                key = self.dnie_manager.authenticate(pin)
-                self.fernet = Fernet(key)
+                    key = self._derive_key_from_certificate(certificate)
+                    self.fernet = _fernet(key)
+                else:
+                    from dnie import DNIeManager
+                    self.dnie_manager = DNIeManager()
+                    key = self.dnie_manager.authenticate(pin)
+                    self.fernet = _fernet(key)
             
-            self.authenticated = True
-            return True
+                self.authenticated = True
+                return True
             
         except Exception as e:
             print(f"❌ Error de autenticación DNIe: {e}")
             return False
     
+    def prefetch(self):
+        """Empezar en segundo plano lo que no necesita PIN (modo multi-usuario).
+
+        Carga la librería PKCS#11, lee el certificado público del DNIe y deriva
+        la clave del vault mientras el usuario escribe el PIN; initialize_with_pin
+        solo tiene que hacer login y comprobar que es el mismo certificado.
+        Devuelve un concurrent.futures.Future con (serial, certificado, clave).
+        """
+        from concurrent.futures import Future
+        from dnie import leer_certificado_publico
+        
+        if not self.multi_user or self._prefetch is not None:
+            return self._prefetch
+        future = Future()
+        
+        def run():
+            try:
+                with metrics.span("vault.prefetch"):
+                    serial, certificate = leer_certificado_publico()
+                    future.set_result((serial, certificate, self._derive_key_from_certificate(certificate)))
+            except Exception as e:
+                future.set_exception(e)
+        
+        self._prefetch = future
+        threading.Thread(target=run, name="vault-prefetch", daemon=True).start()
+        return future
+    
+    def _prefetched(self):
+        """Resultado del prefetch (esperando si aún no ha terminado), o None si falló"""
+        if self._prefetch is None:
+            return None
+        try:
+            return self._prefetch.result()
+        except Exception as e:
+            print(f"⚠️  No se pudo leer el certificado sin PIN: {e}")
+            return None
+    
+    def _initialize_prefetched(self, pin: str):
+        """Login en el DNIe del prefetch y reutilizar la clave ya derivada si el certificado coincide"""
+        from dnie import DNIeManager
+        
+        serial, certificate, key = self._prefetched()
+        self.dnie_manager = DNIeManager(slot_serial=serial)
+        self.dnie_manager.authenticate(pin, derive_key=False)
+        
+        session_certificate = self.dnie_manager.get_certificate()
+        if not session_certificate:
+            raise Exception("No se pudo obtener el certificado del DNIe")
+        if session_certificate != certificate:
+            # El certificado visible tras el login no es el leído sin PIN
+            certificate = session_certificate
+            key = self._derive_key_from_certificate(certificate)
+        
+        self._set_user(certificate)
+        self.fernet = _fernet(key)
+    
+    def _set_user(self, certificate: bytes):
+        """Fijar user_id y el archivo del vault a partir del certificado"""
+        self.user_id = hashlib.sha256(certificate).hexdigest()[:32]
+        
+        if self.multi_user:
+            user_vault_dir = os.path.join(self.vaults_dir, f"{VAULT_DIR_PREFIX}{self.user_id}")
+            os.makedirs(user_vault_dir, exist_ok=True)
+            self.db_file = os.path.join(user_vault_dir, VAULT_FILE)
+    
     def get_user_id_from_dnie(self, pin: str) -> str:
         """Obtener ID único del usuario basado en el certificado del DNIe"""
+        from dnie import DNIeManager
+        
         try:
             self.dnie_manager = DNIeManager()
-            self.dnie_manager.authenticate(pin)
+            # La clave del vault sale del certificado: no hace falta derivar la de la firma
+            self.dnie_manager.authenticate(pin, derive_key=False)
             certificate = self.dnie_manager.get_certificate()
             
             if not certificate:
                 raise Exception("No se pudo obtener el certificado del DNIe")
             
-            self.user_id = hashlib.sha256(certificate).hexdigest()[:32]
-            
-            if self.multi_user:
-                user_vault_dir = os.path.join(self.vaults_dir, f"vault_dnie_{self.user_id}")
-                os.makedirs(user_vault_dir, exist_ok=True)
-                self.db_file = os.path.join(user_vault_dir, "passwords.db.enc")
-            
+            self._set_user(certificate)
             return self.user_id
             
         except Exception as e:
@@ -75,27 +163,37 @@ class CryptoManager:
     
     def _derive_key_from_certificate(self, certificate: bytes) -> bytes:
         """Derivar clave Fernet del certificado del DNIe"""
-        derived = hashlib.pbkdf2_hmac(
-            'sha256', 
-            certificate, 
-            b'dnie_vault_salt', 
-            100000, 
-            32
-        )
+        with metrics.span("kdf.pbkdf2"):
+            derived = hashlib.pbkdf2_hmac(
+                'sha256', 
+                certificate, 
+                b'dnie_vault_salt', 
+                100000, 
+                32
+            )
         return base64.urlsafe_b64encode(derived)
     
     def load_db(self) -> dict:
-        """Cargar base de datos (requiere autenticación previa)"""
+        """Cargar base de datos (requiere autenticación previa).
+
+        Las entradas de db["entries"] son objetos Entry.
+        """
         if not self.authenticated or not self.fernet:
             raise Exception("No autenticado. Llame a initialize_with_pin primero.")
                 
         try:
-            with open(self.db_file, 'rb') as f:
-                ciphertext = f.read()
-            plaintext = self.fernet.decrypt(ciphertext)
-            return json.loads(plaintext.decode())
+            with metrics.span("vault.read"):
+                with open(self.db_file, 'rb') as f:
+                    ciphertext = f.read()
         except FileNotFoundError:
-            return {"entries": []}
+            self._db = {"entries": []}
+            return self._db
+        metrics.observe("vault.bytes", len(ciphertext))
+        with metrics.span("fernet.decrypt"):
+            plaintext = self.fernet.decrypt(ciphertext)
+        with metrics.span("json.decode"):
+            self._db = json.loads(plaintext.decode(), object_hook=json_object_hook)
+        return self._db
     
     def save_db(self, db_dict: dict):
         """Guardar base de datos (requiere autenticación previa)"""
@@ -104,20 +202,113 @@ class CryptoManager:
         if not self.db_file:
             raise Exception("No se ha configurado archivo de base de datos")
             
-        plaintext = json.dumps(db_dict).encode()
-        ciphertext = self.fernet.encrypt(plaintext)
-        with open(self.db_file, 'wb') as f:
-            f.write(ciphertext)
+        try:
+            with metrics.span("json.encode"):
+                plaintext = json.dumps(db_dict, default=json_default).encode()
+            with metrics.span("fernet.encrypt"):
+                ciphertext = self.fernet.encrypt(plaintext)
+            with metrics.span("vault.write"):
+                with open(self.db_file, 'wb') as f:
+                    f.write(ciphertext)
+        except BaseException:
+            if db_dict is self._db:
+                # La copia en memoria tiene cambios que no llegaron al disco: se relee al usarla
+                self._db = None
+            raise
+        self._db = db_dict
+    
+    def apply_changes(self, upserts: dict, deletions=()):
+        """Guardar solo lo que ha cambiado, por servicio.
+
+        upserts: servicio -> Entry a escribir; deletions: servicios a
+        borrar. Se aplica sobre una copia de la última base de datos cargada,
+        que solo se sustituye si la escritura termina bien.
+        """
+        current = self._db if self._db is not None else self.load_db()
+        entries = list(current.get("entries", []))
+        db = {**current, "entries": entries}
+        positions = {}
+        for i, entry in enumerate(entries):
+            positions.setdefault(entry.service, []).append(i)
+        
+        # Las actualizaciones se quedan en su sitio; los duplicados y borrados se
+        # eliminan de atrás hacia delante para no desplazar las posiciones pendientes
+        doomed = []
+        added = []
+        replaced = []
+        for service, entry in upserts.items():
+            found = positions.get(service)
+            if found:
+                replaced.append(entries[found[0]])
+                entries[found[0]] = entry
+                doomed.extend(found[1:])
+            else:
+                added.append(entry)
+        for service in deletions:
+            if service not in upserts:
+                doomed.extend(positions.get(service, ()))
+        replaced.extend(entries[i] for i in doomed)
+        for i in sorted(doomed, reverse=True):
+            del entries[i]
+        entries.extend(added)
+        self.save_db(db)
+        if self.auditor is not None:
+            for entry in replaced:
+                self.auditor.remove((entry.service, entry.username))
+            for entry in upserts.values():
+                self.auditor.update((entry.service, entry.username), entry)
+    
+    def attach_auditor(self, auditor):
+        """Analizar todas las entradas con auditor y mantenerlo al día en cada cambio"""
+        auditor.build(((entry.service, entry.username), entry) for entry in self.list_entries())
+        self.auditor = auditor
+        return auditor
     
     def add_password(self, service: str, username: str, password: str):
         """Añadir contraseña (usa sesión existente)"""
         db = self.load_db()
-        db["entries"].append({
-            "service": service,
-            "username": username,
-            "password": password
-        })
+        entry = Entry(service, username, password, date=now_date())
+        db["entries"].append(entry)
         self.save_db(db)
+        if self.auditor is not None:
+            self.auditor.update((service, username), entry)
+        self._warn_if_breached(service, password)
+    
+    def add_entries(self, entries):
+        """Añadir varias entradas (Entry) con una sola escritura cifrada (importación por tandas)"""
+        current = self._db if self._db is not None else self.load_db()
+        self.save_db({**current, "entries": [*current.get("entries", []), *entries]})
+        if self.auditor is not None:
+            for entry in entries:
+                self.auditor.update((entry.service, entry.username), entry)
+    
+    def breach_checker(self):
+        """Corpus local de contraseñas filtradas, o None si no hay ninguno instalado"""
+        if self._breach is False:
+            from breach import BreachChecker
+            try:
+                self._breach = BreachChecker.open_default()
+            except Exception as e:
+                print(f"⚠️  No se pudo abrir el corpus de contraseñas filtradas: {e}")
+                self._breach = None
+        return self._breach
+    
+    def _warn_if_breached(self, service, password):
+        checker = self.breach_checker()
+        if checker is not None and password and checker.contains(password):
+            print(f"⚠️  La contraseña de {service} aparece en filtraciones conocidas: cámbiela")
+            return True
+        return False
+    
+    def get_meta(self, key: str, default=None):
+        """Metadato del vault (p. ej. el secreto TOTP del usuario), de la última carga"""
+        db = self._db if self._db is not None else self.load_db()
+        return db.get("meta", {}).get(key, default)
+    
+    def set_meta(self, key: str, value):
+        """Guardar un metadato en el vault (va cifrado junto a las entradas)"""
+        current = self._db if self._db is not None else self.load_db()
+        self.save_db({**current, "meta": {**current.get("meta", {}), key: value}})
     
     def list_entries(self):
         """Listar contraseñas (usa sesión existente)"""
@@ -128,9 +319,14 @@ class CryptoManager:
         """Actualizar contraseña (usa sesión existente)"""
         db = self.load_db()
         for entry in db["entries"]:
-            if entry["service"] == service and entry["username"] == username:
-                entry["password"] = password
+            if entry.service == service and entry.username == username:
+                entry.password = password
+                # La fecha marca el último cambio de contraseña (la auditoría la usa)
+                entry.date = now_date()
                 self.save_db(db)
+                if self.auditor is not None:
+                    self.auditor.update((service, username), entry)
+                self._warn_if_breached(service, password)
                 return True
         return False
     
@@ -138,13 +334,51 @@ class CryptoManager:
         """Eliminar contraseña (usa sesión existente)"""
         db = self.load_db()
         db["entries"] = [entry for entry in db["entries"] 
-                        if not (entry["service"] == service and entry["username"] == username)]
+                        if not (entry.service == service and entry.username == username)]
         self.save_db(db)
+        if self.auditor is not None:
+            self.auditor.remove((service, username))
+    
+    def get_vaults_directory(self) -> str:
+        """Directorio donde se guardan los vaults"""
+        return self.vaults_dir
+    
+    def list_users(self) -> list:
+        """IDs de los usuarios DNIe con vault (no necesita autenticación)"""
+        users = []
+        try:
+            with os.scandir(self.vaults_dir) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name.startswith(VAULT_DIR_PREFIX):
+                        if os.path.exists(os.path.join(entry.path, VAULT_FILE)):
+                            users.append(entry.name[len(VAULT_DIR_PREFIX):])
+        except FileNotFoundError:
+            pass
+        return sorted(users)
+    
+    def get_user_info(self, user_id: str) -> dict:
+        """Ubicación y tamaño del vault de un usuario (None si no existe)"""
+        vault_dir = os.path.join(self.vaults_dir, f"{VAULT_DIR_PREFIX}{user_id}")
+        db_file = os.path.join(vault_dir, VAULT_FILE)
+        try:
+            st = os.stat(db_file)
+        except FileNotFoundError:
+            return None
+        return {
+            "user_id": user_id,
+            "vault_dir": vault_dir,
+            "db_file": db_file,
+            "data_size": st.st_size,
+            "modified": st.st_mtime,
+        }
     
-    # ... (resto de métodos igual: list_users, get_user_info, etc.) ...
     
     def close(self):
         """Cerrar sesión DNIe"""
         if self.dnie_manager:
             self.dnie_manager.close()
-            self.authenticated = False
\ No newline at end of file
+            self.authenticated = False
+        if self._breach is not False and self._breach is not None:
+            self._breach.close()
+        # El corpus se vuelve a buscar (y abrir) en la siguiente sesión
+        self._breach = False
\ No newline at end of file
@@ -0,0 +1,104 @@
+# digest_cache.py - Caché persistente de hashes de archivos para firma y verificación
+import json
+import os
+import threading
+import time
+
+# Un archivo modificado justo antes de calcular su hash puede volver a cambiar
+# dentro de la misma resolución de mtime sin que lo detectemos. Esos resultados
+# no se guardan (misma estrategia que el índice de git con las entradas "racy").
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+def _default_cache_file():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    return os.path.join(parent_dir, ".Contraseñas", "digest_cache.json")
+
+class DigestCache:
+    """Caché en disco de digests de archivos.
+
+    Cada entrada se indexa por (ruta absoluta, algoritmo) y solo es válida si
+    coinciden tamaño, mtime_ns, inode y dispositivo del archivo actual.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file or _default_cache_file()
+        self._entries = None
+        self._dirty = False
+        # Puede compartirse entre hilos (p. ej. el planificador de firmas)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        entries = {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                entries = data.get("entries", {})
+        except (FileNotFoundError, ValueError, OSError):
+            pass
+        self._entries = entries
+
+    @staticmethod
+    def _key(file_path, algorithm):
+        return f"{algorithm}:{os.path.abspath(file_path)}"
+
+    @staticmethod
+    def _fingerprint(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev]
+
+    def get(self, file_path, algorithm, st=None):
+        """Devolver el digest cacheado o None si falta o está invalidado"""
+        if st is None:
+            st = os.stat(file_path)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self._key(file_path, algorithm))
+            if entry and entry[:4] == self._fingerprint(st):
+                self.hits += 1
+                return entry[4]
+            self.misses += 1
+            return None
+
+    def put(self, file_path, algorithm, digest, st=None):
+        """Guardar un digest recién calculado"""
+        if st is None:
+            st = os.stat(file_path)
+        key = self._key(file_path, algorithm)
+        with self._lock:
+            self._load()
+            if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+                # Demasiado reciente para fiarse del mtime
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+                return
+            self._entries[key] = self._fingerprint(st) + [digest]
+            self._dirty = True
+
+    def save(self):
+        """Escribir la caché a disco de forma atómica (solo si hay cambios)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.VERSION, "entries": self._entries}, f)
+            os.replace(tmp_file, self.cache_file)
+            self._dirty = False
+
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._entries = {}
+            self._dirty = True
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos de la sesión actual"""
+        return {"hits": self.hits, "misses": self.misses}
@@ -3,101 +3,467 @@ import base64
 import platform
 import os
 import hashlib
-import json
+import hmac
+import threading
 from pathlib import Path
-from cryptography import x509
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+import cert_cache
+import metrics
+import signature_format
 
-# Detectar sistema operativo y cargar la librería adecuada
+# Detectar sistema operativo: cada uno usa un binding PKCS#11 distinto
 system = platform.system()
-if system == "Windows":
-    # Windows usa python-pkcs11
-    try:
-        import pkcs11
-        from pkcs11 import Mechanism, ObjectClass
-        PKCS11_LIB = "pkcs11"
-    except ImportError:
-        raise ImportError("Para Windows, instala: pip install python-pkcs11")
-elif system == "Darwin":  # macOS
-    # macOS usa PyKCS11
-    try:
-        import PyKCS11 as pkcs11
-        PKCS11_LIB = "pykcs11"
-    except ImportError:
-        raise ImportError("Para macOS, instala: pip install PyKCS11")
-else:  # Linux
-    try:
-        import pkcs11
-        from pkcs11 import Mechanism, ObjectClass
-        PKCS11_LIB = "pkcs11"
-    except ImportError:
-        raise ImportError("Para Linux, instala: pip install python-pkcs11")
+if system == "Darwin":  # macOS usa PyKCS11
+    PKCS11_LIB = "pykcs11"
+else:  # Windows/Linux usan python-pkcs11
+    PKCS11_LIB = "pkcs11"
+
+# Tamaño de bloque para calcular hashes de archivos grandes
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Errores PKCS#11 que indican que la tarjeta o la sesión ya no existen
+TOKEN_GONE_ERRORS = (
+    "CKR_DEVICE_REMOVED", "CKR_TOKEN_NOT_PRESENT", "CKR_SESSION_HANDLE_INVALID",
+    "CKR_SESSION_CLOSED", "CKR_DEVICE_ERROR",
+    "DeviceRemoved", "TokenNotPresent", "SessionHandleInvalid", "SessionClosed", "DeviceError",
+)
+
+def _is_token_gone(error: Exception) -> bool:
+    text = f"{type(error).__name__} {error}"
+    return any(code in text for code in TOKEN_GONE_ERRORS)
+
+# Errores de PIN: reintentar con el mismo PIN gasta intentos y acaba bloqueando el DNIe
+PIN_ERRORS = ("CKR_PIN_INCORRECT", "CKR_PIN_LOCKED")
+
+def is_pin_error(error: Exception) -> bool:
+    """¿El error (o el que lo causó) es un PIN incorrecto o un DNIe bloqueado?"""
+    while error is not None:
+        if any(code in str(error) for code in PIN_ERRORS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def _normalize_serial(serial) -> str:
+    if isinstance(serial, bytes):
+        serial = serial.decode('ascii', 'replace')
+    return serial.strip().rstrip('\x00')
+
+# Palabras que identifican la clave de autenticación/firma del DNIe por su etiqueta
+KEY_LABEL_HINTS = ['autenticacion', 'auth', 'firma']
+
+# --- Backends de token ---
+class TokenBackend:
+    """Interfaz mínima que DNIeManager necesita de un token.
+
+    Los slots y sesiones son objetos opacos del backend. Los errores deben
+    llevar el código CKR_* en el mensaje (CKR_PIN_INCORRECT, CKR_PIN_LOCKED...)
+    para que DNIeManager los traduzca igual en todos los backends.
+    """
+
+    name = "base"
+    # Identifica la instancia en el pool de sesiones
+    key = None
+
+    def list_tokens(self) -> list:
+        """[{slot, slot_id, serial, label}] de los tokens presentes"""
+        raise NotImplementedError
+
+    def read_public_certificate(self, slot):
+        """Certificado DER leído sin login, o None"""
+        raise NotImplementedError
+
+    def open_session(self, slot, pin):
+        """Abrir sesión y hacer login con el PIN"""
+        raise NotImplementedError
+
+    def close_session(self, session):
+        raise NotImplementedError
+
+    def find_signing_key(self, session):
+        """Devolver (handle de la clave de firma, metadatos)"""
+        raise NotImplementedError
+
+    def sign(self, session, key, data: bytes) -> bytes:
+        """Firma RSA PKCS#1 v1.5 con SHA-256 (CKM_SHA256_RSA_PKCS)"""
+        raise NotImplementedError
+
+    def sign_digest(self, session, key, digest: bytes) -> bytes:
+        """Firma RSA PKCS#1 v1.5 de un digest SHA-256 ya calculado en el host.
+
+        Opcional: solo lo implementa el DNIe simulado (benchmarks). Los backends
+        PKCS#11 firman siempre los datos con CKM_SHA256_RSA_PKCS.
+        """
+        raise NotImplementedError
+
+    def get_certificate(self, session):
+        """Certificado DER del token, o None"""
+        raise NotImplementedError
+
+    def wait_for_slot_event(self):
+        """Bloquear hasta el siguiente evento de lector (NotImplementedError si no hay soporte)"""
+        raise NotImplementedError
+
+class PythonPkcs11Backend(TokenBackend):
+    """Backend python-pkcs11 (Windows/Linux)"""
+
+    name = "pkcs11"
+
+    def __init__(self, lib_path):
+        try:
+            import pkcs11
+        except ImportError:
+            raise ImportError(f"Para {system}, instala: pip install python-pkcs11")
+        self._pkcs11 = pkcs11
+        self.key = ("pkcs11", lib_path)
+        self.lib = pkcs11.lib(lib_path)
+
+    def list_tokens(self):
+        tokens = []
+        for slot in self.lib.get_slots(token_present=True):
+            token = slot.get_token()
+            tokens.append({"slot": slot, "slot_id": slot.slot_id,
+                           "serial": _normalize_serial(token.serial), "label": token.label.strip()})
+        return tokens
+
+    def read_public_certificate(self, slot):
+        with slot.get_token().open() as session:
+            return self.get_certificate(session)
+
+    def open_session(self, slot, pin):
+        return slot.get_token().open(user_pin=pin)
+
+    def close_session(self, session):
+        session.close()
+
+    def find_signing_key(self, session):
+        Attribute, ObjectClass = self._pkcs11.Attribute, self._pkcs11.ObjectClass
+        keys = list(session.get_objects({
+            Attribute.CLASS: ObjectClass.PRIVATE_KEY,
+            Attribute.SIGN: True
+        }))
+        if not keys:
+            raise Exception("No se encontró ninguna clave privada de firma en el DNIe")
+        
+        # Intentar encontrar clave específica; si no, usar la primera
+        for key in keys:
+            try:
+                label = key[Attribute.LABEL] if hasattr(key, '__getitem__') else None
+                if label and any(auth_word in label.lower() for auth_word in KEY_LABEL_HINTS):
+                    return key, {"label": label, "candidates": len(keys)}
+            except:
+                continue
+        return keys[0], {"label": None, "candidates": len(keys)}
+
+    def sign(self, session, key, data):
+        return bytes(key.sign(data, mechanism=self._pkcs11.Mechanism.SHA256_RSA_PKCS))
+
+    def get_certificate(self, session):
+        Attribute, ObjectClass = self._pkcs11.Attribute, self._pkcs11.ObjectClass
+        cert = next(session.get_objects({Attribute.CLASS: ObjectClass.CERTIFICATE}), None)
+        return bytes(cert[Attribute.VALUE]) if cert else None
+
+    def wait_for_slot_event(self):
+        wait = getattr(self.lib, "wait_for_slot_event", None)
+        if wait is None:
+            raise NotImplementedError("python-pkcs11 sin soporte de C_WaitForSlotEvent")
+        wait(blocking=True)
+
+class PyKCS11Backend(TokenBackend):
+    """Backend PyKCS11 (macOS)"""
+
+    name = "pykcs11"
+
+    def __init__(self, lib_path):
+        try:
+            import PyKCS11
+        except ImportError:
+            raise ImportError("Para macOS, instala: pip install PyKCS11")
+        self._pkcs11 = PyKCS11
+        self.key = ("pykcs11", lib_path)
+        self.lib = PyKCS11.PyKCS11Lib()
+        self.lib.load(lib_path)
+
+    def list_tokens(self):
+        tokens = []
+        for slot in self.lib.getSlotList(tokenPresent=True):
+            token_info = self.lib.getTokenInfo(slot)
+            tokens.append({"slot": slot, "slot_id": slot,
+                           "serial": _normalize_serial(token_info.serialNumber), "label": token_info.label.strip()})
+        return tokens
+
+    def read_public_certificate(self, slot):
+        session = self.lib.openSession(slot)
+        try:
+            return self.get_certificate(session)
+        finally:
+            session.closeSession()
+
+    def open_session(self, slot, pin):
+        session = self.lib.openSession(slot)
+        session.login(pin)
+        return session
+
+    def close_session(self, session):
+        session.logout()
+        session.closeSession()
+
+    def find_signing_key(self, session):
+        template = [
+            (self._pkcs11.CKA_CLASS, self._pkcs11.CKO_PRIVATE_KEY),
+            (self._pkcs11.CKA_SIGN, True)
+        ]
+        priv_keys = session.findObjects(template)
+        if not priv_keys:
+            raise Exception("No se encontró ninguna clave privada de firma en el DNIe")
+        return priv_keys[0], {"label": None, "candidates": len(priv_keys)}
+
+    def sign(self, session, key, data):
+        mechanism = self._pkcs11.Mechanism(self._pkcs11.CKM_SHA256_RSA_PKCS, None)
+        return bytes(session.sign(key, data, mechanism))
+
+    def get_certificate(self, session):
+        template = [
+            (self._pkcs11.CKA_CLASS, self._pkcs11.CKO_CERTIFICATE)
+        ]
+        certs = session.findObjects(template)
+        if not certs:
+            return None
+        return bytes(session.getAttributeValue(certs[0], [self._pkcs11.CKA_VALUE])[0])
+
+    def wait_for_slot_event(self):
+        self.lib.waitForSlotEvent()
+
+# --- Caché de backends y pool de sesiones compartidos por todo el proceso ---
+_BACKEND_CACHE = {}
+_SESSION_POOL = {}
+_POOL_LOCK = threading.RLock()
+# Cerrojo por token mientras se hace login (fuera de _POOL_LOCK)
+_OPENING_LOCKS = {}
+
+def default_lib_path():
+    """Ruta de la librería PKCS#11 (DNIE_PKCS11_LIB o la de OpenSC según el sistema)"""
+    if os.environ.get("DNIE_PKCS11_LIB"):
+        # Permite usar otro módulo, p. ej. un token software (SoftHSM) en pruebas
+        return os.environ["DNIE_PKCS11_LIB"]
+    if system == "Windows":
+        return r"C:\Program Files\OpenSC Project\OpenSC\pkcs11\opensc-pkcs11.dll"
+    elif system == "Darwin":  # macOS
+        return "/usr/lib/opensc-pkcs11.so"
+    else:  # Linux
+        return "/usr/lib/opensc-pkcs11.so"
+
+def get_backend(lib_path=None) -> TokenBackend:
+    """Backend del proceso: DNIE_BACKEND=fake usa el token simulado; si no, PKCS#11.
+
+    La librería PKCS#11 se carga una sola vez por proceso y ruta.
+    """
+    use_fake = os.environ.get("DNIE_BACKEND", "").lower() == "fake"
+    cache_key = "fake" if use_fake else (lib_path or default_lib_path())
+    with _POOL_LOCK:
+        backend = _BACKEND_CACHE.get(cache_key)
+        if backend is None:
+            with metrics.span("pkcs11.load"):
+                if use_fake:
+                    from fake_token import FakeTokenBackend
+                    backend = FakeTokenBackend.from_env()
+                elif PKCS11_LIB == "pkcs11":
+                    backend = PythonPkcs11Backend(cache_key)
+                else:
+                    backend = PyKCS11Backend(cache_key)
+            _BACKEND_CACHE[cache_key] = backend
+        return backend
+
+class _PooledSession:
+    """Sesión autenticada compartida entre DNIeManager del mismo token"""
+
+    def __init__(self, pool_key, session, pin, close_fn):
+        self.pool_key = pool_key
+        self.session = session
+        self.refcount = 1
+        self.close_fn = close_fn
+        # Handles ya resueltos (clave, metadatos, certificado)
+        self.handles = (None, None, None)
+        # Solo se guarda un HMAC del PIN con sal aleatoria, nunca el PIN
+        self._salt = os.urandom(16)
+        self._pin_mac = self._mac(pin)
+
+    def _mac(self, pin):
+        return hmac.new(self._salt, pin.encode('utf-8'), 'sha256').digest()
+
+    def matches(self, pin) -> bool:
+        return hmac.compare_digest(self._pin_mac, self._mac(pin))
+
+def _reuse_session(pool_key, pin):
+    """Sesión del pool con una referencia más, o None (el llamador tiene _POOL_LOCK)"""
+    pooled = _SESSION_POOL.get(pool_key)
+    if pooled is None:
+        return None
+    # El token ya está autenticado en este proceso: un nuevo login devolvería
+    # CKR_USER_ALREADY_LOGGED_IN, así que el PIN se comprueba contra el usado
+    if not pooled.matches(pin):
+        raise Exception("CKR_PIN_INCORRECT")
+    pooled.refcount += 1
+    metrics.incr("pkcs11.session_reused")
+    return pooled
+
+def _acquire_session(pool_key, pin, open_fn, close_fn) -> _PooledSession:
+    """Devolver la sesión ya abierta del token o abrir (y hacer login) una nueva.
+
+    El login se hace fuera de _POOL_LOCK, para no frenar los logins de otros
+    tokens ni invalidar_sesiones_slot; un cerrojo por token evita dos logins
+    a la vez en la misma tarjeta.
+    """
+    with _POOL_LOCK:
+        pooled = _reuse_session(pool_key, pin)
+        if pooled is not None:
+            return pooled
+        opening = _OPENING_LOCKS.setdefault(pool_key, threading.Lock())
+    with opening:
+        # Otro hilo pudo terminar el login mientras se esperaba el cerrojo
+        with _POOL_LOCK:
+            pooled = _reuse_session(pool_key, pin)
+            if pooled is not None:
+                return pooled
+        session = open_fn()
+        with _POOL_LOCK:
+            pooled = _PooledSession(pool_key, session, pin, close_fn)
+            _SESSION_POOL[pool_key] = pooled
+        return pooled
+
+def _release_session(pooled, discard=False):
+    """Liberar una referencia; la sesión se cierra al soltar la última"""
+    with _POOL_LOCK:
+        pooled.refcount -= 1
+        if pooled.refcount > 0 and not discard:
+            return
+        if _SESSION_POOL.get(pooled.pool_key) is pooled:
+            del _SESSION_POOL[pooled.pool_key]
+    if pooled.refcount <= 0:
+        try:
+            pooled.close_fn(pooled.session)
+        except Exception:
+            pass
+
+def invalidar_sesiones_slot(slot_id):
+    """Sacar del pool las sesiones de un slot cuyo DNIe se ha retirado"""
+    with _POOL_LOCK:
+        for pool_key in [key for key in _SESSION_POOL if key[1] == slot_id]:
+            del _SESSION_POOL[pool_key]
+
+def listar_slots_con_token(lib_path=None) -> set:
+    """IDs de los slots con tarjeta insertada"""
+    return {info["slot_id"] for info in get_backend(lib_path).list_tokens()}
+
+def listar_tokens(lib_path=None, with_certificate=True) -> list:
+    """Enumerar los tokens presentes en todos los lectores.
+
+    Cada token se describe con slot, slot_id, serial, label y, si se pide,
+    la huella SHA-256 y el sujeto de su certificado (leído sin PIN).
+    """
+    backend = get_backend(lib_path)
+    tokens = backend.list_tokens()
+
+    if with_certificate:
+        for info in tokens:
+            info["certificate_fingerprint"] = None
+            info["subject"] = None
+            try:
+                certificate = backend.read_public_certificate(info["slot"])
+            except Exception:
+                continue
+            if certificate:
+                info["certificate_fingerprint"] = hashlib.sha256(certificate).hexdigest()
+                try:
+                    info["subject"] = cert_cache.default_cache().get(certificate).certificate.subject.rfc4514_string()
+                except Exception:
+                    pass
+    return tokens
+
+def leer_certificado_publico(serial=None, lib_path=None):
+    """(serial, certificado DER) del primer token con certificado, o del indicado, leído sin PIN"""
+    backend = get_backend(lib_path)
+    for info in backend.list_tokens():
+        if serial is not None and info["serial"] != serial:
+            continue
+        with metrics.span("card.certificate"):
+            certificate = backend.read_public_certificate(info["slot"])
+        if certificate:
+            return info["serial"], certificate
+    raise Exception("❌ No se detectó ningún DNIe. Por favor, inserte su DNIe en el lector.")
+
+def esperar_evento_slot(lib_path=None):
+    """Bloquear en C_WaitForSlotEvent hasta el siguiente evento de lector.
+
+    Lanza NotImplementedError si la librería o el binding no lo soportan.
+    """
+    get_backend(lib_path).wait_for_slot_event()
 
 class DNIeManager:
-    def __init__(self):
+    def __init__(self, digest_cache=None, certificate_cache=None, slot_serial=None, cert_fingerprint=None,
+                 backend=None):
         # Configurar ruta de librería según el sistema operativo
-        if system == "Windows":
-            self.lib_path = r"C:\Program Files\OpenSC Project\OpenSC\pkcs11\opensc-pkcs11.dll"
-        elif system == "Darwin":  # macOS
-            self.lib_path = "/usr/lib/opensc-pkcs11.so"
-        else:  # Linux
-            self.lib_path = "/usr/lib/opensc-pkcs11.so"
+        self.lib_path = default_lib_path()
+        # Selección de token cuando hay varios lectores (por defecto, el primero)
+        self.slot_serial = slot_serial
+        self.cert_fingerprint = cert_fingerprint
+        self.token_info = None
         
         self.session = None
-        self._lib = None
-        self.pkcs11_lib = PKCS11_LIB
+        # Backend de token (None: el del proceso según DNIE_BACKEND / lib_path)
+        self._backend = backend
+        # Caché opcional de digests (digest_cache.DigestCache)
+        self.digest_cache = digest_cache
+        # Caché LRU de certificados parseados/validados (compartida por defecto)
+        self.certificate_cache = certificate_cache or cert_cache.default_cache()
+        # Objetos del token resueltos una vez por sesión
+        self._priv_key = None
+        self._key_info = None
+        self._certificate = None
+        # Entrada del pool de sesiones que usa este gestor
+        self._pooled = None
+    
+    @property
+    def backend(self) -> TokenBackend:
+        if self._backend is None:
+            self._backend = get_backend(self.lib_path)
+        return self._backend
     
-    def authenticate(self, pin: str) -> bytes:
-        """Authenticate with DNIe and return derived key"""
+    def authenticate(self, pin: str, derive_key: bool = True) -> bytes:
+        """Authenticate with DNIe and return derived key (None con derive_key=False)"""
         try:
-            print(f"🔍 Buscando DNIe con {self.pkcs11_lib}...")
+            if self.session:
+                self._release()
             
-            if self.pkcs11_lib == "pkcs11":
-                # Windows/Linux con python-pkcs11
-                self._lib = pkcs11.lib(self.lib_path)
-                slots = self._lib.get_slots(token_present=True)
-                
-                if not slots:
-                    raise Exception(f"❌ No se detectó ningún DNIe. Por favor, inserte su DNIe en el lector.")
-                
-                token = slots[0].get_token()
-                print("✅ DNIe detectado, iniciando autenticación...")
-                
-                self.session = token.open(user_pin=pin)
-                
+            backend = self.backend
+            print(f"🔍 Buscando DNIe con {backend.name}...")
+            
+            with metrics.span("pkcs11.select_token"):
+                self.token_info = self._select_token()
+            slot = self.token_info["slot"]
+            pool_key = (backend.key, self.token_info["slot_id"], self.token_info["serial"])
+            print("✅ DNIe detectado, iniciando autenticación...")
+            
+            # Abrir sesión (o reutilizar la ya autenticada del mismo token)
+            def open_session():
+                with metrics.span("pkcs11.login"):
+                    return backend.open_session(slot, pin)
+            self._attach(_acquire_session(pool_key, pin, open_session, backend.close_session))
+            
+            try:
                 # Buscar clave privada para firmar
                 priv_key = self._find_private_key()
                 
                 # Create and sign challenge
                 challenge = os.urandom(32)
-                signature = priv_key.sign(challenge, mechanism=Mechanism.SHA256_RSA_PKCS)
-                
-            else:  # macOS con PyKCS11
-                # Inicializar PyKCS11
-                self._lib = pkcs11.PyKCS11Lib()
-                self._lib.load(self.lib_path)
-                
-                # Obtener slots
-                slots = self._lib.getSlotList(tokenPresent=True)
-                
-                if not slots:
-                    raise Exception(f"❌ No se detectó ningún DNIe. Por favor, inserte su DNIe en el lector.")
-                
-                print("✅ DNIe detectado, iniciando autenticación...")
-                
-                # Abrir sesión
-                self.session = self._lib.openSession(slots[0])
-                self.session.login(pin)
-                
-                # Buscar clave privada para firmar
-                priv_key = self._find_private_key_pykcs11()
-                
-                # Create and sign challenge
-                challenge = os.urandom(32)
-                mechanism = pkcs11.Mechanism(pkcs11.CKM_SHA256_RSA_PKCS, None)
-                signature = self.session.sign(priv_key, challenge, mechanism)
+                with metrics.span("card.sign"):
+                    signature = backend.sign(self.session, priv_key, challenge)
+            except Exception as e:
+                # Sin reto firmado no hay autenticación: se devuelve la sesión al pool
+                self._release(discard=_is_token_gone(e))
+                raise
             
+            if not derive_key:
+                print("✅ Autenticación completada")
+                return None
             print("✅ Autenticación completada, generando clave de cifrado...")
             # Derive key from signature
             return self._derive_key(bytes(signature))
@@ -113,90 +479,129 @@ class DNIeManager:
             else:
                 raise Exception(f"❌ Error de autenticación DNIe: {error_msg}")
     
-    def _find_private_key(self):
-        """Encontrar clave privada para python-pkcs11 (Windows/Linux)"""
-        keys = self.session.get_objects({
-            pkcs11.Attribute.CLASS: ObjectClass.PRIVATE_KEY,
-            pkcs11.Attribute.SIGN: True
-        })
+    def _select_token(self) -> dict:
+        """Elegir el token por número de serie o huella del certificado (o el primero)"""
+        need_cert = self.cert_fingerprint is not None
+        tokens = self.backend.list_tokens()
+        if need_cert:
+            for info in tokens:
+                try:
+                    certificate = self.backend.read_public_certificate(info["slot"])
+                except Exception:
+                    certificate = None
+                info["certificate_fingerprint"] = hashlib.sha256(certificate).hexdigest() if certificate else None
+        if not tokens:
+            raise Exception(f"❌ No se detectó ningún DNIe. Por favor, inserte su DNIe en el lector.")
         
-        # Intentar encontrar clave específica
-        for key in keys:
-            try:
-                label = key[pkcs11.Attribute.LABEL] if hasattr(key, '__getitem__') else None
-                if label and any(auth_word in label.lower() for auth_word in ['autenticacion', 'auth', 'firma']):
-                    return key
-            except:
+        for info in tokens:
+            if self.slot_serial is not None and info["serial"] != self.slot_serial:
                 continue
-        
-        # Si no encontramos clave específica, usar la primera
-        keys = list(self.session.get_objects({
-            pkcs11.Attribute.CLASS: ObjectClass.PRIVATE_KEY,
-            pkcs11.Attribute.SIGN: True
-        }))
-        if keys:
-            return keys[0]
-        
-        raise Exception("No se encontró ninguna clave privada de firma en el DNIe")
+            if need_cert and info["certificate_fingerprint"] != self.cert_fingerprint.lower():
+                continue
+            return info
+        raise Exception("❌ No se encontró el DNIe solicitado en ningún lector.")
     
-    def _find_private_key_pykcs11(self):
-        """Encontrar clave privada para PyKCS11 (macOS)"""
-        template = [
-            (pkcs11.CKA_CLASS, pkcs11.CKO_PRIVATE_KEY),
-            (pkcs11.CKA_SIGN, True)
-        ]
-        
-        priv_keys = self.session.findObjects(template)
-        if not priv_keys:
-            raise Exception("No se encontró ninguna clave privada de firma en el DNIe")
-        
-        return priv_keys[0]
+    def _find_private_key(self):
+        """Encontrar la clave privada de firma (cacheada por sesión)"""
+        if self._priv_key is None:
+            with metrics.span("pkcs11.find_key"):
+                self._priv_key, self._key_info = self.backend.find_signing_key(self.session)
+            self._share_handles()
+        return self._priv_key
+    
+    def _attach(self, pooled):
+        """Usar la sesión del pool y los handles que ya tenga resueltos"""
+        self._pooled = pooled
+        self.session = pooled.session
+        self._priv_key, self._key_info, self._certificate = pooled.handles
+    
+    def _share_handles(self):
+        """Publicar en el pool los handles resueltos para otros gestores del mismo token"""
+        if self._pooled is not None:
+            self._pooled.handles = (self._priv_key, self._key_info, self._certificate)
+    
+    def _release(self, discard=False):
+        """Devolver la sesión al pool y olvidar los handles.
+
+        La referencia del pool se suelta antes de _invalidate_handles(): en el
+        orden inverso se perdía y la sesión compartida no llegaba a cerrarse.
+        """
+        pooled, self._pooled = self._pooled, None
+        if pooled is not None:
+            _release_session(pooled, discard)
+        self.session = None
+        self._invalidate_handles()
+    
+    def _invalidate_handles(self):
+        """Olvidar clave, certificado y metadatos cacheados (cierre o retirada del token)"""
+        self._priv_key = None
+        self._key_info = None
+        self._certificate = None
+    
+    @property
+    def key_info(self) -> dict:
+        """Metadatos de la clave de firma seleccionada (None si aún no se ha resuelto)"""
+        return self._key_info
     
     def _derive_key(self, signature: bytes) -> bytes:
         """Derive Fernet key from signature"""
-        derived = hashlib.pbkdf2_hmac('sha256', signature, b'dnie_salt', 100000, 32)
+        with metrics.span("kdf.pbkdf2"):
+            derived = hashlib.pbkdf2_hmac('sha256', signature, b'dnie_salt', 100000, 32)
         return base64.urlsafe_b64encode(derived)
     
     def get_certificate(self) -> bytes:
-        """Extraer certificado del DNIe"""
+        """Extraer certificado del DNIe (se lee del token una sola vez por sesión)"""
         if not self.session:
             raise Exception("No hay sesión activa con el DNIe")
+        if self._certificate is not None:
+            return self._certificate
         
-        if self.pkcs11_lib == "pkcs11":
-            # Windows/Linux
-            certs = self.session.get_objects({pkcs11.Attribute.CLASS: ObjectClass.CERTIFICATE})
-            cert = next(certs, None)
-            return bytes(cert[pkcs11.Attribute.VALUE]) if cert else None
-        else:
-            # macOS
-            template = [
-                (pkcs11.CKA_CLASS, pkcs11.CKO_CERTIFICATE)
-            ]
-            certs = self.session.findObjects(template)
-            if certs:
-                cert = certs[0]
-                value = self.session.getAttributeValue(cert, [pkcs11.CKA_VALUE])[0]
-                return bytes(value)
-            return None
+        try:
+            with metrics.span("card.certificate"):
+                self._certificate = self.backend.get_certificate(self.session)
+        except Exception as e:
+            if _is_token_gone(e):
+                self._release(discard=True)
+            raise
+        self._share_handles()
+        return self._certificate
     
     def sign_data(self, data: bytes) -> bytes:
-        """Firmar datos con la clave privada del DNIe"""
+        """Firmar datos con la clave privada del DNIe (una operación de tarjeta por firma)"""
         if not self.session:
             raise Exception("No hay sesión activa con el DNIe")
         
-        if self.pkcs11_lib == "pkcs11":
-            # Windows/Linux
+        try:
             priv_key = self._find_private_key()
-            return bytes(priv_key.sign(data, mechanism=Mechanism.SHA256_RSA_PKCS))
-        else:
-            # macOS
-            priv_key = self._find_private_key_pykcs11()
-            mechanism = pkcs11.Mechanism(pkcs11.CKM_SHA256_RSA_PKCS, None)
-            signature = self.session.sign(priv_key, data, mechanism)
-            return bytes(signature)
+            with metrics.span("card.sign"):
+                return self.backend.sign(self.session, priv_key, data)
+        except Exception as e:
+            if _is_token_gone(e):
+                # DNIe retirado: la sesión y los handles ya no sirven
+                self._release(discard=True)
+            raise
     
-    def sign_file(self, file_path: str, pin: str) -> dict:
-        """Firmar un archivo y retornar paquete de firma"""
+    def sign_digest(self, digest: bytes) -> bytes:
+        """Firmar un digest SHA-256 calculado en el host (solo backends con sign_digest, p. ej. el simulado)"""
+        if not self.session:
+            raise Exception("No hay sesión activa con el DNIe")
+        
+        try:
+            priv_key = self._find_private_key()
+            with metrics.span("card.sign"):
+                return self.backend.sign_digest(self.session, priv_key, digest)
+        except Exception as e:
+            if _is_token_gone(e):
+                self._release(discard=True)
+            raise
+    
+    def sign_file(self, file_path: str, pin: str, progress=None) -> dict:
+        """Firmar un archivo y retornar paquete de firma.
+
+        El hash del paquete se calcula sobre los mismos datos que se firman
+        (nunca se toma de la caché de digests, que solo se actualiza).
+        progress(bytes_leídos, total) se llama mientras se lee el archivo.
+        """
         if not Path(file_path).exists():
             raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
         
@@ -204,12 +609,8 @@ class DNIeManager:
         if not self.session:
             self.authenticate(pin)
         
-        # Calcular hash del archivo
-        file_hash = self._calculate_file_hash(file_path)
-        
-        # Leer contenido del archivo
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
+        # Leer contenido del archivo y calcular su hash en la misma lectura
+        file_data, file_hash = self._read_file(file_path, progress=progress)
         
         # Firmar los datos
         signature = self.sign_data(file_data)
@@ -233,43 +634,63 @@ class DNIeManager:
         
         return signature_package
     
-    def verify_signature(self, file_path: str, signature_path: str) -> bool:
-        """Verificar firma de un archivo"""
+    def verify_signature(self, file_path: str, signature_path: str, use_cache: bool = False, cert_store=None,
+                         progress=None) -> bool:
+        """Verificar firma de un archivo.
+
+        El archivo se vuelve a leer siempre: la caché de digests no está
+        autenticada y solo distingue los archivos por tamaño, fecha e inodo.
+        use_cache=True la consulta (más rápido, pero no detecta un cambio que
+        conserve tamaño y fecha de modificación).
+        """
         if not Path(file_path).exists():
             raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
         if not Path(signature_path).exists():
             raise FileNotFoundError(f"Archivo de firma no encontrado: {signature_path}")
         
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding, utils
+        
         try:
-            # Cargar paquete de firma
-            with open(signature_path, 'r') as f:
-                signature_package = json.load(f)
+            # Cargar paquete de firma (JSON o binario compacto, autodetectado)
+            signature_package = signature_format.load_signature_package(signature_path)
             
             # Verificar integridad del archivo
-            current_hash = self._calculate_file_hash(file_path)
+            current_hash = self._calculate_file_hash(file_path, strict=not use_cache, progress=progress)
             if current_hash != signature_package['file_hash']:
                 print("❌ El archivo ha sido modificado desde la firma!")
                 return False
             
-            # Decodificar firma y certificado
-            signature = base64.b64decode(signature_package['signature'])
-            certificate_data = base64.b64decode(signature_package['certificate'])
-            
-            # Cargar certificado
-            cert = x509.load_der_x509_certificate(certificate_data)
-            public_key = cert.public_key()
+            signature = signature_package['signature']
+            fingerprint = signature_package['certificate_fingerprint']
             
-            # Leer archivo para verificación
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
+            # Cargar certificado (parseo y validación cacheados por huella);
+            # los certificados referenciados solo se leen del almacén si no están en caché
+            cached_cert = self.certificate_cache.lookup(fingerprint)
+            if cached_cert is None:
+                certificate_data = signature_package['certificate']
+                if certificate_data is None:
+                    store = cert_store or signature_format.default_cert_store(signature_path)
+                    certificate_data = store.get(fingerprint)
+                cached_cert = self.certificate_cache.get(certificate_data, fingerprint)
+            # La vigencia se comprueba en la fecha de la firma: una firma hecha con
+            # un certificado vigente sigue siendo válida cuando este caduca
+            error = cached_cert.error_at(self._signing_time(signature_package))
+            if error:
+                print(f"❌ Certificado no válido: {error}")
+                return False
+            if cached_cert.expired:
+                print(f"⚠️  El certificado caducó el {cached_cert.not_after:%Y-%m-%d}; la firma es anterior")
+            public_key = cached_cert.public_key
             
-            # Verificar firma
-            public_key.verify(
-                signature,
-                file_data,
-                padding.PKCS1v15(),
-                hashes.SHA256()
-            )
+            # Verificar firma sobre el digest ya calculado (sin releer el archivo)
+            with metrics.span("rsa.verify"):
+                public_key.verify(
+                    signature,
+                    bytes.fromhex(current_hash),
+                    padding.PKCS1v15(),
+                    utils.Prehashed(hashes.SHA256())
+                )
             
             return True
             
@@ -277,14 +698,70 @@ class DNIeManager:
             print(f"❌ Error en verificación: {e}")
             return False
     
-    def _calculate_file_hash(self, file_path: str, algorithm: str = 'sha256') -> str:
-        """Calcular hash de un archivo"""
+    def _calculate_file_hash(self, file_path: str, algorithm: str = 'sha256', strict: bool = False,
+                             progress=None) -> str:
+        """Calcular hash de un archivo (usa la caché de digests si está configurada).
+
+        progress(bytes_leídos, total), si se indica, se llama tras cada bloque;
+        puede lanzar una excepción para cancelar.
+        """
+        use_cache = self.digest_cache is not None and not strict
+        st = None
+        if use_cache or progress is not None:
+            st = os.stat(file_path)
+        if use_cache:
+            cached = self.digest_cache.get(file_path, algorithm, st)
+            if cached:
+                metrics.incr("digest_cache.hit")
+                return cached
+            metrics.incr("digest_cache.miss")
+        
         hash_func = hashlib.new(algorithm)
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_func.update(chunk)
-        return hash_func.hexdigest()
+        with metrics.span("file.hash"):
+            with open(file_path, 'rb') as f:
+                done = 0
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    hash_func.update(chunk)
+                    if progress is not None:
+                        done += len(chunk)
+                        progress(done, st.st_size)
+        digest = hash_func.hexdigest()
+        
+        if use_cache:
+            self.digest_cache.put(file_path, algorithm, digest, st)
+        return digest
     
+    def _read_file(self, file_path: str, progress=None):
+        """(contenido, hash SHA-256) del archivo leído una sola vez; actualiza la caché de digests"""
+        st = os.stat(file_path)
+        hash_func = hashlib.sha256()
+        chunks = []
+        with metrics.span("file.hash"):
+            with open(file_path, 'rb') as f:
+                done = 0
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    hash_func.update(chunk)
+                    chunks.append(chunk)
+                    if progress is not None:
+                        done += len(chunk)
+                        progress(done, st.st_size)
+        digest = hash_func.hexdigest()
+        if self.digest_cache is not None:
+            # Con el stat de antes de leer: si el archivo cambió mientras tanto, la entrada no valdrá
+            self.digest_cache.put(file_path, 'sha256', digest, st)
+        return b"".join(chunks), digest
+    
+    @staticmethod
+    def _signing_time(signature_package):
+        """Fecha de la firma en UTC (None si el paquete no la trae o no se entiende)"""
+        from datetime import datetime, timezone
+        try:
+            when = datetime.fromisoformat(signature_package.get('timestamp') or "")
+        except ValueError:
+            return None
+        # _get_timestamp() guarda la hora local sin zona
+        return when.astimezone(timezone.utc)
+
     def _get_timestamp(self):
         """Obtener timestamp actual"""
         from datetime import datetime
@@ -292,39 +769,22 @@ class DNIeManager:
     
     def close(self):
         """Close DNIe session"""
-        if self.session:
-            if self.pkcs11_lib == "pykcs11":
-                # macOS - cerrar sesión PyKCS11
-                try:
-                    self.session.logout()
-                    self.session.closeSession()
-                except:
-                    pass
-            else:
-                # Windows/Linux - cerrar sesión pkcs11
-                self.session.close()
-            
-            self.session = None
-            self._lib = None
+        if self.digest_cache is not None:
+            try:
+                self.digest_cache.save()
+            except OSError as e:
+                print(f"⚠️  No se pudo guardar la caché de digests: {e}")
+        
+        # La sesión solo se cierra de verdad cuando la suelta su último usuario
+        self._release()
 
 # Función de utilidad para verificar el estado del DNIe
 def verificar_estado_dnie():
-    """Verifica el estado del DNIe sin autenticar"""
+    """Verifica el estado del DNIe sin autenticar (consulta el vigilante de slots)"""
     try:
-        dnie = DNIeManager()
-        system = platform.system()
-        
-        if system == "Windows" or system == "Linux":
-            # Windows/Linux con python-pkcs11
-            dnie._lib = pkcs11.lib(dnie.lib_path)
-            slots = dnie._lib.get_slots(token_present=True)
-        else:
-            # macOS con PyKCS11
-            dnie._lib = pkcs11.PyKCS11Lib()
-            dnie._lib.load(dnie.lib_path)
-            slots = dnie._lib.getSlotList(tokenPresent=True)
+        from slot_watcher import get_watcher
         
-        if slots:
+        if get_watcher().present:
             print("✅ DNIe detectado y listo para usar")
             return True
         else:
@@ -333,4 +793,4 @@ def verificar_estado_dnie():
             
     except Exception as e:
         print(f"❌ Error al verificar DNIe: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,59 @@
+# entry.py - Entrada del vault (una sola forma para crypto.py, cli.py e interfaz.py)
+import datetime
+
+def now_date():
+    """Fecha de modificación de una entrada: 'YYYY-MM-DD HH:MM:SS' (hora local)"""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class Entry:
+    """Entrada del vault: servicio, usuario, contraseña, notas y fecha.
+
+    Con __slots__ cada entrada ocupa bastante menos que un dict. En disco se
+    guarda como el dict de siempre (service/username/password/notes/date).
+    """
+
+    __slots__ = ("service", "username", "password", "notes", "date")
+
+    def __init__(self, service, username="", password="", notes="", date=""):
+        self.service = service
+        self.username = username
+        self.password = password
+        self.notes = notes
+        self.date = date
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["service"], data.get("username", ""), data.get("password", ""),
+                   data.get("notes", ""), data.get("date", ""))
+
+    def to_dict(self):
+        return {
+            "service": self.service,
+            "username": self.username,
+            "password": self.password,
+            "notes": self.notes,
+            "date": self.date,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        # La contraseña nunca aparece en trazas ni en logs
+        return f"Entry(service={self.service!r}, username={self.username!r})"
+
+def json_object_hook(data):
+    """object_hook de json.loads: las entradas se crean directamente como Entry"""
+    if "service" in data:
+        return Entry.from_dict(data)
+    return data
+
+def json_default(obj):
+    """default de json.dumps: serializar Entry como dict"""
+    if isinstance(obj, Entry):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,186 @@
+# fake_token.py - Token PKCS#11 simulado en proceso (pruebas y benchmarks sin lector)
+import datetime
+import os
+import threading
+import time
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa, utils
+from dnie import TokenBackend
+
+DEFAULT_PIN = "1234"
+DEFAULT_RETRIES = 3
+
+class FakeCard:
+    """Tarjeta simulada: clave RSA, certificado autofirmado y contador de PIN"""
+
+    def __init__(self, index=0, pin=DEFAULT_PIN, max_retries=DEFAULT_RETRIES, key_file=None, key_size=2048):
+        self.slot_id = index
+        self.serial = f"FAKE{index:04d}"
+        self.label = f"DNI electrónico simulado {index}"
+        self.pin = pin
+        self.max_retries = max_retries
+        self.retries_left = max_retries
+        self.present = True
+        # La tarjeta atiende una operación cada vez, como una real
+        self.lock = threading.Lock()
+        self.private_key, self.certificate = self._load_or_create(key_file, key_size)
+
+    def _load_or_create(self, key_file, key_size):
+        if key_file and os.path.exists(key_file):
+            with open(key_file, 'rb') as f:
+                data = f.read()
+            key = serialization.load_pem_private_key(data, password=None)
+            cert = x509.load_pem_x509_certificate(data)
+            return key, cert.public_bytes(serialization.Encoding.DER)
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+        name = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, "ES"),
+            x509.NameAttribute(NameOID.SERIAL_NUMBER, f"IDCES-{self.serial}"),
+            x509.NameAttribute(NameOID.COMMON_NAME, f"CIUDADANO SIMULADO {self.slot_id} (AUTENTICACIÓN)"),
+        ])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder()
+                .subject_name(name)
+                .issuer_name(name)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(days=1))
+                .not_valid_after(now + datetime.timedelta(days=5 * 365))
+                .sign(key, hashes.SHA256()))
+
+        if key_file:
+            os.makedirs(os.path.dirname(key_file), exist_ok=True)
+            with open(key_file, 'wb') as f:
+                f.write(key.private_bytes(serialization.Encoding.PEM,
+                                          serialization.PrivateFormat.PKCS8,
+                                          serialization.NoEncryption()))
+                f.write(cert.public_bytes(serialization.Encoding.PEM))
+        return key, cert.public_bytes(serialization.Encoding.DER)
+
+class FakeSession:
+    def __init__(self, card):
+        self.card = card
+        self.open = True
+
+class FakeTokenBackend(TokenBackend):
+    """Backend con tarjetas simuladas en memoria.
+
+    latency simula el coste (en segundos) de cada operación de tarjeta: login,
+    búsqueda de objetos, lectura de certificado y firma. El PIN se bloquea
+    (CKR_PIN_LOCKED) tras max_retries intentos fallidos seguidos.
+    """
+
+    name = "fake"
+
+    def __init__(self, cards=1, pin=DEFAULT_PIN, latency=0.0, max_retries=DEFAULT_RETRIES,
+                 key_files=None, key_size=2048):
+        self.key = ("fake", id(self))
+        self.latency = latency
+        key_files = key_files or [None] * cards
+        self.cards = [FakeCard(i, pin, max_retries, key_files[i], key_size) for i in range(cards)]
+        self._events = threading.Condition()
+        self._event_count = 0
+
+    @classmethod
+    def from_env(cls):
+        """Configurar desde DNIE_FAKE_PIN, DNIE_FAKE_LATENCY_MS, DNIE_FAKE_RETRIES,
+        DNIE_FAKE_TOKENS y DNIE_FAKE_KEY_DIR.
+
+        Las claves son efímeras salvo que DNIE_FAKE_KEY_DIR indique dónde
+        guardarlas: la clave privada se escribe sin cifrar y no debe acabar
+        junto a los vaults de verdad.
+        """
+        cards = int(os.environ.get("DNIE_FAKE_TOKENS", "1"))
+        key_dir = os.environ.get("DNIE_FAKE_KEY_DIR")
+        if key_dir:
+            key_files = [os.path.join(key_dir, f"fake_token_{i}.pem") for i in range(cards)]
+        else:
+            key_files = None
+        return cls(
+            cards=cards,
+            pin=os.environ.get("DNIE_FAKE_PIN", DEFAULT_PIN),
+            latency=float(os.environ.get("DNIE_FAKE_LATENCY_MS", "0")) / 1000.0,
+            max_retries=int(os.environ.get("DNIE_FAKE_RETRIES", str(DEFAULT_RETRIES))),
+            key_files=key_files,
+        )
+
+    def _card_operation(self, card):
+        """Comprobar la tarjeta y simular su latencia (el llamador tiene card.lock)"""
+        if not card.present:
+            raise Exception("CKR_TOKEN_NOT_PRESENT")
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- Simulación de lector ---
+    def remove_card(self, index=0):
+        self.cards[index].present = False
+        self._notify_event()
+
+    def insert_card(self, index=0):
+        self.cards[index].present = True
+        self._notify_event()
+
+    def _notify_event(self):
+        with self._events:
+            self._event_count += 1
+            self._events.notify_all()
+
+    def wait_for_slot_event(self):
+        with self._events:
+            seen = self._event_count
+            self._events.wait_for(lambda: self._event_count != seen)
+
+    # --- TokenBackend ---
+    def list_tokens(self):
+        return [{"slot": card, "slot_id": card.slot_id, "serial": card.serial, "label": card.label}
+                for card in self.cards if card.present]
+
+    def read_public_certificate(self, slot):
+        with slot.lock:
+            self._card_operation(slot)
+            return slot.certificate
+
+    def open_session(self, slot, pin):
+        with slot.lock:
+            self._card_operation(slot)
+            if slot.retries_left <= 0:
+                raise Exception("CKR_PIN_LOCKED")
+            if pin != slot.pin:
+                slot.retries_left -= 1
+                raise Exception("CKR_PIN_LOCKED" if slot.retries_left <= 0 else "CKR_PIN_INCORRECT")
+            slot.retries_left = slot.max_retries
+            return FakeSession(slot)
+
+    def close_session(self, session):
+        session.open = False
+
+    def _check_session(self, session):
+        if not session.open:
+            raise Exception("CKR_SESSION_CLOSED")
+
+    def find_signing_key(self, session):
+        self._check_session(session)
+        with session.card.lock:
+            self._card_operation(session.card)
+            return session.card.private_key, {"label": "KprivAutenticacion", "candidates": 1}
+
+    def sign(self, session, key, data):
+        self._check_session(session)
+        with session.card.lock:
+            self._card_operation(session.card)
+            return key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+    def sign_digest(self, session, key, digest):
+        self._check_session(session)
+        with session.card.lock:
+            self._card_operation(session.card)
+            return key.sign(digest, padding.PKCS1v15(), utils.Prehashed(hashes.SHA256()))
+
+    def get_certificate(self, session):
+        self._check_session(session)
+        with session.card.lock:
+            self._card_operation(session.card)
+            return session.card.certificate
@@ -0,0 +1,139 @@
+# generator.py - Generador de contraseñas y frases de paso con entropía del sistema (os.urandom)
+import math
+import os
+import secrets
+import string
+
+# Caracteres que se confunden fácilmente al leerlos o copiarlos a mano
+AMBIGUOUS = "Il1O0o|`'\""
+
+# Bytes aleatorios que se piden de más en cada tanda, para no quedarse cortos tras el rechazo
+_MARGIN = 1.1
+
+class PasswordPolicy:
+    """Política de contraseñas: longitud, clases de caracteres y exclusiones.
+
+    Con require_each cada contraseña lleva al menos un carácter de cada clase
+    activada (las que no cumplen se descartan enteras, así que el resultado
+    sigue siendo uniforme entre las válidas).
+    """
+
+    def __init__(self, length=15, lower=True, upper=True, digits=True, symbols=True,
+                 exclude="", exclude_ambiguous=False, require_each=True):
+        if length < 1:
+            raise Exception("❌ La longitud debe ser al menos 1")
+        self.length = length
+        self.require_each = require_each
+        excluded = set(exclude) | (set(AMBIGUOUS) if exclude_ambiguous else set())
+        classes = []
+        for enabled, chars in ((lower, string.ascii_lowercase), (upper, string.ascii_uppercase),
+                               (digits, string.digits), (symbols, string.punctuation)):
+            if enabled:
+                chars = "".join(c for c in chars if c not in excluded)
+                if chars:
+                    classes.append(chars)
+        if not classes:
+            raise Exception("❌ La política no deja ningún carácter disponible")
+        if require_each and len(classes) > length:
+            raise Exception(f"❌ Con {len(classes)} clases obligatorias la longitud mínima es {len(classes)}")
+        self.classes = classes
+        self.alphabet = "".join(classes)
+
+    def entropy_bits(self) -> float:
+        """Bits de entropía: log2 del número de contraseñas posibles con esta política"""
+        n = len(self.alphabet)
+        if not self.require_each:
+            return self.length * math.log2(n)
+        # Inclusión-exclusión: cadenas que usan todas las clases
+        total = 0
+        sizes = [len(chars) for chars in self.classes]
+        for mask in range(1 << len(sizes)):
+            missing = sum(size for i, size in enumerate(sizes) if mask >> i & 1)
+            sign = -1 if bin(mask).count("1") % 2 else 1
+            total += sign * (n - missing) ** self.length
+        return math.log2(total)
+
+class PasswordGenerator:
+    """Genera contraseñas de una política a partir de bloques grandes de os.urandom.
+
+    Cada byte aleatorio se convierte en un carácter con bytes.translate; los
+    bytes por encima del mayor múltiplo del tamaño del alfabeto se borran en
+    la misma pasada (rechazo), así que no hay sesgo de módulo.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or PasswordPolicy()
+        alphabet = self.policy.alphabet.encode("ascii")
+        n = len(alphabet)
+        self._limit = 256 - 256 % n
+        self._table = bytes(alphabet[b % n] for b in range(256))
+        self._rejected = bytes(range(self._limit, 256))
+        # Para require_each: la clase falta si borrarla no cambia la contraseña
+        self._class_bytes = [chars.encode("ascii") for chars in self.policy.classes] \
+            if self.policy.require_each and len(self.policy.classes) > 1 else []
+
+    def _random_chars(self, count):
+        """count caracteres del alfabeto, uniformes"""
+        out = b""
+        while len(out) < count:
+            missing = count - len(out)
+            raw = os.urandom(int(missing * 256 / self._limit * _MARGIN) + 16)
+            out += raw.translate(self._table, self._rejected)
+        return out[:count]
+
+    def generate_many(self, count):
+        """Lista de count contraseñas"""
+        length = self.policy.length
+        class_bytes = self._class_bytes
+        passwords = []
+        while len(passwords) < count:
+            missing = count - len(passwords)
+            chars = self._random_chars(missing * length)
+            for start in range(0, len(chars), length):
+                password = chars[start:start + length]
+                if class_bytes and any(len(password.translate(None, cls)) == length for cls in class_bytes):
+                    continue  # le falta alguna clase obligatoria
+                passwords.append(password)
+        return [password.decode("ascii") for password in passwords[:count]]
+
+    def generate(self):
+        return self.generate_many(1)[0]
+
+def generate_password(length=15, **policy):
+    """Atajo: una contraseña con PasswordPolicy(length, **policy)"""
+    return PasswordGenerator(PasswordPolicy(length, **policy)).generate()
+
+# --- Frases de paso ---
+def load_wordlist(path):
+    """Palabras de un archivo (una por línea; admite el formato EFF "11111<TAB>palabra")"""
+    words = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                words.append(parts[-1])
+    words = sorted(set(words))
+    if len(words) < 2:
+        raise Exception(f"❌ La lista de palabras {path} no tiene suficientes palabras")
+    return words
+
+class PassphrasePolicy:
+    """Frase de paso: words palabras al azar de wordlist, unidas por separator"""
+
+    def __init__(self, wordlist, words=6, separator="-", capitalize=False):
+        if words < 1:
+            raise Exception("❌ La frase debe tener al menos una palabra")
+        self.wordlist = wordlist
+        self.words = words
+        self.separator = separator
+        self.capitalize = capitalize
+
+    def entropy_bits(self) -> float:
+        return self.words * math.log2(len(self.wordlist))
+
+def generate_passphrase(policy):
+    # secrets.randbelow ya descarta por rechazo: sin sesgo
+    words = [policy.wordlist[secrets.randbelow(len(policy.wordlist))] for _ in range(policy.words)]
+    if policy.capitalize:
+        words = [word.capitalize() for word in words]
+    return policy.separator.join(words)
@@ -0,0 +1,348 @@
+# importer.py - Importación en streaming de exportaciones de otros gestores (CSV, Bitwarden JSON, KeePass XML)
+import csv
+import io
+import json
+import os
+import re
+from urllib.parse import urlsplit
+from entry import Entry, now_date
+
+# xml.etree solo se importa al leer una exportación de KeePass
+
+# Entradas por escritura cifrada del vault
+BATCH_SIZE = 20000
+# Tamaño de los bloques de lectura (JSON de Bitwarden, XML de KeePass)
+_JSON_CHUNK = 1 << 16
+_XML_CHUNK = 1 << 16
+
+FORMATS = ("csv", "bitwarden", "keepass")
+_EXTENSIONS = {".csv": "csv", ".json": "bitwarden", ".xml": "keepass"}
+
+# Columnas reconocidas en los CSV (Bitwarden, Chrome/Firefox, KeePass, 1Password, LastPass...)
+_CSV_COLUMNS = {
+    "service": ("name", "title", "service", "account"),
+    "url": ("url", "login_uri", "web site", "website"),
+    "username": ("username", "login_username", "login name", "user name", "login", "email"),
+    "password": ("password", "login_password"),
+    "notes": ("notes", "extra", "comments", "note"),
+    "date": ("date", "modified", "last modified", "revisiondate", "lastmodificationtime"),
+}
+
+def _normalize_date(value, default):
+    """'2023-01-02T10:00:00.123Z' -> '2023-01-02 10:00:00' (mismo formato que la interfaz)"""
+    value = (value or "").strip()
+    if len(value) < 10 or not value[:4].isdigit():
+        return default
+    return value[:19].replace("T", " ")
+
+def _service_from_url(url):
+    url = (url or "").strip()
+    if not url:
+        return ""
+    host = urlsplit(url if "://" in url else "//" + url).hostname
+    return host or url
+
+def detect_format(path):
+    fmt = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise Exception(f"❌ No se reconoce el formato de {path}: indíquelo ({', '.join(FORMATS)})")
+    return fmt
+
+class ExportReader:
+    """Entradas (Entry) de un archivo exportado, leídas en streaming.
+
+    El archivo se recorre una sola vez sin cargarlo entero; position/size
+    sirven para informar del progreso en bytes.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or detect_format(path)
+        if self.format not in FORMATS:
+            raise Exception(f"❌ Formato de importación desconocido: {self.format}")
+        self.size = os.path.getsize(path)
+        self.date = now_date()
+        self._file = open(path, "rb")
+
+    @property
+    def position(self):
+        return self._file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __iter__(self):
+        if self.format == "keepass":
+            return self._iter_keepass()
+        text = io.TextIOWrapper(self._file, encoding="utf-8-sig", newline="")
+        if self.format == "csv":
+            return self._iter_csv(text)
+        return self._iter_bitwarden(text)
+
+    # --- CSV ---
+    def _iter_csv(self, text):
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            return
+        columns = [name.strip().lower() for name in header]
+        fields = {}
+        for field, names in _CSV_COLUMNS.items():
+            for name in names:
+                if name in columns:
+                    fields[field] = columns.index(name)
+                    break
+        if "service" not in fields and "url" not in fields:
+            raise Exception(f"❌ El CSV no tiene columna de servicio (name/title/url): {', '.join(header)}")
+
+        def cell(row, field):
+            i = fields.get(field)
+            return row[i] if i is not None and i < len(row) else ""
+
+        for row in reader:
+            yield Entry(cell(row, "service").strip() or _service_from_url(cell(row, "url")),
+                        cell(row, "username"), cell(row, "password"), cell(row, "notes"),
+                        _normalize_date(cell(row, "date"), self.date))
+
+    # --- Bitwarden JSON ---
+    def _iter_bitwarden(self, text):
+        """Objetos de la lista "items" (o "entries", exportación de este vault) uno a uno.
+
+        Se lee por bloques y cada elemento se decodifica con raw_decode en
+        cuanto está completo en el búfer, así que nunca se tiene todo el
+        JSON en memoria.
+        """
+        decoder = json.JSONDecoder()
+        start = re.compile(r'"(items|entries)"\s*:\s*\[')
+        encrypted = re.compile(r'"encrypted"\s*:\s*true')
+        buf = ""
+        pos = 0
+        eof = False
+        match = None
+        while match is None:
+            chunk = text.read(_JSON_CHUNK)
+            if not chunk:
+                raise Exception("❌ El JSON no contiene una lista de elementos (items)")
+            # Se conserva el final del bloque anterior por si la clave quedó partida
+            buf = buf[-32:] + chunk
+            match = start.search(buf)
+            if encrypted.search(buf, 0, match.start() if match else len(buf)):
+                raise Exception("❌ La exportación de Bitwarden está cifrada: exporte en formato JSON sin cifrar")
+        pos = match.end()
+
+        while True:
+            # Saltar separadores hasta el siguiente elemento
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                chunk = text.read(_JSON_CHUNK)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+            if pos >= len(buf):
+                raise Exception("❌ El JSON termina antes de cerrar la lista de elementos")
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise Exception("❌ JSON de Bitwarden mal formado") from None
+                # Elemento incompleto en el búfer: leer más y reintentar
+                chunk = text.read(_JSON_CHUNK)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            pos = end
+            entry = self._bitwarden_entry(item)
+            if entry is not None:
+                yield entry
+
+    def _bitwarden_entry(self, item):
+        if not isinstance(item, dict):
+            return None
+        if "service" in item:
+            # Exportación de este mismo vault
+            return Entry.from_dict(item)
+        login = item.get("login") or {}
+        if not login and not item.get("notes"):
+            return None  # tarjetas, identidades... sin usuario ni contraseña
+        uris = login.get("uris") or []
+        url = uris[0].get("uri", "") if uris and isinstance(uris[0], dict) else ""
+        return Entry((item.get("name") or "").strip() or _service_from_url(url),
+                     login.get("username") or "", login.get("password") or "", item.get("notes") or "",
+                     _normalize_date(item.get("revisionDate"), self.date))
+
+    # --- KeePass XML ---
+    def _iter_keepass(self):
+        """Entradas de una exportación XML de KeePass 2.x.
+
+        El parser (expat) llama directamente a _KeePassTarget sin construir el
+        árbol XML; las entradas se entregan tras cada bloque leído.
+        """
+        from xml.etree.ElementTree import XMLParser
+        target = _KeePassTarget()
+        parser = XMLParser(target=target)
+        while True:
+            chunk = self._file.read(_XML_CHUNK)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+            for fields in target.entries:
+                yield Entry(fields.get("Title", "").strip() or _service_from_url(fields.get("URL")),
+                            fields.get("UserName", ""), fields.get("Password", ""), fields.get("Notes", ""),
+                            _normalize_date(fields.get(_MODIFIED), self.date))
+            target.entries.clear()
+            if not chunk:
+                return
+
+# Campo interno con la fecha de modificación de la entrada de KeePass
+_MODIFIED = "\0modified"
+
+class _KeePassTarget:
+    """Destino del parser XML: reúne los <String> de cada <Entry> (sin su <History>)"""
+
+    def __init__(self):
+        self.entries = []
+        self._history = 0
+        self._fields = None
+        self._key = ""
+        self._text = None
+
+    def start(self, tag, attrib):
+        if tag == "History":
+            # Las versiones antiguas de cada entrada no se importan
+            self._history += 1
+        elif self._history:
+            return
+        elif tag == "Entry":
+            self._fields = {}
+        elif self._fields is not None and tag in ("Key", "Value", "LastModificationTime"):
+            self._text = []
+
+    def data(self, text):
+        if self._text is not None:
+            self._text.append(text)
+
+    def end(self, tag):
+        if tag == "History":
+            self._history -= 1
+            return
+        if self._history or self._fields is None:
+            return
+        if tag == "Key":
+            self._key = "".join(self._text)
+        elif tag == "Value":
+            self._fields[self._key] = "".join(self._text)
+        elif tag == "LastModificationTime":
+            self._fields[_MODIFIED] = "".join(self._text)
+        elif tag == "Entry":
+            self.entries.append(self._fields)
+            self._fields = None
+        self._text = None
+
+    def close(self):
+        return None
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.renamed = 0
+        self.skipped = 0
+        self.batches = 0
+        # Entradas ya guardadas en el vault, por orden de importación
+        self.entries = []
+        self.cancelled = False
+
+    def summary(self):
+        text = f"{self.imported} importadas, {self.duplicates} duplicadas omitidas"
+        if self.renamed:
+            text += f", {self.renamed} renombradas"
+        if self.skipped:
+            text += f", {self.skipped} sin servicio omitidas"
+        return text
+
+class Importer:
+    """Deduplica las entradas importadas y las guarda en tandas.
+
+    Una entrada cuyo (servicio, usuario) ya existe se omite. Si solo coincide
+    el servicio (otro usuario) se renombra a "servicio (usuario)", porque la
+    interfaz identifica las entradas por servicio.
+    """
+
+    def __init__(self, existing=(), batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self._pairs = set()
+        self._services = set()
+        for entry in existing:
+            self._pairs.add((entry.service, entry.username))
+            self._services.add(entry.service)
+        self.result = ImportResult()
+
+    def _prepare(self, entry):
+        """entry lista para guardar, o None si se omite"""
+        if not entry.service:
+            self.result.skipped += 1
+            return None
+        pair = (entry.service, entry.username)
+        if pair in self._pairs:
+            self.result.duplicates += 1
+            return None
+        self._pairs.add(pair)
+        if entry.service in self._services:
+            base = f"{entry.service} ({entry.username})" if entry.username else entry.service
+            name, n = base, 2
+            while name in self._services:
+                name = f"{base} #{n}"
+                n += 1
+            entry.service = name
+            self._pairs.add((entry.service, entry.username))
+            self.result.renamed += 1
+        self._services.add(entry.service)
+        return entry
+
+    def run(self, reader, commit, progress=None):
+        """Importar las entradas de reader; commit(lista) hace una escritura del vault por tanda.
+
+        progress(bytes_leídos, bytes_totales) se llama tras cada tanda y cada
+        1000 entradas leídas. Las tandas ya guardadas se mantienen si algo
+        (p. ej. una cancelación) interrumpe la importación.
+        """
+        result = self.result
+        batch = []
+        size = getattr(reader, "size", 0)
+        for count, entry in enumerate(reader, 1):
+            entry = self._prepare(entry)
+            if entry is not None:
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._commit(batch, commit)
+                    batch = []
+            if progress and count % 1000 == 0:
+                progress(reader.position, size)
+        if batch:
+            self._commit(batch, commit)
+        if progress:
+            progress(size, size)
+        return result
+
+    def _commit(self, batch, commit):
+        commit(batch)
+        self.result.imported += len(batch)
+        self.result.batches += 1
+        self.result.entries.extend(batch)
+
+def import_file(path, crypto, fmt=None, batch_size=BATCH_SIZE, progress=None):
+    """Importar path en el vault de crypto (CryptoManager autenticado)"""
+    importer = Importer(crypto.list_entries(), batch_size)
+    with ExportReader(path, fmt) as reader:
+        return importer.run(reader, crypto.add_entries, progress)
@@ -1,14 +1,24 @@
 # interfaz.py - Interfaz gráfica completa con sesión persistente
 import os
-import json
 import datetime
-import string   
-import random
+import bisect
+import threading
 import customtkinter as ctk
 from tkinter import messagebox, filedialog, simpledialog
 from pathlib import Path
-import OTP
 from dnie import DNIeManager
+from digest_cache import DigestCache
+import signature_format
+from virtual_list import VirtualList
+from search import SearchIndex
+import vault_model
+from vault_model import VaultModel
+from entry import Entry
+from generator import PasswordGenerator, PasswordPolicy
+from audit import Auditor, format_report
+from importer import ExportReader, Importer
+import tasks
+from tasks import TkExecutor
 
 # --- Manejo de pyperclip con fallback ---
 try:
@@ -18,6 +28,24 @@ except ImportError:
     PYPERCLIP_AVAILABLE = False
     print("⚠️  pyperclip no está instalado. Las funciones de copiado no estarán disponibles.")
 
+# Espera tras la última tecla antes de filtrar la lista
+SEARCH_DEBOUNCE_MS = 120
+# Cada cuánto se mira en el hilo de la interfaz si el vigilante de slots ha avisado
+CARD_POLL_MS = 250
+# Guardado diferido: el vault se escribe tras este tiempo sin más cambios
+AUTOSAVE_IDLE_MS = 1500
+
+# Metadato del vault con el secreto TOTP del usuario
+OTP_SECRET_KEY = "otp_secret"
+
+# Estados del indicador de guardado
+SAVE_STATES = {
+    "saved": ("✅ Guardado", "#16a34a"),
+    "dirty": ("● Cambios sin guardar", "#d97706"),
+    "saving": ("💾 Guardando…", "#2563eb"),
+    "error": ("❌ Error al guardar", "#dc2626"),
+}
+
 def now_iso():
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -33,7 +61,7 @@ def ask_dnie_pin(parent=None, purpose="autenticación"):
 
 # ---------- App ----------
 class BitwardenLikeApp(ctk.CTk):
-    def __init__(self, crypto_manager):
+    def __init__(self, crypto_manager, defer_load=False):
         super().__init__()
         self.title("Vault — Gestor de Contraseñas")
         self.geometry("1000x600")
@@ -41,14 +69,36 @@ class BitwardenLikeApp(ctk.CTk):
 
         # Guardar crypto manager autenticado
         self.crypto_manager = crypto_manager
+        # Caché de digests compartida por firma y verificación
+        self.digest_cache = DigestCache()
+        # Operaciones bloqueantes (DNIe, hash de archivos, cifrado del vault) en segundo plano
+        self.tasks = TkExecutor(self)
 
         # Apariencia
         ctk.set_appearance_mode("light")
         ctk.set_default_color_theme("blue")
 
         # Cargar datos usando el crypto manager ya autenticado
-        self.entries = self._load_entries()
-        self.filtered_names = []
+        # (defer_load: la interfaz se construye antes del login y unlock() la rellena)
+        entries = [] if defer_load else self._load_entries()
+        # Modelo compartido: avisa a la lista y al índice de búsqueda de cada cambio
+        self.model = VaultModel()
+        self.search_index = SearchIndex()
+        self._filter_job = None
+        # Guardado diferido (write-behind)
+        self._autosave_job = None
+        self._saving = False
+        self._flush_again = False
+        # Acciones desactivadas mientras unlock() descifra el vault
+        self._locked = False
+        # Verificador TOTP del usuario (se crea al mostrar la primera contraseña)
+        self._otp = None
+        self._generators = {}
+        # Auditoría de contraseñas: se analiza todo al abrir el panel y después solo lo que cambia
+        self.auditor = None
+        # Análisis completo en curso y nombres que cambian mientras tanto
+        self._audit_task = None
+        self._audit_changed = set()
         self.selected_name = None
         self.current_user = None
 
@@ -73,54 +123,132 @@ class BitwardenLikeApp(ctk.CTk):
         self._build_detail_pane()
 
         # Poblar lista
-        self._refresh_names()
-        self._apply_filter()
+        self.model.subscribe(self._on_model_change)
+        self.model.reset(entries)
 
     def _load_entries(self):
         """Cargar entradas usando el crypto manager autenticado"""
         try:
-            entries_data = self.crypto_manager.load_db()
-            return self._convert_from_crypto_format(entries_data)
+            return self.crypto_manager.load_db().get("entries", [])
         except Exception as e:
-            print(f"Error cargando entradas: {e}")
-            messagebox.showinfo("Información", "No se encontró vault existente. Se creará uno nuevo.")
-            return {}
+            return self._on_load_error(e)
+
+    def _on_load_error(self, error):
+        print(f"Error cargando entradas: {error}")
+        messagebox.showinfo("Información", "No se encontró vault existente. Se creará uno nuevo.")
+        return []
+
+    def unlock(self, pin, on_done=None):
+        """Login con el DNIe y descifrado del vault en segundo plano.
+
+        La ventana sigue respondiendo mientras tanto, pero las acciones que
+        leen o escriben el vault o usan el DNIe quedan desactivadas hasta que
+        el desbloqueo termina bien; al terminar se rellena la lista y se llama
+        a on_done(ok) en el hilo de la interfaz.
+        """
+        title = self.title()
+        self.title(f"{title} — Desbloqueando...")
+        self._set_locked(True)
+
+        def run(task):
+            entries_data, error = None, None
+            ok = self.crypto_manager.initialize_with_pin(pin)
+            if ok:
+                try:
+                    entries_data = self.crypto_manager.load_db()
+                except Exception as e:
+                    error = e
+            return ok, entries_data, error
+
+        self.tasks.submit("Desbloqueando vault", run,
+                          on_done=lambda result: self._on_unlocked(title, *result, on_done),
+                          on_error=lambda e: self._on_unlocked(title, False, None, e, on_done),
+                          lane="dnie", cancellable=False)
+
+    def _on_unlocked(self, title, ok, entries_data, error, on_done):
+        self.title(title)
+        if ok:
+            if error is not None:
+                self.model.reset(self._on_load_error(error))
+            else:
+                self.model.reset(entries_data.get("entries", []))
+            self._set_locked(False)
+        if on_done:
+            on_done(ok)
+
+    def _set_locked(self, locked):
+        """Activar o desactivar las acciones que necesitan el vault desbloqueado"""
+        self._locked = locked
+        state = "disabled" if locked else "normal"
+        for button in (self.new_btn, self.import_btn, self.firm_btn, self.verify_btn, self.user_btn,
+                       self.audit_btn, self.save_btn, self.copy_btn, self.delete_btn):
+            button.configure(state=state)
+
+    # ---------- Guardado diferido ----------
+    def _mark_dirty(self):
+        """Hay cambios sin guardar: se escriben tras AUTOSAVE_IDLE_MS sin más ediciones"""
+        if self._autosave_job is not None:
+            self.after_cancel(self._autosave_job)
+        self._autosave_job = self.after(AUTOSAVE_IDLE_MS, self.flush)
+        if not self._saving:
+            self._set_save_state("dirty")
+
+    def flush(self, event=None):
+        """Guardar ya los cambios pendientes del modelo (en segundo plano)"""
+        if self._autosave_job is not None:
+            self.after_cancel(self._autosave_job)
+            self._autosave_job = None
+        if self._locked:
+            # Aún no hay vault descifrado en el que guardar
+            return
+        if self._saving:
+            # Se vuelve a guardar en cuanto termine el guardado en curso
+            self._flush_again = True
+            return
+        upserts, deletions = self.model.pending_changes()
+        if not upserts and not deletions:
+            return
+
+        def saved(_result):
+            self._saving = False
+            self.model.mark_saved(upserts, deletions)
+            if self._flush_again:
+                self._flush_again = False
+                self.flush()
+            else:
+                self._set_save_state("dirty" if self.model.has_changes() else "saved")
+
+        def failed(e):
+            # Los cambios siguen pendientes: se reintenta en la siguiente edición o al cerrar
+            self._saving = False
+            self._flush_again = False
+            self._set_save_state("error")
+            messagebox.showerror("Error", f"No se pudieron guardar las contraseñas: {e}")
 
-    def _save_entries(self):
-        """Guardar entradas usando el crypto manager autenticado"""
+        self._saving = True
+        self._set_save_state("saving")
+        # Un solo hilo para el vault: los guardados se escriben en orden
+        self.tasks.submit("Guardando vault", lambda task: self.crypto_manager.apply_changes(upserts, deletions),
+                          on_done=saved, on_error=failed, lane="vault", cancellable=False)
+
+    def _flush_sync(self):
+        """Guardar lo pendiente en este hilo (al cerrar, con el ejecutor ya parado)"""
+        if self._autosave_job is not None:
+            self.after_cancel(self._autosave_job)
+            self._autosave_job = None
+        if not self.model.has_changes():
+            return
+        upserts, deletions = self.model.pending_changes()
         try:
-            crypto_entries = self._convert_to_crypto_format(self.entries)
-            self.crypto_manager.save_db(crypto_entries)
-            return True
+            self.crypto_manager.apply_changes(upserts, deletions)
+            self.model.mark_saved(upserts, deletions)
+            print("💾 Cambios guardados al cerrar")
         except Exception as e:
-            messagebox.showerror("Error", f"No se pudieron guardar las contraseñas: {e}")
-            return False
-
-    def _convert_from_crypto_format(self, crypto_entries):
-        """Convertir del formato crypto manager al formato de interfaz"""
-        entries = {}
-        if "entries" in crypto_entries:
-            for entry in crypto_entries["entries"]:
-                entries[entry["service"]] = {
-                    "Username": entry["username"],
-                    "Password": entry["password"],
-                    "Extra info": entry.get("notes", ""),
-                    "FDate": entry.get("date", now_iso())
-                }
-        return entries
-
-    def _convert_to_crypto_format(self, entries):
-        """Convertir del formato de interfaz al formato crypto manager"""
-        crypto_entries = {"entries": []}
-        for name, data in entries.items():
-            crypto_entries["entries"].append({
-                "service": name,
-                "username": data.get("Username", ""),
-                "password": data.get("Password", ""),
-                "notes": data.get("Extra info", ""),
-                "date": data.get("FDate", now_iso())
-            })
-        return crypto_entries
+            print(f"❌ No se pudieron guardar los cambios al cerrar: {e}")
+
+    def _set_save_state(self, state):
+        text, color = SAVE_STATES[state]
+        self.save_label.configure(text=text, text_color=color)
 
     def _build_sidebar(self):
         self.logo = ctk.CTkLabel(self.sidebar, text="Vault", font=ctk.CTkFont(size=20, weight="bold"), text_color="white")
@@ -133,7 +261,7 @@ class BitwardenLikeApp(ctk.CTk):
         self.new_btn = ctk.CTkButton(self.sidebar, text=" + New", fg_color="#1e40af", hover_color="#1b3b92", corner_radius=8, command=self.on_new)
         self.new_btn.pack(padx=16, pady=(18,6), fill="x")
 
-        self.import_btn = ctk.CTkButton(self.sidebar, text=" Import JSON", fg_color="#2563eb", hover_color="#1e4fd3", corner_radius=8, command=self.on_import)
+        self.import_btn = ctk.CTkButton(self.sidebar, text=" 📥 Importar", fg_color="#2563eb", hover_color="#1e4fd3", corner_radius=8, command=self.on_import)
         self.import_btn.pack(padx=16, pady=(0,6), fill="x")
 
         # Botones de firma/verificación
@@ -148,6 +276,27 @@ class BitwardenLikeApp(ctk.CTk):
                                      fg_color="#7c3aed", hover_color="#6d28d9", 
                                      corner_radius=8, command=self.show_user_info)
         self.user_btn.pack(padx=16, pady=(0,6), fill="x")
+
+        self.audit_btn = ctk.CTkButton(self.sidebar, text=" 🩺 Auditoría", fg_color="#b45309", hover_color="#92400e",
+                                       corner_radius=8, command=self.show_audit)
+        self.audit_btn.pack(padx=16, pady=(0,6), fill="x")
+
+        # Estado del lector (actualizado por eventos del vigilante de slots)
+        self.card_status = ctk.CTkLabel(self.sidebar, text="", text_color="#cbd5e1")
+        self.card_status.pack(padx=16, pady=(12,0), anchor="w")
+        self._unsubscribe_card = None
+        self._card_poll_job = None
+        try:
+            from slot_watcher import get_watcher
+            watcher = get_watcher()
+            self._update_card_status(watcher.present)
+            # Los avisos llegan en el hilo del vigilante, donde Tk no se puede tocar:
+            # solo se marca el cambio y _poll_card_status lo recoge con after()
+            self._card_changed = threading.Event()
+            self._unsubscribe_card = watcher.subscribe(lambda event, slot_id: self._card_changed.set())
+            self._card_poll_job = self.after(CARD_POLL_MS, lambda: self._poll_card_status(watcher))
+        except Exception as e:
+            print(f"⚠️  No se pudo vigilar el lector de DNIe: {e}")
          
         # Toggle modo
         toggles_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
@@ -163,6 +312,18 @@ class BitwardenLikeApp(ctk.CTk):
         self.mode_switch.select() if ctk.get_appearance_mode() == "Dark" else self.mode_switch.deselect()
         self.mode_switch.pack(anchor="w", padx=10, pady=6)
         
+    def _poll_card_status(self, watcher):
+        if self._card_changed.is_set():
+            self._card_changed.clear()
+            self._update_card_status(watcher.present)
+        self._card_poll_job = self.after(CARD_POLL_MS, lambda: self._poll_card_status(watcher))
+
+    def _update_card_status(self, present):
+        if present:
+            self.card_status.configure(text="🟢 DNIe conectado")
+        else:
+            self.card_status.configure(text="🔴 DNIe no detectado")
+
     def _toggle_mode(self):
         cur = ctk.get_appearance_mode()
         new_mode = "Dark" if cur == "Light" else "Light"
@@ -183,63 +344,177 @@ class BitwardenLikeApp(ctk.CTk):
                               f"📁 Vaults guardados en:\n{vaults_dir}\n\n"
                               "No hay vaults de usuarios registrados")
 
+    def show_audit(self):
+        """Panel con el informe de salud de las contraseñas del vault.
+
+        La primera vez el análisis completo se hace en segundo plano; después
+        el auditor se mantiene al día con cada cambio del modelo.
+        """
+        if self.auditor is not None:
+            self._open_audit_panel(self.auditor.report())
+            return
+        if self._audit_task is not None:
+            return  # ya se está analizando
+
+        # Copia de las entradas para el hilo del vault; lo que cambie mientras
+        # tanto se anota en _audit_changed y se reanaliza al terminar
+        items = list(self.model.items())
+        breach = self._breach_checker()
+        self._audit_changed.clear()
+
+        def work(task):
+            auditor = Auditor(breach=breach)
+            auditor.build(items)
+            return auditor, auditor.report()
+
+        def done(result):
+            if self._audit_task is not task:
+                return  # el vault se recargó mientras tanto
+            self._audit_task = None
+            auditor, report = result
+            if self._audit_changed:
+                for name in self._audit_changed:
+                    entry = self.model.get(name)
+                    if entry is None:
+                        auditor.remove(name)
+                    else:
+                        auditor.update(name, entry)
+                self._audit_changed.clear()
+                report = auditor.report()
+            self.auditor = auditor
+            self._open_audit_panel(report)
+
+        def failed(e):
+            if self._audit_task is task:
+                self._audit_task = None
+            messagebox.showerror("Error", f"❌ Error en la auditoría: {e}")
+
+        task = self.tasks.submit("Analizando contraseñas", work, on_done=done, on_error=failed,
+                                 lane="vault", cancellable=False)
+        self._audit_task = task
+
+    def _open_audit_panel(self, report):
+        lines = format_report(report, limit=25)
+
+        win = ctk.CTkToplevel(self)
+        win.title("Auditoría de contraseñas")
+        win.geometry("620x520")
+        text = ctk.CTkTextbox(win, wrap="word")
+        text.pack(fill="both", expand=True, padx=12, pady=(12,6))
+        text.insert("1.0", "\n".join(lines))
+        text.configure(state="disabled")
+        ctk.CTkButton(win, text="Cerrar", width=90, command=win.destroy).pack(pady=(0,12))
+        win.transient(self)
+        win.focus()
+
+    def _breach_checker(self):
+        """Corpus local de contraseñas filtradas (None sin corpus o en modo standalone)"""
+        if self.crypto_manager is None:
+            return None
+        return self.crypto_manager.breach_checker()
+
     def on_import(self):
-        messagebox.showinfo("Importar", "Función de import no implementada en este prototipo.")
+        """Importar una exportación de otro gestor (CSV, Bitwarden JSON, KeePass XML) en segundo plano"""
+        if self.crypto_manager is None:
+            messagebox.showinfo("Importar", "La importación necesita un vault desbloqueado.")
+            return
+        path = filedialog.askopenfilename(
+            title="Selecciona la exportación a importar",
+            filetypes=[("Exportaciones", "*.csv *.json *.xml"), ("CSV", "*.csv"),
+                       ("Bitwarden JSON", "*.json"), ("KeePass XML", "*.xml")]
+        )
+        if not path:
+            return
+
+        # Se deduplica contra lo que hay ahora en el modelo; lo pendiente se guarda
+        # antes, porque la importación va detrás en el mismo carril del vault
+        importer = Importer([entry for _name, entry in self.model.items()])
+        self.flush()
+
+        def work(task):
+            with ExportReader(path) as reader:
+                try:
+                    importer.run(reader, self.crypto_manager.add_entries, progress=task.report)
+                except tasks.TaskCancelled:
+                    # Las tandas ya escritas se quedan en el vault
+                    importer.result.cancelled = True
+            return importer.result
+
+        def done(result):
+            self.model.add_saved(result.entries)
+            title = "Importación cancelada" if result.cancelled else "Importación completada"
+            messagebox.showinfo(title, f"✅ {result.summary()}")
+
+        def failed(e):
+            self.model.add_saved(importer.result.entries)
+            messagebox.showerror("Error", f"❌ Error al importar: {e}")
+
+        self.tasks.submit(f"Importando {os.path.basename(path)}", work,
+                          on_done=done, on_error=failed, lane="vault")
 
     def on_firm(self):
         """Firmar un documento usando DNIe (pide PIN específico)"""
-        try:
-            file_path = filedialog.askopenfilename(
-                title="Selecciona el archivo a firmar",
-                filetypes=[("Todos los archivos", "*.*")]
-            )
-            if not file_path:
-                return
-
-            # Para firma, pedir PIN específico
-            pin = ask_dnie_pin(self, "firmar el documento")
-            if not pin:
-                return
-
-            dnie = DNIeManager()
-            signature_package = dnie.sign_file(file_path, pin)
-            
-            signature_path = file_path + ".firma.json"
-            with open(signature_path, 'w') as f:
-                json.dump(signature_package, f, indent=2, ensure_ascii=False)
-            
-            dnie.close()
-            
+        file_path = filedialog.askopenfilename(
+            title="Selecciona el archivo a firmar",
+            filetypes=[("Todos los archivos", "*.*")]
+        )
+        if not file_path:
+            return
+
+        # Para firma, pedir PIN específico
+        pin = ask_dnie_pin(self, "firmar el documento")
+        if not pin:
+            return
+
+        def work(task):
+            # Hilo de trabajo: hash (con progreso y cancelable) y firma con el DNIe
+            dnie = DNIeManager(digest_cache=self.digest_cache)
+            try:
+                signature_package = dnie.sign_file(file_path, pin, progress=task.report)
+                task.check()
+                signature_path = signature_format.signature_path_for(file_path)
+                signature_format.save_signature_package(signature_package, signature_path)
+                return signature_package, signature_path
+            finally:
+                dnie.close()
+
+        def done(result):
+            signature_package, signature_path = result
             messagebox.showinfo("Firma completada", 
                 f"✅ Documento firmado correctamente\n\n"
                 f"📄 Archivo: {Path(file_path).name}\n"
                 f"🔏 Firma guardada en: {Path(signature_path).name}\n"
                 f"📊 Hash: {signature_package['file_hash'][:16]}...")
 
-        except Exception as e:
+        def failed(e):
             messagebox.showerror("Error al firmar", f"No se pudo firmar el archivo:\n\n{str(e)}")
 
+        self.tasks.submit(f"Firmando {Path(file_path).name}", work, done, failed, lane="dnie")
+
     def on_verify(self):
         """Verificar firma de un documento (sin pedir PIN)"""
-        try:
-            file_path = filedialog.askopenfilename(
-                title="Selecciona el archivo original",
-                filetypes=[("Todos los archivos", "*.*")]
-            )
-            if not file_path:
-                return
-
-            signature_path = filedialog.askopenfilename(
-                title="Selecciona el archivo de firma (.firma.json)",
-                filetypes=[("Archivos de firma", "*.firma.json"), ("Todos los archivos", "*.*")]
-            )
-            if not signature_path:
-                return
-
-            dnie = DNIeManager()
-            is_valid = dnie.verify_signature(file_path, signature_path)
-            dnie.close()
+        file_path = filedialog.askopenfilename(
+            title="Selecciona el archivo original",
+            filetypes=[("Todos los archivos", "*.*")]
+        )
+        if not file_path:
+            return
+
+        signature_path = filedialog.askopenfilename(
+            title="Selecciona el archivo de firma (.firma.json / .firma.sig)",
+            filetypes=[("Archivos de firma", "*.firma.json *.firma.sig"), ("Todos los archivos", "*.*")]
+        )
+        if not signature_path:
+            return
 
+        def work(task):
+            dnie = DNIeManager(digest_cache=self.digest_cache)
+            try:
+                return dnie.verify_signature(file_path, signature_path, progress=task.report)
+            finally:
+                dnie.close()
+
+        def done(is_valid):
             if is_valid:
                 messagebox.showinfo("Verificación exitosa", 
                     f"✅ Firma VÁLIDA\n\n"
@@ -253,9 +528,11 @@ class BitwardenLikeApp(ctk.CTk):
                     f"🔏 La firma no es válida\n"
                     f"⚠️  El archivo puede haber sido modificado")
 
-        except Exception as e:
+        def failed(e):
             messagebox.showerror("Error en verificación", f"No se pudo verificar la firma:\n\n{str(e)}")
 
+        self.tasks.submit(f"Verificando {Path(file_path).name}", work, done, failed, lane="dnie")
+
     # ---------- Main view (search + list) ----------
     def _build_main_view(self):
         # Top: Search bar
@@ -269,7 +546,7 @@ class BitwardenLikeApp(ctk.CTk):
         self.search_var = ctk.StringVar()
         self.search_entry = ctk.CTkEntry(topbar, placeholder_text="Search by name/username...", textvariable=self.search_var, width=420, corner_radius=10)
         self.search_entry.grid(row=0, column=1, sticky="ew", padx=(0,6))
-        self.search_entry.bind("<KeyRelease>", lambda e: self._apply_filter())
+        self.search_entry.bind("<KeyRelease>", lambda e: self._schedule_filter())
 
         clear_btn = ctk.CTkButton(topbar, text="Clear", width=70, command=self._clear_search)
         clear_btn.grid(row=0, column=2, padx=(6,0))
@@ -280,64 +557,147 @@ class BitwardenLikeApp(ctk.CTk):
         list_frame.grid_rowconfigure(0, weight=1)
         list_frame.grid_columnconfigure(0, weight=1)
 
-        self.scrollable = ctk.CTkScrollableFrame(list_frame, corner_radius=8, fg_color="transparent")
-        self.scrollable.grid(row=0, column=0, sticky="nsew", pady=(0,6))
+        # Lista virtualizada: un conjunto fijo de filas reutilizadas al desplazar o filtrar
+        self.entry_list = VirtualList(list_frame, corner_radius=8, on_select=self._select_name,
+                                      on_copy=self._copy_from_list, empty_text="No entries with wanted name")
+        self.entry_list.grid(row=0, column=0, sticky="nsew", pady=(0,6))
+
+        # Bottom: barra de estado de las operaciones en segundo plano
+        statusbar = ctk.CTkFrame(self.main, fg_color="transparent")
+        statusbar.grid(row=2, column=0, sticky="ew")
+        statusbar.grid_columnconfigure(0, weight=1)
+        self.status_label = ctk.CTkLabel(statusbar, text="", anchor="w", text_color="#475569")
+        self.status_label.grid(row=0, column=0, sticky="ew", padx=(6,6))
+        self.status_progress = ctk.CTkProgressBar(statusbar, width=160)
+        self.status_progress.set(0)
+        self.status_cancel = ctk.CTkButton(statusbar, text="Cancel", width=70, fg_color="#ef4444",
+                                           hover_color="#dc2626", command=self._cancel_current_task)
+        self._status_task = None
+        self.save_label = ctk.CTkLabel(statusbar, text="", anchor="e")
+        self.save_label.grid(row=0, column=3, padx=(12,6))
+        self.tasks.subscribe(self._update_status_bar)
+        self._update_status_bar([])
+        # Ctrl+S: guardar ya, sin esperar al guardado diferido
+        self.bind("<Control-s>", self.flush)
+
+    def _update_status_bar(self, active):
+        """Mostrar la operación en curso, su progreso y cuántas hay en cola"""
+        if not active:
+            self._status_task = None
+            self.status_label.configure(text="✅ Listo")
+            self.status_progress.grid_remove()
+            self.status_cancel.grid_remove()
+            return
+
+        running = [task for task in active if task.status == tasks.RUNNING]
+        current = running[0] if running else active[0]
+        self._status_task = current
+        queued = sum(1 for task in active if task.status == tasks.QUEUED)
+
+        text = f"⏳ {current.name}"
+        if current.progress is not None:
+            text += f" — {int(current.progress * 100)}%"
+        if queued:
+            text += f"   ·   {queued} en cola"
+        self.status_label.configure(text=text)
+
+        if current.progress is not None:
+            self.status_progress.set(current.progress)
+            self.status_progress.grid(row=0, column=1, padx=6)
+        else:
+            self.status_progress.grid_remove()
+        if current.cancellable and not current.cancelled:
+            self.status_cancel.grid(row=0, column=2, padx=(6,0))
+        else:
+            self.status_cancel.grid_remove()
+
+    def _cancel_current_task(self):
+        if self._status_task is not None and self._status_task.cancel():
+            self.status_label.configure(text=f"🛑 Cancelando {self._status_task.name}...")
+            self.status_cancel.grid_remove()
 
     def _clear_search(self):
         self.search_var.set("")
         self._apply_filter()
 
-    def _refresh_names(self):
-        # refresh internal sorted list of names
-        self.filtered_names = sorted(self.entries.keys())
-
-    def _apply_filter(self):
-        txt = self.search_var.get().lower().strip()
-        # Clear scrollable child widgets
-        for w in self.scrollable.winfo_children():
-            w.destroy()
-
-        # Filter names
-        matched = []
-        for name, data in sorted(self.entries.items()):
-            if txt == "" or txt in name.lower() or txt in data.get("Username", "").lower():
-                matched.append((name, data))
-
-        # Create a card (button-like) per entry
-        for name, data in matched:
-            card = ctk.CTkFrame(self.scrollable, corner_radius=10, fg_color="white", height=70)
-            card.pack(fill="x", padx=6, pady=6)
-
-            left = ctk.CTkFrame(card, fg_color="transparent")
-            left.pack(side="left", fill="both", expand=True, padx=10, pady=8)
-
-            lbl_name = ctk.CTkLabel(left, text=name, anchor="w", font=ctk.CTkFont(size=12, weight="bold"))
-            lbl_name.pack(anchor="w")
-            sub = ctk.CTkLabel(left, text=data.get("Username", ""), anchor="w", text_color="#475569")
-            sub.pack(anchor="w")
-
-            right = ctk.CTkFrame(card, fg_color="transparent")
-            right.pack(side="right", padx=10, pady=8)
-
-            # Copy button small
-            btn_copy = ctk.CTkButton(right, text="📋", width=40, height=36, fg_color="#60a5fa", hover_color="#3b82f6", corner_radius=8,
-                                     command=lambda n=name: self._copy_from_list(n))
-            btn_copy.pack()
-
-            # Bind card click to select
-            card.bind("<Button-1>", lambda e, n=name: self._select_name(n))
-            lbl_name.bind("<Button-1>", lambda e, n=name: self._select_name(n))
-            sub.bind("<Button-1>", lambda e, n=name: self._select_name(n))
-
-        # If no matches, show message
-        if not matched:
-            empty = ctk.CTkLabel(self.scrollable, text="No entries with wanted name", text_color="#64748b")
-            empty.pack(pady=12)
+    def _on_model_change(self, event, name, old_name):
+        """Actualizar índice y lista solo en lo que ha cambiado"""
+        if event == vault_model.RESET:
+            self.search_index.build((name, name, entry.username, entry.notes)
+                                    for name, entry in self.model.items())
+            self._apply_filter()
+            # Vault nuevo: el análisis se rehace la próxima vez que se abra el panel
+            self.auditor = None
+            self._audit_task = None
+            return
+
+        # Todo cambio del modelo se guarda con el guardado diferido
+        self._mark_dirty()
+
+        gone = old_name if event == vault_model.RENAMED else name
+        if event in (vault_model.REMOVED, vault_model.RENAMED):
+            self.search_index.remove(gone)
+        if event != vault_model.REMOVED:
+            entry = self.model[name]
+            self.search_index.add(name, name, entry.username, entry.notes)
+        if self.auditor is not None:
+            if event in (vault_model.REMOVED, vault_model.RENAMED):
+                self.auditor.remove(gone)
+            if event != vault_model.REMOVED:
+                self.auditor.update(name, self.model[name])
+        elif self._audit_task is not None:
+            self._audit_changed.add(gone)
+            self._audit_changed.add(name)
+
+        if self.search_var.get().strip():
+            # Con filtro, el orden depende de la relevancia: se repite la búsqueda
+            self._apply_filter(keep_position=True)
+            return
+
+        # Sin filtro la lista es el modelo ordenado: se tocan solo las filas afectadas
+        if event in (vault_model.REMOVED, vault_model.RENAMED):
+            index = self._view_index(gone)
+            if index is not None:
+                self.entry_list.remove_item(index)
+        if event != vault_model.REMOVED:
+            item = (name, self.model[name].username)
+            index = self._view_index(name)
+            if index is not None:
+                self.entry_list.replace_item(index, item)
+            else:
+                self.entry_list.insert_item(bisect.bisect_left(self.entry_list.items, (name,)), item)
+
+    def _view_index(self, name):
+        """Posición de name en la lista sin filtrar (ordenada por nombre), o None"""
+        items = self.entry_list.items
+        index = bisect.bisect_left(items, (name,))
+        if index < len(items) and items[index][0] == name:
+            return index
+        return None
+
+    def _schedule_filter(self):
+        """Filtrar cuando el usuario deja de teclear (debounce)"""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(SEARCH_DEBOUNCE_MS, self._apply_filter)
+
+    def _apply_filter(self, keep_position=False):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+            self._filter_job = None
+        txt = self.search_var.get().strip()
+
+        # Sin texto: todas, en orden; con texto: resultados del índice por relevancia
+        names = self.search_index.search(txt) if txt else self.model.names
+        matched = [(name, self.model[name].username) for name in names]
+
+        # Solo se reenlazan datos en las filas visibles de la lista virtual
+        self.entry_list.set_items(matched, keep_position=keep_position)
 
     def _copy_from_list(self, name):
-        data = self.entries.get(name)
-        if data:
-            pwd = data.get("Password", "")
+        entry = self.model.get(name)
+        if entry:
+            pwd = entry.password
             if pwd:
                 if PYPERCLIP_AVAILABLE:
                     pyperclip.copy(pwd)
@@ -410,8 +770,11 @@ class BitwardenLikeApp(ctk.CTk):
         self.delete_btn.grid(row=0, column=2, padx=4, sticky="ew")
 
     def generar_contraseña(self, longitud=15):
-        caracteres = string.ascii_letters + string.digits + string.punctuation
-        return ''.join(random.choice(caracteres) for _ in range(longitud))
+        # os.urandom y sin sesgo de módulo; un generador por longitud (tablas precalculadas)
+        generator = self._generators.get(longitud)
+        if generator is None:
+            generator = self._generators[longitud] = PasswordGenerator(PasswordPolicy(longitud))
+        return generator.generate()
 
     def _generar_password(self):
         nueva_pwd = self.generar_contraseña(15)
@@ -425,8 +788,11 @@ class BitwardenLikeApp(ctk.CTk):
     def _toggle_show(self):
         """Mostrar/ocultar contraseña con verificación OTP"""
         if self.show_pwd_var.get():
-            # Mostrar QR (si es la primera vez) y pedir verificación
-            if OTP.mostrar_qr_y_verificar(self):
+            # Mostrar QR (si es la primera vez) y pedir verificación; dentro de la
+            # ventana de gracia de una verificación anterior no se pide código
+            # OTP importa qrcode y PIL: solo se cargan la primera vez que se usa
+            import OTP
+            if OTP.mostrar_qr_y_verificar(self, account_name=self._otp_account(), verifier=self._otp_verifier()):
                 self.pwd_entry.configure(show="")
             else:
                 self.show_pwd_var.set(False)  # cancelar si falla
@@ -435,17 +801,46 @@ class BitwardenLikeApp(ctk.CTk):
             # Ocultar contraseña
             self.pwd_entry.configure(show="*")
 
+    def _otp_verifier(self):
+        """Verificador TOTP con el secreto del vault de este usuario (leído una vez)"""
+        import OTP
+        if self.crypto_manager is None:
+            return OTP.default_verifier()
+        if self._otp is None:
+            secret = self.crypto_manager.get_meta(OTP_SECRET_KEY)
+            if secret is None:
+                # Migración: el antiguo .OTP.txt compartido pasa al vault de este usuario
+                secret = OTP.legacy_secret()
+                if secret is not None:
+                    self._store_otp_secret(secret, on_saved=OTP.remove_legacy_secret)
+            self._otp = OTP.OTPVerifier(secret=secret, save_secret=self._store_otp_secret)
+        return self._otp
+
+    def _otp_account(self):
+        """Nombre de la cuenta en el autenticador: distingue los vaults de cada DNIe"""
+        user_id = getattr(self.crypto_manager, "user_id", None)
+        return f"DNIe {user_id[:8]}" if user_id else "usuario@ejemplo.com"
+
+    def _store_otp_secret(self, secret, on_saved=None):
+        """Guardar el secreto TOTP en los metadatos del vault (cifrado), en segundo plano"""
+        def failed(e):
+            messagebox.showerror("Error", f"No se pudo guardar el secreto TOTP en el vault: {e}")
+        self.tasks.submit("Guardando secreto TOTP",
+                          lambda task: self.crypto_manager.set_meta(OTP_SECRET_KEY, secret),
+                          on_done=lambda _result: on_saved and on_saved(), on_error=failed,
+                          lane="vault", cancellable=False)
+
     # ---------- Actions ----------
     def _select_name(self, name):
         # load into detail pane
         self.selected_name = name
-        data = self.entries.get(name, {})
+        entry = self.model.get(name) or Entry(name)
         self.name_var.set(name)
-        self.user_var.set(data.get("Username", ""))
-        self.pwd_var.set(data.get("Password", ""))
+        self.user_var.set(entry.username)
+        self.pwd_var.set(entry.password)
         self.notes_box.delete("0.0", "end")
-        self.notes_box.insert("0.0", data.get("Extra info", ""))
-        self.date_label.configure(text=f"Last modification: {data.get('FDate','-')}")
+        self.notes_box.insert("0.0", entry.notes)
+        self.date_label.configure(text=f"Last modification: {entry.date or '-'}")
 
     def on_new(self):
         # clear detail pane for new entry
@@ -463,27 +858,21 @@ class BitwardenLikeApp(ctk.CTk):
             messagebox.showwarning("Aviso", "Name cannot be empty.")
             return
         
-        entry = {
-            "Username": self.user_var.get(),
-            "Password": self.pwd_var.get(),
-            "Extra info": self.notes_box.get("0.0", "end").strip(),
-            "FDate": now_iso()
-        }
+        entry = Entry(name, self.user_var.get(), self.pwd_var.get(),
+                      self.notes_box.get("0.0", "end").strip(), now_iso())
         
-        if self.selected_name and self.selected_name != name:
-            if self.selected_name in self.entries:
-                del self.entries[self.selected_name]
+        # El modelo avisa a la lista y al índice (renombrado incluido)
+        self.model.put(entry, old_name=self.selected_name)
+        self.entry_list.scroll_to(name)
         
-        self.entries[name] = entry
-        
-        # Guardar usando la sesión existente
-        if self._save_entries():
-            self._refresh_names()
-            self._apply_filter()
-            messagebox.showinfo("Saved", f"'{name}' guardado exitosamente.")
-            self.selected_name = name
-        else:
-            messagebox.showerror("Error", "No se pudo guardar la contraseña")
+        # El vault se escribe con el guardado diferido (indicador en la barra de estado)
+        self.selected_name = name
+
+        breach = self._breach_checker()
+        if breach is not None and entry.password and breach.contains(entry.password):
+            messagebox.showwarning("Contraseña filtrada",
+                                   f"⚠️ La contraseña de '{name}' aparece en filtraciones conocidas.\n"
+                                   "Se ha guardado, pero conviene cambiarla.")
 
     def on_copy(self):
         pwd = self.pwd_var.get()
@@ -501,16 +890,22 @@ class BitwardenLikeApp(ctk.CTk):
         confirm = messagebox.askyesno("Confirm deleting", f"¿Delete '{name}'?")
         if not confirm:
             return
-        if name in self.entries:
-            del self.entries[name]
-            self._save_entries()
+        self.model.remove(name)
         self.on_new()
-        self._refresh_names()
-        self._apply_filter()
-        messagebox.showinfo("Deleted", f"'{name}' deleted")
 
     def destroy(self):
         """Cerrar sesión al salir"""
+        if getattr(self, '_unsubscribe_card', None):
+            self._unsubscribe_card()
+        if getattr(self, '_card_poll_job', None) is not None:
+            self.after_cancel(self._card_poll_job)
+            self._card_poll_job = None
+        # Cancelar firmas/verificaciones pendientes, esperar a que termine un guardado
+        # en curso y escribir lo que quede pendiente
+        if hasattr(self, 'tasks'):
+            self.tasks.shutdown()
+        if hasattr(self, 'model'):
+            self._flush_sync()
         if hasattr(self, 'crypto_manager'):
             self.crypto_manager.close()
         super().destroy()
@@ -1,8 +1,17 @@
 # main.py - Pasa el crypto manager autenticado a la interfaz
+import os
 import sys
+
+# --fake-token: usar el DNIe simulado (igual que DNIE_BACKEND=fake)
+if "--fake-token" in sys.argv:
+    os.environ["DNIE_BACKEND"] = "fake"
+# --trace: medir las fases del arranque (igual que DNIE_TRACE=1)
+if "--trace" in sys.argv:
+    os.environ.setdefault("DNIE_TRACE", "1")
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import customtkinter as ctk
+import metrics
 
 # --- Fix Tkinter + CustomTkinter float issue ---
 try:
@@ -31,19 +40,32 @@ except ImportError as e:
     print(f"❌ No se pudo importar interfaz.py: {e}")
     INTERFAZ_AVAILABLE = False
 
-def ask_dnie_pin():
+# Tiempo máximo de espera a que se inserte el DNIe al arrancar
+CARD_WAIT_SECONDS = 120
+
+def ask_dnie_pin(parent=None):
     """Solicitar PIN del DNIe mediante popup"""
-    root = tk.Tk()
-    root.withdraw()
+    root = parent
+    if root is None:
+        root = tk.Tk()
+        root.withdraw()
     
     pin = simpledialog.askstring(
         "PIN del DNIe", 
         "🔐 Introduzca el PIN de su DNIe para acceder al gestor:",
+        parent=root,
         show='*'
     )
-    root.destroy()
+    if parent is None:
+        root.destroy()
     return pin
 
+def print_trace():
+    operation = metrics.end_operation()
+    if operation is not None:
+        for line in metrics.format_breakdown(operation.name, operation.duration_ms, operation.breakdown()):
+            print(line)
+
 def main():
     # Verificar dependencias
     if not CTK_AVAILABLE:
@@ -59,27 +81,52 @@ def main():
         sys.exit(1)
     
     try:
+        metrics.begin_operation("arranque")
         # Autenticación única al inicio
         print("🔐 Iniciando autenticación DNIe...")
-        print("📱 Por favor, inserte su DNIe en el lector...")
+        from slot_watcher import get_watcher
+        watcher = get_watcher()
+        if not watcher.present:
+            print("📱 Por favor, inserte su DNIe en el lector...")
+            if not watcher.wait_for_card(CARD_WAIT_SECONDS):
+                print("❌ No se detectó ningún DNIe")
+                sys.exit(1)
+        print("✅ DNIe detectado")
+        
+        # Arranque en paralelo: lo que no necesita PIN (librería PKCS#11, lectura del
+        # certificado y PBKDF2) empieza ya, mientras se construye la interfaz y se pide el PIN
+        crypto_manager = CryptoManager(multi_user=True)
+        crypto_manager.prefetch()
         
-        pin = ask_dnie_pin()
+        with metrics.span("gui.build"):
+            app = interfaz.BitwardenLikeApp(crypto_manager, defer_load=True)
+        app.withdraw()
+        
+        with metrics.span("gui.pin_dialog"):
+            pin = ask_dnie_pin(app)
         if not pin:
             print("❌ Autenticación cancelada por el usuario")
+            app.destroy()
             sys.exit(0)
         
-        # Crear y autenticar crypto manager
-        crypto_manager = CryptoManager(multi_user=True)
-        if not crypto_manager.initialize_with_pin(pin):
-            messagebox.showerror("Error de autenticación", "No se pudo autenticar con DNIe")
-            sys.exit(1)
+        # Login y descifrado del vault en segundo plano; la ventana ya está lista
+        result = {"ok": False}
         
-        print("✅ Autenticación DNIe exitosa")
-        print("✅ Acceso concedido - Abriendo interfaz...")
+        def on_unlocked(ok):
+            result["ok"] = ok
+            if not ok:
+                messagebox.showerror("Error de autenticación", "No se pudo autenticar con DNIe", parent=app)
+                app.destroy()
+                return
+            print("✅ Autenticación DNIe exitosa")
+            print("✅ Acceso concedido - Abriendo interfaz...")
+            print_trace()
         
-        # Pasar el crypto manager autenticado a la interfaz
-        app = interfaz.BitwardenLikeApp(crypto_manager)
+        app.deiconify()
+        app.unlock(pin, on_unlocked)
         app.mainloop()
+        if not result["ok"]:
+            sys.exit(1)
         
     except KeyboardInterrupt:
         print("\n🛑 Operación cancelada por el usuario")
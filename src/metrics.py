@@ -0,0 +1,255 @@
+# metrics.py - Instrumentación de las rutas críticas: spans de tiempo, contadores e histogramas
+#
+# Desactivada por defecto: span() devuelve un objeto vacío compartido y incr()/observe()
+# salen en la primera comprobación, así que el coste en el código instrumentado es
+# una llamada a función. Se activa con enable(), con "cli.py --trace" o con la
+# variable de entorno DNIE_TRACE (1 para solo memoria, o la ruta del archivo JSONL).
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_trace_file = None
+_lock = threading.Lock()
+_local = threading.local()
+
+_counters = {}
+_histograms = {}
+# Operación en curso (p. ej. un comando de la CLI) y la última terminada
+_current = None
+_last = None
+
+def default_trace_file():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    return os.path.join(parent_dir, ".Contraseñas", "trace.jsonl")
+
+class Histogram:
+    """Histograma con cubetas en potencias de 2 (valores en ms o bytes)"""
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        bucket = int(value).bit_length() if value > 0 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, pct):
+        """Aproximación: límite superior de la cubeta que contiene el percentil"""
+        if not self.count:
+            return None
+        target = self.count * pct / 100.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(float(2 ** bucket), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.total, "min": self.min, "max": self.max,
+                "mean": self.total / self.count if self.count else None,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99)}
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "start", "depth")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.depth = getattr(_local, "depth", 0)
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000.0
+        _local.depth = self.depth
+        _record(self.name, elapsed_ms, self.depth, self.start)
+        return False
+
+class _Operation:
+    """Operación de alto nivel cuyos spans se agrupan en el desglose por fases"""
+
+    def __init__(self, name):
+        self.id = f"{os.getpid()}-{time.time_ns()}"
+        self.name = name
+        self.start = time.perf_counter()
+        self.timestamp = time.time()
+        self.duration_ms = None
+        # nombre -> [llamadas, ms totales, profundidad mínima, primer inicio]
+        self.phases = {}
+
+    def add(self, name, elapsed_ms, depth, start):
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [1, elapsed_ms, depth, start]
+        else:
+            phase[0] += 1
+            phase[1] += elapsed_ms
+            phase[2] = min(phase[2], depth)
+            phase[3] = min(phase[3], start)
+
+    def breakdown(self) -> list:
+        """[(fase, profundidad, llamadas, ms)] en orden de primer inicio"""
+        phases = sorted(self.phases.items(), key=lambda item: item[1][3])
+        return [(name, depth, calls, total_ms) for name, (calls, total_ms, depth, _start) in phases]
+
+def _record(name, elapsed_ms, depth, start):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(elapsed_ms)
+        operation = _current
+        if operation is not None:
+            operation.add(name, elapsed_ms, depth, start)
+    if _trace_file:
+        _write({"type": "span", "op": operation.id if operation else None, "name": name,
+                "ms": round(elapsed_ms, 3), "depth": depth, "thread": threading.current_thread().name,
+                "ts": time.time()})
+
+def _write(record):
+    try:
+        with _lock:
+            with open(_trace_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+# --- API ---
+def enabled() -> bool:
+    return _enabled
+
+def enable(trace_file=None):
+    """Activar la instrumentación; con trace_file se añade cada evento como línea JSON"""
+    global _enabled, _trace_file
+    if trace_file:
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    _trace_file = trace_file
+    _enabled = True
+
+def disable():
+    global _enabled, _trace_file
+    _enabled = False
+    _trace_file = None
+
+def reset():
+    """Vaciar contadores, histogramas y operaciones"""
+    global _current, _last
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _current = None
+        _last = None
+
+def span(name):
+    """Context manager que mide un tramo: with metrics.span("pkcs11.login"): ..."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+def incr(name, value=1):
+    """Sumar a un contador"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def observe(name, value):
+    """Añadir un valor (p. ej. bytes) al histograma name"""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(value)
+
+def begin_operation(name):
+    """Empezar una operación; los spans siguientes (de cualquier hilo) se le asignan"""
+    global _current
+    if not _enabled:
+        return None
+    _current = _Operation(name)
+    return _current
+
+def end_operation():
+    """Cerrar la operación en curso y guardarla como la última (y en el JSONL)"""
+    global _current, _last
+    operation = _current
+    if operation is None:
+        return None
+    operation.duration_ms = (time.perf_counter() - operation.start) * 1000.0
+    with _lock:
+        _current = None
+        _last = operation
+        counters = dict(_counters)
+    if _trace_file:
+        _write({"type": "operation", "op": operation.id, "name": operation.name,
+                "ms": round(operation.duration_ms, 3), "ts": operation.timestamp,
+                "phases": [list(phase) for phase in operation.breakdown()], "counters": counters})
+    return operation
+
+def last_operation():
+    return _last
+
+def snapshot() -> dict:
+    """Copia de contadores e histogramas en memoria"""
+    with _lock:
+        return {"counters": dict(_counters),
+                "histograms": {name: h.to_dict() for name, h in _histograms.items()}}
+
+def format_breakdown(name, duration_ms, phases, counters=None) -> list:
+    """Líneas de texto con el desglose por fases de una operación"""
+    lines = [f"⏱️  {name}: {duration_ms:.1f} ms"]
+    for phase, depth, calls, total_ms in phases:
+        share = (total_ms / duration_ms * 100) if duration_ms else 0
+        label = "  " * depth + phase
+        lines.append(f"  {label:<30}{calls:>6}x{total_ms:>11.2f} ms{share:>7.1f}%")
+    for counter, value in sorted((counters or {}).items()):
+        lines.append(f"  # {counter}: {value}")
+    return lines
+
+def read_trace(trace_file=None) -> list:
+    """Operaciones registradas en un archivo JSONL (de la más antigua a la más reciente)"""
+    operations = []
+    try:
+        with open(trace_file or default_trace_file(), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("type") == "operation":
+                    operations.append(record)
+    except FileNotFoundError:
+        pass
+    return operations
+
+_env = os.environ.get("DNIE_TRACE")
+if _env:
+    enable(None if _env == "1" else _env)
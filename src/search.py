@@ -0,0 +1,249 @@
+# search.py - Índice de búsqueda incremental sobre las entradas del vault
+import bisect
+import re
+import unicodedata
+from collections import Counter
+
+# Niveles de relevancia (menor es mejor)
+PREFIX = 0       # el servicio o el usuario empiezan por la consulta
+WORD_START = 1   # alguna palabra de servicio, usuario o notas empieza por la consulta
+SUBSTRING = 2    # la consulta aparece en medio del servicio o del usuario
+FUZZY = 3        # comparte bastantes trigramas con servicio/usuario (erratas)
+
+# Las coincidencias aproximadas solo se buscan si hay pocas exactas
+FUZZY_MIN_OVERLAP = 0.6
+FUZZY_WHEN_FEWER = 20
+
+_SEPARATORS = " \t\n.,;:-_@/+()"
+_WORD_RE = re.compile("[^" + re.escape(_SEPARATORS) + "]+")
+
+def normalize(text):
+    """Minúsculas y sin tildes: 'Cañón' -> 'canon'"""
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _is_word_start(text, index):
+    return index == 0 or text[index - 1] in _SEPARATORS
+
+class SearchIndex:
+    """Índice de búsqueda sobre servicio, usuario y notas.
+
+    Servicio y usuario se indexan por trigramas (subcadenas); las palabras de
+    los tres campos, en un vocabulario ordenado para buscar por prefijo con
+    bisect. Las claves son arbitrarias (el nombre de la entrada en la
+    interfaz, la posición en la CLI). Si una consulta amplía la anterior, solo
+    se revisan los resultados anteriores.
+    """
+
+    def __init__(self):
+        # clave -> (servicio, usuario, notas) normalizados
+        self._docs = {}
+        self._trigram_postings = {}
+        self._word_postings = {}
+        # Palabras distintas, ordenadas
+        self._vocabulary = []
+        self._last_query = None
+        self._last_matches = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def clear(self):
+        self._docs.clear()
+        self._trigram_postings.clear()
+        self._word_postings.clear()
+        self._vocabulary = []
+        self._invalidate()
+
+    def build(self, items):
+        """Indexar de una vez un iterable de (clave, servicio, usuario, notas)"""
+        self.clear()
+        for key, service, username, notes in items:
+            self._index(key, service, username, notes, sort_vocabulary=False)
+        self._vocabulary = sorted(self._word_postings)
+
+    def add(self, key, service, username="", notes=""):
+        """Indexar (o reindexar) una entrada"""
+        if key in self._docs:
+            self.remove(key)
+        self._index(key, service, username, notes)
+        self._invalidate()
+
+    def remove(self, key):
+        fields = self._docs.pop(key, None)
+        if fields is None:
+            return
+        grams, words = self._terms(fields)
+        self._discard(self._trigram_postings, grams, key)
+        for word in self._discard(self._word_postings, words, key):
+            index = bisect.bisect_left(self._vocabulary, word)
+            if index < len(self._vocabulary) and self._vocabulary[index] == word:
+                del self._vocabulary[index]
+        self._invalidate()
+
+    @staticmethod
+    def _terms(fields):
+        service, username, notes = fields
+        grams = _trigrams(service) | _trigrams(username)
+        words = set(_WORD_RE.findall(service))
+        words.update(_WORD_RE.findall(username))
+        words.update(_WORD_RE.findall(notes))
+        return grams, words
+
+    def _index(self, key, service, username, notes, sort_vocabulary=True):
+        fields = (normalize(service), normalize(username), normalize(notes))
+        self._docs[key] = fields
+        grams, words = self._terms(fields)
+        postings = self._trigram_postings
+        for gram in grams:
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = {key}
+            else:
+                keys.add(key)
+        postings = self._word_postings
+        for word in words:
+            keys = postings.get(word)
+            if keys is None:
+                postings[word] = {key}
+                if sort_vocabulary:
+                    bisect.insort(self._vocabulary, word)
+            else:
+                keys.add(key)
+
+    @staticmethod
+    def _discard(postings, terms, key):
+        """Quitar key de las listas de terms; devuelve los términos que quedan vacíos"""
+        emptied = []
+        for term in terms:
+            keys = postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del postings[term]
+                    emptied.append(term)
+        return emptied
+
+    def _invalidate(self):
+        self._last_query = None
+        self._last_matches = None
+
+    def _prefix_candidates(self, word):
+        """Claves con alguna palabra que empieza por word"""
+        candidates = set()
+        vocabulary = self._vocabulary
+        index = bisect.bisect_left(vocabulary, word)
+        while index < len(vocabulary) and vocabulary[index].startswith(word):
+            candidates |= self._word_postings[vocabulary[index]]
+            index += 1
+        return candidates
+
+    def _word_candidates(self, query):
+        """Claves donde query puede aparecer al inicio de una palabra.
+
+        Se parte query con los mismos separadores que al indexar: si aparece
+        al inicio de una palabra, todas sus palabras salvo la última son
+        palabras completas del documento y la última es prefijo de alguna
+        ('github.com' -> 'github' y algo que empiece por 'com').
+        """
+        words = _WORD_RE.findall(query)
+        if not words:
+            return set()
+        candidates = self._prefix_candidates(words[-1])
+        for word in sorted(set(words[:-1]), key=lambda w: len(self._word_postings.get(w, ()))):
+            if not candidates:
+                break
+            candidates &= self._word_postings.get(word, set())
+        return candidates
+
+    def _substring_candidates(self, query):
+        """Claves cuyo servicio o usuario tienen todos los trigramas de query"""
+        candidates = None
+        for gram in sorted(_trigrams(query), key=lambda g: len(self._trigram_postings.get(g, ()))):
+            keys = self._trigram_postings.get(gram)
+            if not keys:
+                return set()
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                break
+        return candidates or set()
+
+    def _candidates(self, query):
+        if self._last_query and len(self._last_query) >= 3 and query.startswith(self._last_query):
+            # La consulta amplía la anterior: solo pueden coincidir los resultados previos
+            # (con menos de 3 caracteres no se buscan subcadenas, así que no valen)
+            return self._last_matches
+        candidates = self._word_candidates(query)
+        if len(query) >= 3:
+            candidates |= self._substring_candidates(query)
+        return candidates
+
+    @staticmethod
+    def _rank(query, fields):
+        """Nivel de la mejor coincidencia exacta de query, o None"""
+        best = None
+        for position, text in enumerate(fields):
+            index = text.find(query)
+            level = None
+            while index >= 0:
+                if index == 0 and position < 2:
+                    return PREFIX
+                if _is_word_start(text, index):
+                    level = WORD_START
+                    break
+                if position < 2:
+                    # En las notas solo cuentan los inicios de palabra
+                    level = SUBSTRING
+                index = text.find(query, index + 1)
+            if level is not None and (best is None or level < best):
+                best = level
+        return best
+
+    def search(self, query, limit=None, fuzzy=True) -> list:
+        """Claves que coinciden con query, de más a menos relevante"""
+        query = normalize(query).strip()
+        if not query:
+            return sorted(self._docs, key=lambda key: self._docs[key][0])
+
+        ranked = []
+        matches = set()
+        docs = self._docs
+        for key in self._candidates(query):
+            fields = docs[key]
+            level = self._rank(query, fields)
+            if level is not None:
+                matches.add(key)
+                ranked.append((level, 0.0, fields[0], key))
+        self._last_query = query
+        self._last_matches = matches
+
+        if fuzzy and len(query) >= 3 and len(matches) < FUZZY_WHEN_FEWER:
+            ranked.extend(self._fuzzy(query, matches))
+
+        ranked.sort(key=lambda item: (item[0], item[1], item[2]))
+        keys = [item[3] for item in ranked]
+        return keys[:limit] if limit else keys
+
+    def _fuzzy(self, query, exclude):
+        """Entradas con suficientes trigramas en común con servicio/usuario (erratas)"""
+        trigrams = _trigrams(query)
+        counts = Counter()
+        for gram in trigrams:
+            counts.update(self._trigram_postings.get(gram, ()))
+        needed = max(1, round(len(trigrams) * FUZZY_MIN_OVERLAP))
+        results = []
+        for key, shared in counts.items():
+            if shared >= needed and key not in exclude:
+                # Más trigramas compartidos primero
+                results.append((FUZZY, -shared / len(trigrams), self._docs[key][0], key))
+        return results
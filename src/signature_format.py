@@ -0,0 +1,190 @@
+# signature_format.py - Formatos de firma separada: JSON (legado) y binario compacto
+import base64
+import hashlib
+import json
+import os
+import struct
+
+# Extensiones por formato
+JSON_EXTENSION = ".firma.json"
+BINARY_EXTENSION = ".firma.sig"
+
+# Formato binario v1 (big-endian):
+#   magic "DNIESIG" + versión (1 byte)
+#   flags (1 byte)          bit 0: certificado embebido; si no, referencia por huella
+#   algoritmo hash (1 byte) ver HASH_ALGORITHMS
+#   digest                  u8 longitud + bytes
+#   timestamp ISO           u8 longitud + utf-8
+#   nombre de archivo       u16 longitud + utf-8
+#   firma                   u16 longitud + bytes
+#   certificado             u32 longitud + DER (embebido) | 32 bytes SHA-256 (referencia)
+MAGIC = b"DNIESIG"
+VERSION = 1
+FLAG_EMBEDDED_CERT = 0x01
+HASH_ALGORITHMS = {1: "sha256"}
+HASH_ALGORITHM_IDS = {name: code for code, name in HASH_ALGORITHMS.items()}
+
+# Directorio del almacén de certificados compartido, junto a las firmas
+DEFAULT_CERT_STORE_DIR = ".dnie_certs"
+
+class CertificateStore:
+    """Almacén de certificados DER indexados por huella SHA-256"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.der")
+
+    def put(self, certificate: bytes) -> str:
+        """Guardar el certificado (si no existía) y devolver su huella"""
+        fingerprint = hashlib.sha256(certificate).hexdigest()
+        path = self._path(fingerprint)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(certificate)
+            os.replace(tmp_path, path)
+        return fingerprint
+
+    def get(self, fingerprint: str) -> bytes:
+        try:
+            with open(self._path(fingerprint), 'rb') as f:
+                certificate = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Certificado {fingerprint[:16]}... no encontrado en {self.directory}")
+        if hashlib.sha256(certificate).hexdigest() != fingerprint:
+            raise ValueError(f"El certificado {fingerprint[:16]}... del almacén está corrupto")
+        return certificate
+
+def default_cert_store(signature_path) -> CertificateStore:
+    """Almacén por defecto: carpeta .dnie_certs junto al archivo de firma"""
+    directory = os.path.dirname(os.path.abspath(signature_path))
+    return CertificateStore(os.path.join(directory, DEFAULT_CERT_STORE_DIR))
+
+def signature_path_for(file_path, fmt="json"):
+    """Ruta de la firma separada de un archivo según el formato"""
+    return file_path + (BINARY_EXTENSION if fmt == "bin" else JSON_EXTENSION)
+
+def find_signature(file_path):
+    """Buscar la firma existente de un archivo (binaria primero) o None"""
+    for fmt in ("bin", "json"):
+        path = signature_path_for(file_path, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+def _encode_binary(package, cert_store):
+    signature = base64.b64decode(package['signature'])
+    certificate = base64.b64decode(package['certificate'])
+    algorithm = HASH_ALGORITHM_IDS[package.get('hash_algorithm', 'sha256')]
+    digest = bytes.fromhex(package['file_hash'])
+    timestamp = package.get('timestamp', '').encode('utf-8')
+    file_name = package.get('file_name', '').encode('utf-8')
+
+    if cert_store is None:
+        flags = FLAG_EMBEDDED_CERT
+        cert_field = struct.pack(">I", len(certificate)) + certificate
+    else:
+        flags = 0
+        cert_field = bytes.fromhex(cert_store.put(certificate))
+
+    return b"".join([
+        MAGIC, bytes([VERSION, flags, algorithm]),
+        struct.pack(">B", len(digest)), digest,
+        struct.pack(">B", len(timestamp)), timestamp,
+        struct.pack(">H", len(file_name)), file_name,
+        struct.pack(">H", len(signature)), signature,
+        cert_field,
+    ])
+
+def _check_algorithm(algorithm):
+    # La verificación solo calcula SHA-256: cualquier otro valor se rechaza
+    if algorithm != "sha256":
+        raise ValueError(f"Algoritmo de hash no soportado: {algorithm}")
+    return algorithm
+
+def _decode_binary(data):
+    if len(data) < len(MAGIC) + 3:
+        raise ValueError("Firma binaria truncada")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Versión de firma binaria no soportada: {data[len(MAGIC)]}")
+    pos = len(MAGIC) + 1
+    flags, algorithm = data[pos], data[pos + 1]
+    pos += 2
+
+    def take(length_format):
+        nonlocal pos
+        size = struct.calcsize(length_format)
+        if pos + size > len(data):
+            raise ValueError("Firma binaria truncada")
+        (length,) = struct.unpack_from(length_format, data, pos)
+        value = data[pos + size:pos + size + length]
+        if len(value) != length:
+            raise ValueError("Firma binaria truncada")
+        pos += size + length
+        return value
+
+    digest = take(">B")
+    timestamp = take(">B").decode('utf-8')
+    file_name = take(">H").decode('utf-8')
+    signature = take(">H")
+
+    package = {
+        'file_name': file_name,
+        'file_hash': digest.hex(),
+        'hash_algorithm': _check_algorithm(HASH_ALGORITHMS.get(algorithm)),
+        'signature': signature,
+        'timestamp': timestamp,
+        'certificate': None,
+        'certificate_fingerprint': None,
+    }
+    if flags & FLAG_EMBEDDED_CERT:
+        package['certificate'] = take(">I")
+        package['certificate_fingerprint'] = hashlib.sha256(package['certificate']).hexdigest()
+    else:
+        fingerprint = data[pos:pos + 32]
+        if len(fingerprint) != 32:
+            raise ValueError("Firma binaria truncada")
+        package['certificate_fingerprint'] = fingerprint.hex()
+    return package
+
+def save_signature_package(package: dict, signature_path: str, fmt: str = "json", cert_store=None):
+    """Guardar el paquete de firma devuelto por DNIeManager.sign_file.
+
+    fmt="json" escribe el formato legado; fmt="bin" el binario compacto, que
+    referencia el certificado en cert_store en lugar de embeberlo si se indica.
+    """
+    if fmt == "bin":
+        with open(signature_path, 'wb') as f:
+            f.write(_encode_binary(package, cert_store))
+    elif fmt == "json":
+        with open(signature_path, 'w') as f:
+            json.dump(package, f, indent=2, ensure_ascii=False)
+    else:
+        raise ValueError(f"Formato de firma desconocido: {fmt}")
+
+def load_signature_package(signature_path: str) -> dict:
+    """Cargar una firma detectando el formato automáticamente.
+
+    Devuelve file_hash (hex), hash_algorithm, signature (bytes), certificate
+    (bytes o None si está referenciado) y certificate_fingerprint.
+    """
+    with open(signature_path, 'rb') as f:
+        data = f.read()
+
+    if data.startswith(MAGIC):
+        return _decode_binary(data)
+
+    package = json.loads(data)
+    certificate = base64.b64decode(package['certificate'])
+    return {
+        'file_name': package.get('file_name'),
+        'file_hash': package['file_hash'],
+        'hash_algorithm': _check_algorithm(package.get('hash_algorithm', 'sha256')),
+        'signature': base64.b64decode(package['signature']),
+        'timestamp': package.get('timestamp'),
+        'certificate': certificate,
+        'certificate_fingerprint': hashlib.sha256(certificate).hexdigest(),
+    }
@@ -0,0 +1,111 @@
+# signing_scheduler.py - Planificador de firmas con una cola por DNIe/lector
+import queue
+import threading
+from concurrent.futures import Future
+from dnie import DNIeManager, is_pin_error, listar_tokens
+
+class _TokenWorker:
+    """Hilo que firma en serie los trabajos de un único token"""
+
+    def __init__(self, serial, pin, digest_cache, lib_path, lock):
+        self.serial = serial
+        self._lock = lock
+        self.queue = queue.Queue()
+        self.pending = 0
+        # Error de PIN del primer login: a partir de ahí no se vuelve a tocar la tarjeta
+        self.failed = None
+        self.dnie = DNIeManager(digest_cache=digest_cache, slot_serial=serial)
+        if lib_path:
+            self.dnie.lib_path = lib_path
+        self._pin = pin
+        self.thread = threading.Thread(target=self._run, name=f"dnie-signer-{serial}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            file_path, future = job
+            if future.set_running_or_notify_cancel():
+                if self.failed is not None:
+                    reason = str(self.failed).removeprefix("❌ ")
+                    future.set_exception(Exception(f"❌ No se firma con el DNIe {self.serial}: {reason}"))
+                else:
+                    try:
+                        future.set_result(self.dnie.sign_file(file_path, self._pin))
+                    except Exception as e:
+                        if is_pin_error(e):
+                            # Cada archivo volvería a hacer login con el mismo PIN
+                            with self._lock:
+                                self.failed = e
+                        future.set_exception(e)
+            with self._lock:
+                self.pending -= 1
+        self.dnie.close()
+
+class SigningScheduler:
+    """Reparte solicitudes de firma entre los tokens conectados.
+
+    Cada token tiene su propia cola y su hilo: las firmas de un mismo token se
+    hacen en serie (la tarjeta solo atiende una operación a la vez) y las de
+    tokens distintos en paralelo, así que el rendimiento escala con el número
+    de tarjetas. pins es un dict serial -> PIN o una función pin(serial).
+    Si el login de un token falla por el PIN, el resto de sus trabajos fallan
+    sin volver a intentarlo, para no bloquear el DNIe.
+    """
+
+    def __init__(self, pins, serials=None, digest_cache=None, lib_path=None):
+        self._pin_for = pins if callable(pins) else pins.get
+        self._digest_cache = digest_cache
+        self._lib_path = lib_path
+        self._lock = threading.Lock()
+        self._workers = {}
+        if serials is None:
+            serials = [info["serial"] for info in listar_tokens(lib_path, with_certificate=False)]
+        for serial in serials:
+            self._add_worker(serial)
+
+    def _add_worker(self, serial):
+        pin = self._pin_for(serial)
+        if pin is None:
+            raise ValueError(f"No hay PIN para el token {serial}")
+        self._workers[serial] = _TokenWorker(serial, pin, self._digest_cache, self._lib_path, self._lock)
+
+    @property
+    def tokens(self) -> list:
+        return list(self._workers)
+
+    def submit(self, file_path, serial=None) -> Future:
+        """Encolar la firma de un archivo; sin serial va al token menos cargado"""
+        with self._lock:
+            if not self._workers:
+                raise Exception("❌ No hay ningún DNIe disponible para firmar")
+            if serial is None:
+                # Los tokens con el PIN rechazado solo reciben trabajos si no queda otro
+                workers = [w for w in self._workers.values() if w.failed is None] or list(self._workers.values())
+                worker = min(workers, key=lambda w: w.pending)
+            else:
+                worker = self._workers[serial]
+            worker.pending += 1
+            future = Future()
+            worker.queue.put((file_path, future))
+        return future
+
+    def map(self, file_paths):
+        """Firmar varios archivos; devuelve [(ruta, Future)] en el mismo orden"""
+        return [(file_path, self.submit(file_path)) for file_path in file_paths]
+
+    def shutdown(self, wait=True):
+        """Terminar los hilos tras vaciar sus colas y cerrar las sesiones"""
+        for worker in self._workers.values():
+            worker.queue.put(None)
+        if wait:
+            for worker in self._workers.values():
+                worker.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,120 @@
+# slot_watcher.py - Detección de inserción/retirada del DNIe por eventos de lector
+import threading
+import dnie
+
+INSERT = "insert"
+REMOVE = "remove"
+
+class SlotWatcher:
+    """Vigila los lectores en un hilo de fondo y publica eventos de tarjeta.
+
+    Usa C_WaitForSlotEvent (bloqueante, sin consumo de CPU) y, si la librería
+    no lo soporta, consulta los slots cada poll_interval segundos. Cada
+    suscriptor recibe callback(evento, slot_id) con evento INSERT o REMOVE,
+    siempre desde el hilo del vigilante.
+    """
+
+    def __init__(self, lib_path=None, poll_interval=2.0):
+        self.lib_path = lib_path
+        self.poll_interval = poll_interval
+        self._slots = set()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    # --- Estado ---
+    @property
+    def slots(self) -> set:
+        with self._lock:
+            return set(self._slots)
+
+    @property
+    def present(self) -> bool:
+        with self._lock:
+            return bool(self._slots)
+
+    def subscribe(self, callback):
+        """Registrar callback(evento, slot_id); devuelve la función para darse de baja"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return unsubscribe
+
+    def wait_for_card(self, timeout=None) -> bool:
+        """Esperar (sin sondear) a que haya un DNIe insertado"""
+        with self._changed:
+            return self._changed.wait_for(lambda: bool(self._slots), timeout)
+
+    # --- Ciclo de vida ---
+    def start(self):
+        """Hacer la primera lectura de slots y lanzar el hilo vigilante"""
+        if self._thread is not None:
+            return self
+        self._refresh()
+        self._thread = threading.Thread(target=self._run, name="dnie-slot-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dejar de publicar eventos (un C_WaitForSlotEvent en curso no se interrumpe)"""
+        self._stop.set()
+
+    def _run(self):
+        use_events = True
+        while not self._stop.is_set():
+            if use_events:
+                try:
+                    dnie.esperar_evento_slot(self.lib_path)
+                except Exception:
+                    # Sin soporte de eventos (o error del lector): sondeo de baja frecuencia
+                    use_events = False
+                    continue
+            elif self._stop.wait(self.poll_interval):
+                break
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            current = dnie.listar_slots_con_token(self.lib_path)
+            self.error = None
+        except Exception as e:
+            current = set()
+            self.error = e
+
+        with self._changed:
+            inserted = current - self._slots
+            removed = self._slots - current
+            self._slots = current
+            callbacks = list(self._callbacks)
+            if inserted or removed:
+                self._changed.notify_all()
+
+        for slot_id in removed:
+            # Las sesiones del DNIe retirado ya no son válidas
+            dnie.invalidar_sesiones_slot(slot_id)
+        for event, slot_ids in ((REMOVE, removed), (INSERT, inserted)):
+            for slot_id in slot_ids:
+                for callback in callbacks:
+                    try:
+                        callback(event, slot_id)
+                    except Exception as e:
+                        print(f"⚠️  Error en suscriptor de eventos DNIe: {e}")
+
+# Vigilante compartido por todo el proceso
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_watcher() -> SlotWatcher:
+    """Devolver el vigilante del proceso (arrancándolo la primera vez)"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = SlotWatcher().start()
+        return _watcher
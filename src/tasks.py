@@ -0,0 +1,194 @@
+# tasks.py - Ejecutor de tareas en segundo plano integrado con el bucle de Tk
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Cada cuánto se recogen resultados y progreso en el hilo de la interfaz
+POLL_MS = 50
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+class TaskCancelled(BaseException):
+    """La tarea se ha cancelado.
+
+    Como asyncio.CancelledError, hereda de BaseException para que los
+    "except Exception" del código de firma/verificación no la oculten.
+    """
+
+class Task:
+    """Operación enviada al ejecutor; la función recibe la tarea para informar del progreso"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, fn, lane, cancellable, on_done, on_error):
+        self.id = next(self._ids)
+        self.name = name
+        self.lane = lane
+        self.cancellable = cancellable
+        self.status = QUEUED
+        # Fracción completada (0..1) o None si la operación no informa de progreso
+        self.progress = None
+        self.submitted = time.monotonic()
+        self._fn = fn
+        self._on_done = on_done
+        self._on_error = on_error
+        self._cancel = threading.Event()
+        self._events = None
+        self._last_percent = -1
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Pedir la cancelación; la tarea se detiene en su siguiente report()/check()"""
+        if self.cancellable and self.status in (QUEUED, RUNNING):
+            self._cancel.set()
+            return True
+        return False
+
+    def check(self):
+        """Lanzar TaskCancelled si se ha pedido cancelar (llamar desde el hilo de trabajo)"""
+        if self._cancel.is_set():
+            raise TaskCancelled()
+
+    def report(self, done, total):
+        """Informar del progreso (bytes procesados, total). Sirve como callback de progreso"""
+        self.check()
+        if total:
+            percent = min(100, done * 100 // total)
+            # Solo se avisa a la interfaz cuando cambia el porcentaje
+            if percent != self._last_percent:
+                self._last_percent = percent
+                self._events.put((self, "progress", percent / 100.0))
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.name!r}, {self.status})"
+
+class TkExecutor:
+    """Ejecuta funciones bloqueantes fuera del hilo de Tk.
+
+    Cada "carril" tiene un único hilo, así que las tareas de un mismo carril
+    (p. ej. todas las que usan el DNIe) se ejecutan en orden y sin pisarse,
+    mientras que las de carriles distintos van en paralelo. Resultados,
+    errores y progreso se entregan en el hilo de la interfaz con after().
+    """
+
+    def __init__(self, root, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._lanes = {}
+        self._tasks = []
+        self._events = queue.Queue()
+        self._listeners = []
+        self._poll_job = None
+        self._closed = False
+
+    # --- API ---
+    def submit(self, name, fn, on_done=None, on_error=None, lane="default", cancellable=True):
+        """Ejecutar fn(task) en segundo plano.
+
+        on_done(resultado) / on_error(excepción) se llaman en el hilo de la
+        interfaz; una tarea cancelada no llama a ninguno de los dos.
+        """
+        if self._closed:
+            raise Exception("❌ El ejecutor de tareas está cerrado")
+        task = Task(name, fn, lane, cancellable, on_done, on_error)
+        task._events = self._events
+        self._tasks.append(task)
+        worker = self._lanes.get(lane)
+        if worker is None:
+            worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"tasks-{lane}")
+            self._lanes[lane] = worker
+        worker.submit(self._run, task)
+        self._notify()
+        self._schedule_poll()
+        return task
+
+    @property
+    def active(self):
+        """Tareas en cola o en ejecución, por orden de envío"""
+        return list(self._tasks)
+
+    def subscribe(self, callback):
+        """callback(tareas_activas) en el hilo de la interfaz cada vez que algo cambia"""
+        self._listeners.append(callback)
+
+    def cancel_all(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def shutdown(self, wait=True):
+        """Cancelar lo cancelable y esperar al resto (p. ej. un guardado del vault en curso)"""
+        self._closed = True
+        self.cancel_all()
+        for worker in self._lanes.values():
+            worker.shutdown(wait=wait)
+        if self._poll_job is not None:
+            try:
+                self.root.after_cancel(self._poll_job)
+            except Exception:
+                pass
+            self._poll_job = None
+
+    # --- Hilo de trabajo ---
+    def _run(self, task):
+        if task.cancelled:
+            self._events.put((task, CANCELLED, None))
+            return
+        self._events.put((task, RUNNING, None))
+        try:
+            result = task._fn(task)
+        except TaskCancelled:
+            self._events.put((task, CANCELLED, None))
+        except BaseException as e:
+            self._events.put((task, FAILED, e))
+        else:
+            self._events.put((task, DONE, result))
+
+    # --- Hilo de la interfaz ---
+    def _schedule_poll(self):
+        if self._poll_job is None and not self._closed:
+            self._poll_job = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        changed = False
+        while True:
+            try:
+                task, kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if kind == "progress":
+                task.progress = value
+                continue
+            task.status = kind
+            if kind == RUNNING:
+                continue
+            self._tasks.remove(task)
+            try:
+                if kind == DONE and task._on_done:
+                    task._on_done(value)
+                elif kind == FAILED and task._on_error:
+                    task._on_error(value)
+                elif kind == FAILED:
+                    print(f"❌ Error en '{task.name}': {value}")
+            except Exception as e:
+                # Un fallo en un callback no debe parar la entrega del resto
+                print(f"❌ Error al terminar '{task.name}': {e}")
+        if changed:
+            self._notify()
+        if self._tasks:
+            self._schedule_poll()
+
+    def _notify(self):
+        tasks = self.active
+        for callback in list(self._listeners):
+            callback(tasks)
@@ -0,0 +1,151 @@
+# vault_model.py - Modelo compartido de entradas con notificación de cambios
+import bisect
+
+# Eventos que reciben los observadores: callback(evento, nombre, nombre_anterior)
+ADDED = "added"
+UPDATED = "updated"
+REMOVED = "removed"
+RENAMED = "renamed"
+RESET = "reset"
+
+class VaultModel:
+    """Entradas (Entry) del vault por servicio, con los nombres siempre ordenados.
+
+    Cada cambio avisa a los observadores con el evento concreto (la vista solo
+    toca las filas afectadas) y queda apuntado como cambio pendiente de guardar
+    (la persistencia recibe solo el delta).
+    """
+
+    def __init__(self, entries=None):
+        self._entries = {}
+        self._names = []
+        self._listeners = []
+        # Pendiente de guardar: nombre -> Entry nueva / nombres borrados
+        self._dirty = {}
+        self._deleted = set()
+        if entries:
+            self.reset(entries)
+
+    # --- Consulta ---
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __getitem__(self, name):
+        return self._entries[name]
+
+    def get(self, name, default=None):
+        return self._entries.get(name, default)
+
+    def items(self):
+        return self._entries.items()
+
+    @property
+    def names(self):
+        """Nombres ordenados (no modificar)"""
+        return self._names
+
+    def index_of(self, name):
+        """Posición de name en el orden, o None si no existe"""
+        index = bisect.bisect_left(self._names, name)
+        if index < len(self._names) and self._names[index] == name:
+            return index
+        return None
+
+    # --- Observadores ---
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event, name=None, old_name=None):
+        for callback in list(self._listeners):
+            callback(event, name, old_name)
+
+    # --- Cambios ---
+    def reset(self, entries):
+        """Sustituir todas las entradas (carga del vault); no deja cambios pendientes.
+
+        Se guardan las mismas Entry que ha cargado CryptoManager, sin copiarlas.
+        """
+        self._entries = {entry.service: entry for entry in entries}
+        self._names = sorted(self._entries)
+        self._dirty.clear()
+        self._deleted.clear()
+        self._notify(RESET)
+
+    def add_saved(self, entries):
+        """Añadir entradas que ya están escritas en el vault (importación).
+
+        No quedan como cambios pendientes y se avisa con un único RESET en lugar
+        de un evento por entrada. Los cambios pendientes que hubiera se conservan.
+        """
+        entries = [entry for entry in entries if entry.service not in self._entries]
+        if not entries:
+            return
+        for entry in entries:
+            self._entries[entry.service] = entry
+            self._deleted.discard(entry.service)
+        self._names = sorted(self._entries)
+        self._notify(RESET)
+
+    def put(self, entry, old_name=None):
+        """Añadir o actualizar entry; con old_name distinto, renombrar esa entrada"""
+        name = entry.service
+        if old_name is not None and old_name != name and old_name in self._entries:
+            replaced = name in self._entries
+            self._discard(old_name)
+            if replaced:
+                # El nombre nuevo ya existía: se sobrescribe (como antes en la interfaz)
+                self._discard(name)
+            self._insert(entry)
+            self._notify(RENAMED, name, old_name)
+        elif name in self._entries:
+            self._entries[name] = entry
+            self._dirty[name] = entry
+            self._notify(UPDATED, name)
+        else:
+            self._insert(entry)
+            self._notify(ADDED, name)
+
+    def remove(self, name):
+        if name not in self._entries:
+            return False
+        self._discard(name)
+        self._notify(REMOVED, name)
+        return True
+
+    def _insert(self, entry):
+        name = entry.service
+        self._entries[name] = entry
+        bisect.insort(self._names, name)
+        self._dirty[name] = entry
+        self._deleted.discard(name)
+
+    def _discard(self, name):
+        del self._entries[name]
+        del self._names[bisect.bisect_left(self._names, name)]
+        self._dirty.pop(name, None)
+        self._deleted.add(name)
+
+    # --- Persistencia ---
+    def has_changes(self):
+        return bool(self._dirty or self._deleted)
+
+    def pending_changes(self):
+        """(nombre -> Entry a escribir, nombres a borrar) desde el último guardado"""
+        return dict(self._dirty), set(self._deleted)
+
+    def mark_saved(self, upserts, deletions):
+        """Olvidar los cambios ya guardados (salvo los que hayan vuelto a cambiar)"""
+        for name, entry in upserts.items():
+            if self._dirty.get(name) is entry:
+                del self._dirty[name]
+        self._deleted -= {name for name in deletions if name not in self._entries}
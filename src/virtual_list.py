@@ -0,0 +1,213 @@
+# virtual_list.py - Lista virtualizada de entradas con reutilización de filas (CustomTkinter)
+import math
+import tkinter as tk
+import customtkinter as ctk
+
+def _bind_tree(widget, sequence, callback):
+    """Enlazar un evento en un widget y todos sus descendientes (los CTk son compuestos)"""
+    tk.Misc.bind(widget, sequence, callback, "+")
+    for child in widget.winfo_children():
+        _bind_tree(child, sequence, callback)
+
+class _Row:
+    """Fila reutilizable: tarjeta con nombre, usuario y botón de copiar"""
+
+    def __init__(self, parent, height, on_select, on_copy):
+        self.name = None
+        self.username = None
+        # Contenedor de alto fijo: CTk no permite height en place()
+        self.frame = ctk.CTkFrame(parent, fg_color="transparent", height=height)
+        self.frame.pack_propagate(False)
+
+        self.card = ctk.CTkFrame(self.frame, corner_radius=10, fg_color="white")
+        self.card.pack(fill="both", expand=True, padx=6, pady=6)
+
+        left = ctk.CTkFrame(self.card, fg_color="transparent")
+        left.pack(side="left", fill="both", expand=True, padx=10, pady=8)
+        self.lbl_name = ctk.CTkLabel(left, text="", anchor="w", font=ctk.CTkFont(size=12, weight="bold"))
+        self.lbl_name.pack(anchor="w")
+        self.lbl_user = ctk.CTkLabel(left, text="", anchor="w", text_color="#475569")
+        self.lbl_user.pack(anchor="w")
+
+        right = ctk.CTkFrame(self.card, fg_color="transparent")
+        right.pack(side="right", padx=10, pady=8)
+        btn_copy = ctk.CTkButton(right, text="📋", width=40, height=36, fg_color="#60a5fa", hover_color="#3b82f6",
+                                 corner_radius=8, command=lambda: self.name is not None and on_copy(self.name))
+        btn_copy.pack()
+
+        # El clic en la tarjeta (no en el botón) selecciona la entrada actual de la fila
+        select = lambda e: self.name is not None and on_select(self.name)
+        tk.Misc.bind(self.card, "<Button-1>", select, "+")
+        for child in self.card.winfo_children():
+            if child is not right:
+                _bind_tree(child, "<Button-1>", select)
+
+    def show(self, name, username, y):
+        # Solo se reconfiguran las etiquetas si la fila pasa a mostrar otra entrada
+        if name != self.name or username != self.username:
+            self.name = name
+            self.username = username
+            self.lbl_name.configure(text=name)
+            self.lbl_user.configure(text=username)
+        self.frame.place(x=0, y=y, relwidth=1.0)
+
+    def hide(self):
+        self.name = None
+        self.username = None
+        self.frame.place_forget()
+
+class VirtualList(ctk.CTkFrame):
+    """Lista que solo crea las filas visibles (más overscan) y las reutiliza.
+
+    Los elementos son tuplas (nombre, usuario). Al desplazar o filtrar solo se
+    vuelven a enlazar datos en las filas existentes; el número de widgets no
+    depende del número de entradas.
+    """
+
+    def __init__(self, master, row_height=82, overscan=2, on_select=None, on_copy=None,
+                 empty_text="", **kwargs):
+        kwargs.setdefault("fg_color", "transparent")
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.overscan = overscan
+        self._on_select = on_select or (lambda name: None)
+        self._on_copy = on_copy or (lambda name: None)
+        self._items = []
+        self._rows = []
+        self._offset = 0
+        self._viewport_height = 0
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.empty_label = ctk.CTkLabel(self.viewport, text=empty_text, text_color="#64748b")
+
+        tk.Misc.bind(self.viewport, "<Configure>", self._on_resize, "+")
+        self._bind_wheel(self.viewport)
+
+    # --- Datos ---
+    def set_items(self, items, keep_position=False):
+        """Mostrar otra lista de (nombre, usuario); sin keep_position vuelve al principio"""
+        self._items = items
+        if not keep_position:
+            self._offset = 0
+        self._render()
+
+    @property
+    def items(self):
+        """Elementos mostrados (no modificar; usar los métodos *_item)"""
+        return self._items
+
+    def insert_item(self, index, item):
+        self._items.insert(index, item)
+        self._patch(index)
+
+    def remove_item(self, index):
+        del self._items[index]
+        self._patch(index)
+
+    def replace_item(self, index, item):
+        self._items[index] = item
+        self._patch(index)
+
+    def _patch(self, index):
+        # Un cambio por debajo de las filas visibles solo mueve la barra de desplazamiento
+        last_visible = self._offset // self.row_height + len(self._rows)
+        if index < last_visible or self._offset > self._max_offset():
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def scroll_to(self, name):
+        """Desplazar lo justo para que la entrada name quede visible"""
+        for index, (item_name, _user) in enumerate(self._items):
+            if item_name == name:
+                top = index * self.row_height
+                if top < self._offset:
+                    self._offset = top
+                elif top + self.row_height > self._offset + self._viewport_height:
+                    self._offset = top + self.row_height - self._viewport_height
+                self._render()
+                return
+
+    # --- Geometría ---
+    def _content_height(self):
+        return len(self._items) * self.row_height
+
+    def _max_offset(self):
+        return max(0, self._content_height() - self._viewport_height)
+
+    def _on_resize(self, event):
+        # Las coordenadas de place() y los altos de CTk van escalados; el evento, en píxeles reales
+        height = int(event.height / self._get_widget_scaling())
+        if height == self._viewport_height:
+            return
+        self._viewport_height = height
+        needed = math.ceil(height / self.row_height) + 1 + self.overscan
+        while len(self._rows) < needed:
+            row = _Row(self.viewport, self.row_height, self._on_select, self._on_copy)
+            self._bind_wheel(row.frame)
+            self._rows.append(row)
+        self._render()
+
+    def _render(self):
+        self._offset = min(max(0, self._offset), self._max_offset())
+        first = self._offset // self.row_height
+        shift = self._offset - first * self.row_height
+
+        for i, row in enumerate(self._rows):
+            index = first + i
+            if index < len(self._items):
+                name, username = self._items[index]
+                row.show(name, username, i * self.row_height - shift)
+            else:
+                row.hide()
+
+        if self._items:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(relx=0.5, y=12, anchor="n")
+
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = self._content_height()
+        if total <= self._viewport_height or not total:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._offset / total, (self._offset + self._viewport_height) / total)
+
+    # --- Desplazamiento ---
+    def _scroll_by(self, pixels):
+        offset = min(max(0, self._offset + pixels), self._max_offset())
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._offset = int(float(value) * self._content_height())
+            self._render()
+        elif action == "scroll":
+            step = self._viewport_height if unit == "pages" else self.row_height
+            self._scroll_by(int(float(value) * step))
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        elif abs(event.delta) >= 120:  # Windows: múltiplos de 120
+            steps = -int(event.delta / 120)
+        else:  # macOS: deltas pequeños
+            steps = -event.delta
+        self._scroll_by(steps * self.row_height // 2)
+        return "break"
+
+    def _bind_wheel(self, widget):
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            _bind_tree(widget, sequence, self._on_wheel)
@@ -0,0 +1,37 @@
+# conftest.py - Configuración común de los tests: src en sys.path y DNIe simulado
+import os
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """Fábrica de backends simulados (DNIE_BACKEND=fake) con claves efímeras.
+
+    make(cards=1, latency_ms=0) deja el proceso sin backends ni sesiones de
+    otros tests y devuelve el FakeTokenBackend que usará DNIeManager.
+    """
+    pytest.importorskip("cryptography")
+    import dnie
+
+    def reset():
+        with dnie._POOL_LOCK:
+            dnie._BACKEND_CACHE.pop("fake", None)
+            dnie._SESSION_POOL.clear()
+            dnie._OPENING_LOCKS.clear()
+
+    def make(cards=1, latency_ms=0):
+        monkeypatch.setenv("DNIE_BACKEND", "fake")
+        monkeypatch.setenv("DNIE_FAKE_KEY_DIR", "")
+        monkeypatch.setenv("DNIE_FAKE_TOKENS", str(cards))
+        monkeypatch.setenv("DNIE_FAKE_LATENCY_MS", str(latency_ms))
+        monkeypatch.delenv("DNIE_FAKE_PIN", raising=False)
+        monkeypatch.delenv("DNIE_FAKE_RETRIES", raising=False)
+        reset()
+        return dnie.get_backend()
+
+    yield make
+    reset()
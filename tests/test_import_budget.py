@@ -0,0 +1,30 @@
+# test_import_budget.py - Dependencias pesadas que no deben importarse al cargar cada módulo
+#
+# El tiempo de importación frente a su presupuesto lo comprueba src/bench_import.py:
+# medido en milisegundos de reloj, en un test fallaría al azar en máquinas cargadas.
+import os
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+import bench_import
+
+def _local_module(name):
+    return os.path.exists(os.path.join(SRC_DIR, name.split(".")[0] + ".py"))
+
+@pytest.mark.parametrize("module", list(bench_import.BUDGETS))
+def test_no_eager_imports(module):
+    _budget_ms, forbidden = bench_import.BUDGETS[module]
+    elapsed, info = bench_import.import_profile(module)
+    if elapsed is None:
+        # Solo se omite si falta una dependencia externa no instalada; un error
+        # del propio código (o de un módulo de src) hace fallar el test
+        missing = info.split("No module named ", 1)[1].strip("'\"") if "No module named " in info else None
+        if missing and not _local_module(missing):
+            pytest.skip(f"{module}: falta la dependencia {missing}")
+        pytest.fail(f"{module} no se pudo importar: {info}")
+
+    eager = sorted(name for name in forbidden if name in info)
+    assert not eager, f"{module} importa al cargarse: {', '.join(eager)}"
@@ -0,0 +1,67 @@
+# test_session_pool.py - Pool de sesiones PKCS#11 compartido entre DNIeManager (DNIe simulado)
+import pytest
+
+PIN = "1234"
+
+def test_managers_share_one_login(fake_backend):
+    import dnie
+    backend = fake_backend()
+    opened = []
+    open_session = backend.open_session
+    backend.open_session = lambda slot, pin: opened.append(pin) or open_session(slot, pin)
+
+    first = dnie.DNIeManager()
+    second = dnie.DNIeManager()
+    first.authenticate(PIN)
+    second.authenticate(PIN)
+
+    assert len(opened) == 1
+    assert first.session is second.session
+    pooled = next(iter(dnie._SESSION_POOL.values()))
+    assert pooled.refcount == 2
+
+    first.close()
+    assert pooled.refcount == 1 and second.session.open
+    second.close()
+    assert not dnie._SESSION_POOL
+    assert not pooled.session.open
+
+def test_wrong_pin_rejected_by_pooled_session(fake_backend):
+    import dnie
+    backend = fake_backend()
+    card = backend.cards[0]
+    owner = dnie.DNIeManager()
+    owner.authenticate(PIN)
+
+    intruder = dnie.DNIeManager()
+    with pytest.raises(Exception, match="PIN incorrecto"):
+        intruder.authenticate("0000")
+
+    # El PIN se compara con el de la sesión abierta: la tarjeta no gasta intentos
+    assert card.retries_left == card.max_retries
+    assert intruder.session is None
+    assert next(iter(dnie._SESSION_POOL.values())).refcount == 1
+    owner.close()
+    assert not dnie._SESSION_POOL
+
+def test_wrong_pin_leaves_pool_empty(fake_backend):
+    import dnie
+    backend = fake_backend()
+    with pytest.raises(Exception, match="PIN incorrecto"):
+        dnie.DNIeManager().authenticate("0000")
+    assert not dnie._SESSION_POOL
+    assert backend.cards[0].retries_left == backend.cards[0].max_retries - 1
+
+def test_failed_challenge_releases_session(fake_backend):
+    import dnie
+    backend = fake_backend()
+
+    def broken_sign(session, key, data):
+        raise Exception("CKR_DEVICE_ERROR")
+    backend.sign = broken_sign
+
+    manager = dnie.DNIeManager()
+    with pytest.raises(Exception, match="CKR_DEVICE_ERROR"):
+        manager.authenticate(PIN)
+    assert manager.session is None
+    assert not dnie._SESSION_POOL
@@ -0,0 +1,71 @@
+# test_signatures.py - Firma y verificación con los formatos JSON y binario (DNIe simulado)
+import os
+import pytest
+
+PIN = "1234"
+# (formato, certificado en el almacén en lugar de embebido)
+FORMATS = [("json", False), ("bin", False), ("bin", True)]
+
+@pytest.fixture
+def signer(fake_backend, tmp_path):
+    import cert_cache
+    import dnie
+    from digest_cache import DigestCache
+    fake_backend()
+    manager = dnie.DNIeManager(digest_cache=DigestCache(str(tmp_path / "digests.json")),
+                               certificate_cache=cert_cache.CertificateCache())
+    manager.authenticate(PIN)
+    yield manager
+    manager.close()
+
+def _sign(manager, path, fmt, referenced):
+    import signature_format
+    signature_path = signature_format.signature_path_for(str(path), fmt)
+    store = signature_format.default_cert_store(signature_path) if referenced else None
+    package = manager.sign_file(str(path), PIN)
+    signature_format.save_signature_package(package, signature_path, fmt, cert_store=store)
+    return package, signature_path
+
+def _old_file(path, data):
+    """Archivo con mtime de hace una hora (fuera de la ventana en la que la caché de digests no guarda)"""
+    path.write_bytes(data)
+    past = os.stat(path).st_mtime_ns - 3600 * 1_000_000_000
+    os.utime(path, ns=(past, past))
+    return path
+
+@pytest.mark.parametrize("fmt, referenced", FORMATS)
+def test_signature_round_trip(signer, tmp_path, fmt, referenced):
+    import signature_format
+    path = _old_file(tmp_path / "contrato.pdf", b"%PDF-1.7\n" + os.urandom(4096))
+    package, signature_path = _sign(signer, path, fmt, referenced)
+
+    loaded = signature_format.load_signature_package(signature_path)
+    assert loaded["file_hash"] == package["file_hash"]
+    assert loaded["hash_algorithm"] == "sha256"
+    assert (loaded["certificate"] is None) == referenced
+    assert signer.verify_signature(str(path), signature_path)
+
+@pytest.mark.parametrize("fmt, referenced", FORMATS)
+def test_verify_detects_modified_file(signer, tmp_path, fmt, referenced):
+    path = _old_file(tmp_path / "contrato.pdf", b"importe: 1000 EUR\n")
+    _package, signature_path = _sign(signer, path, fmt, referenced)
+
+    _old_file(path, b"importe: 9000 EUR\n")
+    assert not signer.verify_signature(str(path), signature_path)
+
+def test_verify_rehashes_when_size_and_mtime_are_kept(signer, tmp_path):
+    path = _old_file(tmp_path / "contrato.pdf", b"importe: 1000 EUR\n")
+    _package, signature_path = _sign(signer, path, "bin", False)
+    st = os.stat(path)
+    assert signer.digest_cache.get(str(path), "sha256", st)
+
+    # Mismo tamaño y misma fecha de modificación: la caché de digests no lo distingue
+    path.write_bytes(b"importe: 9000 EUR\n")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert not signer.verify_signature(str(path), signature_path)
+
+def test_verify_rejects_signature_of_other_file(signer, tmp_path):
+    original = _old_file(tmp_path / "a.txt", b"uno\n")
+    other = _old_file(tmp_path / "b.txt", b"dos\n")
+    _package, signature_path = _sign(signer, original, "json", False)
+    assert not signer.verify_signature(str(other), signature_path)
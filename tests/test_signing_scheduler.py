@@ -0,0 +1,73 @@
+# test_signing_scheduler.py - Reparto de firmas entre DNIe y bloqueo por PIN (DNIe simulado)
+import base64
+import pytest
+
+PIN = "1234"
+
+@pytest.fixture
+def files(tmp_path):
+    def make(count):
+        paths = []
+        for i in range(count):
+            path = tmp_path / f"documento{i}.txt"
+            path.write_bytes(f"contenido {i}\n".encode() * 100)
+            paths.append(str(path))
+        return paths
+    return make
+
+def _certificate(package):
+    return base64.b64decode(package["certificate"])
+
+def test_submit_with_serial_uses_that_token(fake_backend, files):
+    from signing_scheduler import SigningScheduler
+    backend = fake_backend(cards=2)
+    certificates = {card.serial: card.certificate for card in backend.cards}
+
+    with SigningScheduler({serial: PIN for serial in certificates}) as scheduler:
+        assert sorted(scheduler.tokens) == sorted(certificates)
+        paths = files(4)
+        futures = [(serial, scheduler.submit(path, serial=serial))
+                   for path, serial in zip(paths, ["FAKE0000", "FAKE0001"] * 2)]
+        for serial, future in futures:
+            assert _certificate(future.result(timeout=30)) == certificates[serial]
+
+def test_map_spreads_jobs_across_tokens(fake_backend, files):
+    from signing_scheduler import SigningScheduler
+    # Con latencia, cada trabajo sigue pendiente mientras se encolan los demás
+    backend = fake_backend(cards=2, latency_ms=20)
+
+    with SigningScheduler({card.serial: PIN for card in backend.cards}) as scheduler:
+        results = [future.result(timeout=30) for _path, future in scheduler.map(files(4))]
+    used = {_certificate(package) for package in results}
+    assert used == {card.certificate for card in backend.cards}
+
+def test_wrong_pin_fails_remaining_jobs_without_login(fake_backend, files):
+    from signing_scheduler import SigningScheduler
+    backend = fake_backend()
+    card = backend.cards[0]
+    logins = []
+    open_session = backend.open_session
+    backend.open_session = lambda slot, pin: logins.append(pin) or open_session(slot, pin)
+
+    with SigningScheduler({card.serial: "0000"}) as scheduler:
+        futures = [future for _path, future in scheduler.map(files(5))]
+        errors = [str(future.exception(timeout=30)) for future in futures]
+
+    assert "PIN incorrecto" in errors[0]
+    assert all(f"No se firma con el DNIe {card.serial}" in error for error in errors[1:])
+    # Un solo intento de login: el DNIe no llega a bloquearse
+    assert logins == ["0000"]
+    assert card.retries_left == card.max_retries - 1
+
+def test_jobs_avoid_token_with_rejected_pin(fake_backend, files):
+    from signing_scheduler import SigningScheduler
+    backend = fake_backend(cards=2)
+    bad, good = backend.cards
+
+    with SigningScheduler({bad.serial: "0000", good.serial: PIN}) as scheduler:
+        paths = files(4)
+        with pytest.raises(Exception, match="PIN incorrecto"):
+            scheduler.submit(paths[0], serial=bad.serial).result(timeout=30)
+        results = [future.result(timeout=30) for _path, future in scheduler.map(paths[1:])]
+    assert all(_certificate(package) == good.certificate for package in results)
+    assert bad.retries_left == bad.max_retries - 1